@@ -11,6 +11,17 @@ from lib.config import LLMConfig
 from api.domain.model import ModelInfo
 
 openai_model_config = settings.providers.openai
+
+# 模型客户端共用的连接池, 避免每次构建模型都新建 httpx 客户端(及其 TLS 连接)
+# 只在配置了 proxy_url 时走代理; DeepSeek 在国内可直连, 始终使用不走代理的客户端
+http_limits = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+shared_http_client = httpx.Client(proxy=settings.proxy_url, limits=http_limits)
+shared_http_async_client = httpx.AsyncClient(proxy=settings.proxy_url, limits=http_limits)
+direct_http_client = httpx.Client(limits=http_limits)
+direct_http_async_client = httpx.AsyncClient(limits=http_limits)
+
+# 文本模型实例缓存, key: (provider, model)
+_text_models: dict[tuple[str, str], ChatOpenAI | ChatGoogleGenerativeAI | ChatDeepSeek] = {}
 http_options = types.HttpOptions(
     client_args={"proxy": settings.proxy_url},
     async_client_args={"proxy": settings.proxy_url},
@@ -30,6 +41,14 @@ google_model = ChatGoogleGenerativeAI(
 
 
 def get_text_model(model: ModelInfo) -> ChatOpenAI | ChatGoogleGenerativeAI | ChatDeepSeek:
+    """获取文本模型, 同一 provider/model 复用同一实例"""
+    key = (model.provider, model.model)
+    if key not in _text_models:
+        _text_models[key] = _create_text_model(model)
+    return _text_models[key]
+
+
+def _create_text_model(model: ModelInfo) -> ChatOpenAI | ChatGoogleGenerativeAI | ChatDeepSeek:
     provider: LLMConfig = getattr(settings.providers, model.provider)
     print(f"当前使用的文本模型: {provider.model}")
     if model.provider == "gemini":
@@ -40,6 +59,8 @@ def get_text_model(model: ModelInfo) -> ChatOpenAI | ChatGoogleGenerativeAI | Ch
             api_key=SecretStr(provider.api_key),
             api_base=provider.base_url,
             extra_body={"reasoning": {"enabled": True}} if provider.model == "deepseek-reasoner" else None,
+            http_client=direct_http_client,
+            http_async_client=direct_http_async_client,
         )
     return ChatOpenAI(
         model=provider.model,
@@ -50,8 +71,8 @@ def get_text_model(model: ModelInfo) -> ChatOpenAI | ChatGoogleGenerativeAI | Ch
         max_retries=2,
         temperature=provider.temperature or 0,
         # max_tokens=max_tokens, # TODO: 暂时注释掉有问题的参数
-        http_client=httpx.Client(proxy=settings.proxy_url or "http://127.0.0.1:7890"),
-        http_async_client=httpx.AsyncClient(proxy=settings.proxy_url or "http://127.0.0.1:7890"),
+        http_client=shared_http_client,
+        http_async_client=shared_http_async_client,
     )
 
 
@@ -1,6 +1,6 @@
 from typing import Optional, NotRequired
+from collections import OrderedDict
 
-import httpx
 from pydantic import Field, BaseModel, ConfigDict
 from langgraph_tools import get_langgraph_tools
 from langchain.agents import AgentState, create_agent
@@ -12,8 +12,8 @@ from langchain_core.messages import HumanMessage
 from langgraph.checkpoint.base import BaseCheckpointSaver
 from langchain.agents.middleware import ModelRequest, AgentMiddleware, dynamic_prompt, wrap_tool_call
 
-from lib import settings
-from agents.common import get_text_model
+from lib import metrics, settings
+from agents.common import get_text_model, shared_http_client, shared_http_async_client
 from api.core.memory import memory_checkpointer
 from api.domain.tool import ToolInfo
 from api.domain.model import ModelInfo
@@ -133,7 +133,7 @@ creative_system_prompt = """
 # 规则
 - 识别用户输入, 如果是专业Prompt, 不要作任何修改直接传入图像工具
 - 调用prompt_assistant生成绘图prompt后, 引导用户修改和更新prompt, 尤其是美学,风格, 构图, 包含文字等角度入手
-- 拆分图层(素材拆分)时, 使用多步完成, 先对原图进行构图和设计分层分析,  识别其中可分离的层, 基于层数, 多次使用传入原图url, 对对象进行剥离和提取, 大小和位置不变, 用纯白色抹除其他地方, 
+- 拆分图层(素材拆分)时, 调用一次 image_split_layers 并传入原图url, 工具会返回全部透明图层与各自在原图中的位置, 不要再逐层调用生图工具
 - 用户有传入参考图(1-6张)时, 使用图片编辑工具并携带图像url, 用逗号隔开
 - image_create_with_gemini和image_create_with_seedream工具支持传入多张图片, 调用工具时使用使用英文逗号隔开比如: "http://example.com/a.png,https://example.com/b.png"
 - 当我有参考图片需求时, 通过image_urls字段将图片url 传入工具
@@ -175,7 +175,7 @@ You MUST:
 - 图片编辑: 对已生成图片进行编辑
 - 实时热点: 获取营销日历,热点日历
 - 背景移除: 移除图像背景, 保留图像主体
-- 拆分图层: 同名词(素材分割, 素材提取, 素材分解), 首先识别其中可独立的层, 拆分图层时传入参考,然后根据识别到的层数, 多次使用seedream进行处理, 每次处理均保留要保留的对象, 并抹除其他地方
+- 拆分图层: 同名词(素材分割, 素材提取, 素材分解), 使用 image_split_layers 一次拆分出所有对象图层与背景图层
 
 # 工具说明
 ## image_create_with_seedream / image_create_with_seedream4_5
@@ -189,6 +189,14 @@ prompt 中不要写入3:4, 竖版 , 1920*1080等比例信息, 通过aspect_ratio
 - image_urls: 可选, 要编辑的图片的url, 当有多张图片url时, 用英文逗号隔开
 - aspect_ratio:  可选, 图片尺寸, 宽高比, 分辨率: 1:1, 2:3,3:2, 4:3, 3:4, 16:9, 9:16, 21:9. 未检测到比例时不传入
 
+## image_split_layers
+
+图层拆分, 在本地把一张图片拆分为多个透明背景的 PNG 图层(每个独立对象一层, 外加挖空后的背景层), 返回各图层的 url 与在原图中的位置 bbox(x, y, 宽, 高)
+### 参数
+- image_url: 必须, 原图url或本地图像文件名, 只传一张
+- max_layers: 可选, 最多拆出的对象数, 默认 8
+- alpha_matting: 可选, 头发/毛发等精细边缘时设为 true
+
 ## copywriting_assistant
 
 文案助手(copywriting_assistant), 基于用户需求撰写对应公众号小红书等类型的文案
@@ -231,7 +239,7 @@ Seedream 基于领先架构的SOTA级多模态图像创作模型。其打破传
 
 ### 拆分图层
 
-step-by-step, 识别图像中的独立元素, 设计素材, 反向拆解,根据要拆分的对象,  调用seedream  对图像进行仅多次拆分图层, 识别其中的可分离元素, 仅保,  抹除其他元素
+优先使用 image_split_layers 一次完成; 只有需要补全被遮挡部分或重绘某个元素时, 才针对该元素调用seedream, 仅保留该元素并抹除其他元素
 
 
 ### 图像元素增删改
@@ -338,8 +346,8 @@ openai_model = ChatOpenAI(
     api_key=settings.providers.openai.api_key,
     # base_url=settings.providers.ark.base_url,
     use_responses_api=False,
-    http_client=httpx.Client(proxy=settings.proxy_url or "http://127.0.0.1:7890"),
-    http_async_client=httpx.AsyncClient(proxy=settings.proxy_url or "http://127.0.0.1:7890"),
+    http_client=shared_http_client,
+    http_async_client=shared_http_async_client,
 )
 
 
@@ -350,7 +358,8 @@ def build_creative_assistant(
 ):
     model = get_text_model(text_model)
     print(f"前端注册的工具:{tools=}")
-    tools = get_langgraph_tools([tool.id for tool in tools])
+    # 图层拆分在本地执行, 不依赖前端选择的生图模型, 始终可用
+    tools = get_langgraph_tools([tool.id for tool in tools if tool.id != "image_split_layers"] + ["image_split_layers"])
     print(f"前端注册的工具:{tools=}")
 
     tools_prompt = f"""
@@ -373,6 +382,65 @@ def build_creative_assistant(
     return agent
 
 
+class CreativeAssistantCache:
+    """
+    已编译智能体的 LRU 缓存
+    key: (provider, model, 排序后的工具 id, checkpointer 类型), 构建结果与会话无关, 可跨请求复用
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._agents: OrderedDict[tuple, CompiledStateGraph] = OrderedDict()
+
+    @staticmethod
+    def make_key(text_model: ModelInfo, tools: list[ToolInfo], checkpointer: BaseCheckpointSaver) -> tuple:
+        tool_ids = tuple(sorted({tool.id for tool in tools}))
+        return text_model.provider, text_model.model, tool_ids, type(checkpointer).__name__
+
+    def get(
+        self,
+        text_model: ModelInfo,
+        tools: list[ToolInfo],
+        checkpointer: BaseCheckpointSaver,
+    ) -> CompiledStateGraph:
+        key = self.make_key(text_model, tools, checkpointer)
+        agent = self._agents.get(key)
+        if agent is None:
+            metrics.inc("agent_cache_total", result="miss")
+            # 按排序后的工具构建, 保证同一 key 的系统提示词一致
+            tools = sorted({tool.id: tool for tool in tools}.values(), key=lambda tool: tool.id)
+            agent = build_creative_assistant(text_model, tools=tools, checkpointer=checkpointer)
+            self._agents[key] = agent
+            while len(self._agents) > self.maxsize:
+                self._agents.popitem(last=False)
+        else:
+            metrics.inc("agent_cache_total", result="hit")
+            self._agents.move_to_end(key)
+
+        # 同类型但不同实例的 checkpointer(如按请求创建的连接), 浅拷贝后重新绑定
+        if agent.checkpointer is not checkpointer:
+            agent = agent.copy({"checkpointer": checkpointer})
+        return agent
+
+    def clear(self):
+        self._agents.clear()
+
+    def __len__(self):
+        return len(self._agents)
+
+
+creative_assistant_cache = CreativeAssistantCache(maxsize=settings.agent_cache_size)
+
+
+def get_creative_assistant(
+    text_model: ModelInfo,
+    tools: list[ToolInfo],
+    checkpointer: BaseCheckpointSaver,
+) -> CompiledStateGraph:
+    """获取(缓存的)创意助手"""
+    return creative_assistant_cache.get(text_model, tools, checkpointer)
+
+
 if __name__ == "__main__":
     # rednote_agent = build_rednote_agent()
 
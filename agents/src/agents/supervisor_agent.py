@@ -1,12 +1,11 @@
 import traceback
 from typing import Any, Set, Dict, List, TypedDict, cast
 
-from lib import settings
-from api.core.memory import memory_checkpointer
 from api.domain.tool import ToolInfo
 from api.domain.model import ModelInfo
-from api.services.websocket import send_to_websocket
-from agents.creative_assitant import build_creative_assistant
+from api.core.checkpointer import get_checkpointer
+from api.services.websocket import broadcast_session_update
+from agents.creative_assitant import get_creative_assistant
 from api.core.StreamProcessor import StreamProcessor
 
 supervisor_prompt = """You are a supervisor managing two agents"""
@@ -129,40 +128,29 @@ async def langgraph_supervisor_agent(
             "tool_list": tool_list,
         }
 
-        # TODO 创建智能体
-        if settings.repo_type == "postgres":
-            db_uri = f"postgresql://{settings.postgres.username}:{settings.postgres.password.get_secret_value()}@{settings.postgres.host}:{settings.postgres.port}/{settings.postgres.database}"
-            # db_uri = settings.postgres_dsn
-            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-
-            async with AsyncPostgresSaver.from_conn_string(db_uri) as checkpointer:
-                agent = build_creative_assistant(text_model, tools=tool_list, checkpointer=checkpointer)
-                # 6. 流处理
-                processor = StreamProcessor(session_id, send_to_websocket)  # type: ignore
-                await processor.process_stream(
-                    agent,
-                    messages,
-                    context,
-                )
-        else:
-            agent = build_creative_assistant(text_model, tools=tool_list, checkpointer=memory_checkpointer)
-            # 6. 流处理
-            processor = StreamProcessor(session_id, send_to_websocket)  # type: ignore
-            await processor.process_stream(
-                agent,
-                messages,
-                context,
-            )
+        # 推送到会话房间和画布房间
+        async def websocket_service(session_id: str, event: Dict[str, Any]) -> None:
+            await broadcast_session_update(session_id, canvas_id, event)
+
+        # 全局共享的 checkpointer, postgres 模式下由 lifespan 管理连接池
+        agent = get_creative_assistant(text_model, tools=tool_list, checkpointer=get_checkpointer())
+        # 6. 流处理
+        processor = StreamProcessor(session_id, websocket_service)
+        await processor.process_stream(
+            agent,
+            messages,
+            context,
+        )
 
     except Exception as e:
-        await _handle_error(e, session_id)
+        await _handle_error(e, session_id, canvas_id)
 
 
-async def _handle_error(error: Exception, session_id: str) -> None:
+async def _handle_error(error: Exception, session_id: str, canvas_id: str | None = None) -> None:
     """处理错误"""
     print("Error in langgraph_agent", error)
     tb_str = traceback.format_exc()
     print(f"Full traceback:\n{tb_str}")
     traceback.print_exc()
 
-    await send_to_websocket(session_id, cast(Dict[str, Any], {"type": "error", "error": str(error)}))
+    await broadcast_session_update(session_id, canvas_id, cast(Dict[str, Any], {"type": "error", "error": str(error)}))
@@ -0,0 +1,35 @@
+"""add chat message session index
+
+Revision ID: 3f7a2c9e8b15
+Revises: 9d4e6a1b3c27
+Create Date: 2026-10-17 21:03:44.218790
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f7a2c9e8b15"
+down_revision: Union[str, None] = "9d4e6a1b3c27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 消息表可能很大, 并发建索引避免长时间锁表(不能在事务中执行)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_chat_message_session_id"),
+            "chat_message",
+            ["session_id", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f("ix_chat_message_session_id"), table_name="chat_message", postgresql_concurrently=True)
@@ -0,0 +1,52 @@
+"""json columns to jsonb
+
+Revision ID: 9d4e6a1b3c27
+Revises: 5b1f0c2d7e4a
+Create Date: 2026-10-17 20:12:05.903114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4e6a1b3c27"
+down_revision: Union[str, None] = "5b1f0c2d7e4a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    ("canvas", "data"),
+    ("canvas", "messages"),
+    ("chat_session", "messages"),
+    ("chat_message", "message"),
+]
+
+
+def upgrade() -> None:
+    # 空字符串无法转换为 jsonb, 视为 NULL
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            existing_type=sa.String(),
+            type_=postgresql.JSONB(astext_type=sa.Text()),
+            existing_nullable=True,
+            postgresql_using=f"NULLIF({column}, '')::jsonb",
+        )
+
+
+def downgrade() -> None:
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            existing_type=postgresql.JSONB(astext_type=sa.Text()),
+            type_=sa.String(),
+            existing_nullable=True,
+            postgresql_using=f"{column}::text",
+        )
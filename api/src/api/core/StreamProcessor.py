@@ -3,19 +3,20 @@ import json
 import traceback
 from typing import Any, Dict, List, Callable, Optional, Awaitable
 
-from sqlalchemy.orm import Session
 from langgraph.graph.state import CompiledStateGraph
 from langchain_core.messages import (
     ToolCall,
+    BaseMessage,
     ToolMessage,
     AIMessageChunk,
     convert_to_openai_messages,
 )
 
 from lib import settings
-from api.core.db import engine, async_session
+from api.core.db import async_session
 from api.core.memory import memory_store
-from api.services.chat import ChatService, InMemoryChatRepo, PostgresChatRepo
+from api.services.chat import InMemoryChatRepo, PostgresChatRepo, ChatMessageWriter
+from api.services.websocket import DeltaCoalescer
 
 
 class StreamProcessor:
@@ -27,10 +28,27 @@ class StreamProcessor:
         websocket_service: Callable[[str, Dict[str, Any]], Awaitable[None]],
     ):
         self.session_id = session_id
-        self.websocket_service = websocket_service
+        # delta 类事件按时间/字节窗口合并后推送
+        self.websocket_service = DeltaCoalescer(
+            session_id,
+            websocket_service,
+            flush_interval_ms=settings.stream.delta_flush_interval_ms,
+            flush_bytes=settings.stream.delta_flush_bytes,
+        )
         self.tool_calls: List[ToolCall] = []
         self.last_saved_message_index = 0
         self.last_streaming_tool_call_id: Optional[str] = None
+        self.messages_delta = settings.stream.messages_delta
+        # 增量模式: 已转换/推送/持久化的消息, key 为 langchain 消息 id
+        self._seen_messages: Dict[str, BaseMessage] = {}
+        self._oai_messages: Dict[str, Dict[str, Any]] = {}
+        self._oai_message_keys: List[str] = []
+        self.message_writer = ChatMessageWriter(
+            session_id,
+            self._write_messages,
+            max_batch=settings.stream.persist_batch_size,
+            flush_interval=settings.stream.persist_flush_interval,
+        )
 
     async def process_stream(
         self,
@@ -50,17 +68,24 @@ class StreamProcessor:
         # print(f"用户消息: {messages}")
         # print("测试")
 
-        async for chunk in supervisor.astream(
-            {"messages": messages},
-            config=context,
-            context={
-                "canvas_id": context.get("canvas_id", None),
-                "session_id": context.get("session_id", None),
-            },
-            stream_mode=["messages", "custom", "values"],
-        ):
-            # print(chunk)
-            await self._handle_chunk(chunk)
+        try:
+            async for chunk in supervisor.astream(
+                {"messages": messages},
+                config=context,
+                context={
+                    "canvas_id": context.get("canvas_id", None),
+                    "session_id": context.get("session_id", None),
+                },
+                stream_mode=["messages", "custom", "values"],
+            ):
+                # print(chunk)
+                await self._handle_chunk(chunk)
+        finally:
+            # done 事件之前确保缓冲的消息全部落库, 缓冲的 delta 全部推送
+            try:
+                await self.message_writer.close()
+            finally:
+                await self.websocket_service.close()
 
         # 发送完成事件
         print("发送完事件")
@@ -82,6 +107,56 @@ class StreamProcessor:
         # TODO 这里是langchain中维护的消息列表
 
         all_messages = chunk_data.get("messages", [])
+        if not self.messages_delta:
+            await self._handle_values_chunk_full(all_messages)
+            return
+
+        # 增量模式: 仅转换新增或变更的消息, 首次推送全量作为前端基线
+        is_first = not self._oai_message_keys
+        keys: List[str] = []
+        changed: List[int] = []
+        for index, message in enumerate(all_messages):
+            key = message.id or f"index:{index}"
+            keys.append(key)
+            if self._seen_messages.get(key) is message:
+                continue
+            oai_message = convert_to_openai_messages([message], include_id=False)[0]
+            if self._oai_messages.get(key) != oai_message:
+                self._oai_messages[key] = oai_message
+                changed.append(index)
+            self._seen_messages[key] = message
+
+        # 被移除的消息(如 RemoveMessage)不再跟踪, 下标发生偏移时退回全量推送
+        removed = set(self._oai_message_keys) - set(keys)
+        for key in removed:
+            self._seen_messages.pop(key, None)
+            self._oai_messages.pop(key, None)
+        self._oai_message_keys = keys
+
+        if is_first or removed:
+            oai_messages = [self._oai_messages[key] for key in keys]
+            await self.websocket_service(self.session_id, {"type": "all_messages", "messages": oai_messages})
+        elif changed:
+            await self.websocket_service(
+                self.session_id,
+                {
+                    "type": "messages_delta",
+                    "total": len(keys),
+                    "updates": [{"index": i, "message": self._oai_messages[keys[i]]} for i in changed],
+                },
+            )
+
+        # 只持久化最后一条用户消息之后的新增或变更消息
+        last_user_index = next(
+            (i for i in range(len(keys) - 1, -1, -1) if self._oai_messages[keys[i]].get("role") == "user"),
+            -1,
+        )
+        pending = [(self._oai_messages[keys[i]], all_messages[i]) for i in changed if i > last_user_index]
+        if pending:
+            await self._save_messages(pending)
+
+    async def _handle_values_chunk_full(self, all_messages: List[BaseMessage]) -> None:
+        """全量模式: 每次 values 事件重新转换并推送全部消息"""
         # print(f"{all_messages=}")
         oai_messages = convert_to_openai_messages(all_messages, include_id=False)
         # print(f"{oai_messages=}")
@@ -93,35 +168,33 @@ class StreamProcessor:
         # print("发送: ", oai_messages)
         await self.websocket_service(self.session_id, {"type": "all_messages", "messages": oai_messages})
 
-        # 保存新消息到数据库
-        async with async_session() as asession:
-            with Session(engine) as session:
-                if settings.repo_type == "in-memory":
-                    chat_service = ChatService(InMemoryChatRepo(memory_store))
-                elif settings.repo_type == "postgres":
-                    chat_service = ChatService(PostgresChatRepo(session=session, asession=asession))
-                else:
-                    chat_service = ChatService(InMemoryChatRepo(memory_store))
+        # 获取最近保存消息的lc_id
+        last_saved_index = next(
+            (i for i in range(len(oai_messages) - 1, -1, -1) if oai_messages[i]["role"] == "user"),
+            -1,
+        )
+        await self._save_messages(list(zip(oai_messages[last_saved_index + 1 :], all_messages[last_saved_index + 1 :])))
 
-                # 获取最近保存消息的lc_id
-                last_saved_index = next(
-                    (i for i in range(len(oai_messages) - 1, -1, -1) if oai_messages[i]["role"] == "user"),
-                    None,
-                )
+    async def _save_messages(self, pending: List[tuple[Dict[str, Any], BaseMessage]]) -> None:
+        """将消息放入写缓冲, 由 message_writer 批量落库"""
+        for oai_message, message in pending:
+            # print(f"assistant message {message=}")
+            await self.message_writer.add(
+                oai_message.get("role", "user"),  # message.role or "user",
+                json.dumps(oai_message, ensure_ascii=False),
+                # 主键由写缓冲生成 uuid7, 按主键排序即为时间顺序; langchain 的 id(uuid4/lc_run--) 只存在 lc_id 中
+                lc_id=message.id,
+                # getattr(all_messages[i], "id", None) if i < len(all_messages) else None,  # langchain生成的id 不规范, 或者替换lc_run---
+            )
 
-                for oai_message, message in zip(
-                    oai_messages[last_saved_index + 1 :],
-                    all_messages[last_saved_index + 1 :],
-                ):
-                    # print(f"assistant message {message=}")
-                    chat_service.create_message(
-                        self.session_id,
-                        oai_message.get("role", "user"),  # message.role or "user",
-                        json.dumps(oai_message, ensure_ascii=False),
-                        message_id=message.id if not message.id.startswith("lc_run--") else None,
-                        lc_id=message.id,
-                        # getattr(all_messages[i], "id", None) if i < len(all_messages) else None,  # langchain生成的id 不规范, 或者替换lc_run---
-                    )
+    @staticmethod
+    async def _write_messages(rows: List[Dict[str, Any]]) -> None:
+        """批量写入消息"""
+        if settings.repo_type == "postgres":
+            async with async_session() as asession:
+                await PostgresChatRepo(session=None, asession=asession).create_messages_async(rows)
+        else:
+            await InMemoryChatRepo(memory_store).create_messages_async(rows)
 
     async def _handle_message_chunk(self, ai_message_chunk: AIMessageChunk) -> None:
         """处理消息类型的 chunk"""
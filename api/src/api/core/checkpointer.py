@@ -0,0 +1,75 @@
+"""
+全局共享的 checkpointer
+
+postgres 模式下由 lifespan 打开一个 AsyncConnectionPool, 启动时执行一次 setup(), 所有智能体共用;
+其他模式使用内存 checkpointer.
+"""
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from lib import metrics, settings
+from api.core.memory import memory_checkpointer
+
+_pool = None
+_postgres_checkpointer = None
+
+
+def postgres_conninfo() -> str:
+    pg = settings.postgres
+    return f"postgresql://{pg.username}:{pg.password.get_secret_value()}@{pg.host}:{pg.port}/{pg.database}"
+
+
+async def open_checkpointer() -> BaseCheckpointSaver:
+    """打开连接池并初始化表结构, 仅在启动时调用一次"""
+    global _pool, _postgres_checkpointer
+    if settings.repo_type != "postgres":
+        return memory_checkpointer
+    if _postgres_checkpointer is not None:
+        return _postgres_checkpointer
+
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+    _pool = AsyncConnectionPool(
+        conninfo=postgres_conninfo(),
+        min_size=settings.postgres.checkpointer_pool_min,
+        max_size=settings.postgres.checkpointer_pool_max,
+        # AsyncPostgresSaver 要求 autocommit + dict_row, prepare_threshold=0 兼容 pgbouncer
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        name="checkpointer",
+        open=False,
+    )
+    await _pool.open()
+    _postgres_checkpointer = AsyncPostgresSaver(_pool)
+    await _postgres_checkpointer.setup()
+    print(
+        f"checkpointer 连接池已就绪: min={settings.postgres.checkpointer_pool_min}, "
+        f"max={settings.postgres.checkpointer_pool_max}"
+    )
+    return _postgres_checkpointer
+
+
+async def close_checkpointer():
+    global _pool, _postgres_checkpointer
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+    _postgres_checkpointer = None
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """获取全局 checkpointer, postgres 模式下需先在 lifespan 中 open_checkpointer()"""
+    if settings.repo_type != "postgres":
+        return memory_checkpointer
+    if _postgres_checkpointer is None:
+        raise RuntimeError("checkpointer 尚未初始化, 请在 lifespan 中调用 open_checkpointer()")
+    return _postgres_checkpointer
+
+
+def update_pool_metrics():
+    """将连接池状态写入指标"""
+    if _pool is None:
+        return
+    for name, value in _pool.get_stats().items():
+        metrics.set_gauge(f"checkpointer_{name}", value)
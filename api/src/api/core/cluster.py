@@ -0,0 +1,297 @@
+"""
+跨进程/跨节点协作后端
+
+多 worker 部署时, Socket.IO 推送、连接登记、流式任务取消都需要经由共享的消息通道:
+- RedisClusterBackend: 生产实现, Socket.IO 使用 AsyncRedisManager, 登记表与取消信号走 redis
+- InProcessClusterBackend: 进程内实现, 传入同一个 InProcessBroker 的多个实例之间可互通, 用于单 worker 与测试
+"""
+
+import os
+import json
+import uuid
+import socket
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Callable, Awaitable
+
+import socketio
+
+from lib import settings
+
+CancelHandler = Callable[[str], Awaitable[None]]
+
+
+def new_node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class ClusterBackend(ABC):
+    """集群后端接口: Socket.IO 管理器 + 连接登记 + 流式任务登记 + 取消信号"""
+
+    def __init__(self, node_id: str | None = None):
+        self.node_id = node_id or new_node_id()
+        self._on_cancel: CancelHandler | None = None
+
+    @abstractmethod
+    def client_manager(self) -> socketio.AsyncManager:
+        """创建 AsyncServer 使用的 client_manager"""
+
+    async def start(self, on_cancel: CancelHandler):
+        """开始监听取消信号, on_cancel(session_id) 在持有该任务的节点上被调用"""
+        self._on_cancel = on_cancel
+
+    @abstractmethod
+    async def stop(self):
+        """停止监听, 并清理本节点登记的连接与任务"""
+
+    @abstractmethod
+    async def add_connection(self, socket_id: str, user_info: dict): ...
+
+    @abstractmethod
+    async def remove_connection(self, socket_id: str): ...
+
+    @abstractmethod
+    async def list_connections(self) -> dict[str, dict]:
+        """所有节点的连接, socket_id -> user_info(含 node)"""
+
+    @abstractmethod
+    async def register_stream(self, session_id: str): ...
+
+    @abstractmethod
+    async def unregister_stream(self, session_id: str): ...
+
+    @abstractmethod
+    async def find_stream(self, session_id: str) -> str | None:
+        """返回正在运行该会话任务的节点 id"""
+
+    @abstractmethod
+    async def publish_cancel(self, session_id: str): ...
+
+    async def _dispatch_cancel(self, data: dict):
+        # 只有持有任务的节点处理, 避免同一会话在多个节点上被误取消
+        if data.get("node") in (None, self.node_id) and self._on_cancel:
+            await self._on_cancel(data["session_id"])
+
+
+class InProcessBroker:
+    """进程内的共享通道, 多个 InProcessClusterBackend 共用同一实例即可模拟多节点"""
+
+    def __init__(self):
+        self.connections: dict[str, dict[str, dict]] = {}
+        self.streams: dict[str, set[str]] = {}
+        self.subscribers: dict[str, list[asyncio.Queue]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(channel, []).append(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        if queue in self.subscribers.get(channel, []):
+            self.subscribers[channel].remove(queue)
+
+    async def publish(self, channel: str, message: str):
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait(message)
+
+
+class InProcessPubSubManager(socketio.async_pubsub_manager.AsyncPubSubManager):
+    name = "inprocess"
+
+    def __init__(self, broker: InProcessBroker, channel: str = "socketio", write_only: bool = False):
+        super().__init__(channel=channel, write_only=write_only)
+        self.broker = broker
+        self.queue = broker.subscribe(channel)
+
+    async def _publish(self, data):
+        await self.broker.publish(self.channel, json.dumps(data))
+
+    async def _listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+class InProcessClusterBackend(ClusterBackend):
+    """
+    进程内后端
+    不传 broker 时为单节点模式, Socket.IO 使用默认的 AsyncManager, 不经过消息通道
+    """
+
+    cancel_channel = "cancel"
+
+    def __init__(self, broker: InProcessBroker | None = None, node_id: str | None = None):
+        super().__init__(node_id)
+        self.shared = broker is not None
+        self.broker = broker or InProcessBroker()
+        self._task: asyncio.Task | None = None
+        self._queue: asyncio.Queue | None = None
+
+    def client_manager(self) -> socketio.AsyncManager:
+        if not self.shared:
+            return socketio.AsyncManager()
+        return InProcessPubSubManager(self.broker)
+
+    async def start(self, on_cancel: CancelHandler):
+        await super().start(on_cancel)
+        self._queue = self.broker.subscribe(self.cancel_channel)
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._dispatch_cancel(json.loads(message))
+            except Exception as e:
+                print(f"处理取消信号失败: {e}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._queue:
+            self.broker.unsubscribe(self.cancel_channel, self._queue)
+            self._queue = None
+        self.broker.connections.pop(self.node_id, None)
+        self.broker.streams.pop(self.node_id, None)
+
+    async def add_connection(self, socket_id: str, user_info: dict):
+        self.broker.connections.setdefault(self.node_id, {})[socket_id] = {**user_info, "node": self.node_id}
+
+    async def remove_connection(self, socket_id: str):
+        self.broker.connections.get(self.node_id, {}).pop(socket_id, None)
+
+    async def list_connections(self) -> dict[str, dict]:
+        return {sid: info for node in self.broker.connections.values() for sid, info in node.items()}
+
+    async def register_stream(self, session_id: str):
+        self.broker.streams.setdefault(self.node_id, set()).add(session_id)
+
+    async def unregister_stream(self, session_id: str):
+        self.broker.streams.get(self.node_id, set()).discard(session_id)
+
+    async def find_stream(self, session_id: str) -> str | None:
+        for node, sessions in self.broker.streams.items():
+            if session_id in sessions:
+                return node
+        return None
+
+    async def publish_cancel(self, session_id: str):
+        node = await self.find_stream(session_id)
+        await self.broker.publish(self.cancel_channel, json.dumps({"session_id": session_id, "node": node}))
+
+
+class RedisClusterBackend(ClusterBackend):
+    """
+    redis 后端
+    每个节点的连接/任务登记在各自的 hash 中, 由心跳续期, 节点异常退出后自动过期
+    """
+
+    heartbeat_interval = 30
+    node_ttl = 90
+
+    def __init__(self, url: str, prefix: str = "aicanvas", node_id: str | None = None):
+        super().__init__(node_id)
+        import redis.asyncio as redis
+
+        self.url = url
+        self.prefix = prefix
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self._tasks: list[asyncio.Task] = []
+
+    def _key(self, kind: str, node_id: str | None = None) -> str:
+        return f"{self.prefix}:{kind}:{node_id or self.node_id}"
+
+    @property
+    def cancel_channel(self) -> str:
+        return f"{self.prefix}:cancel"
+
+    def client_manager(self) -> socketio.AsyncManager:
+        return socketio.AsyncRedisManager(self.url, channel=f"{self.prefix}:socketio")
+
+    async def start(self, on_cancel: CancelHandler):
+        await super().start(on_cancel)
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._heartbeat())]
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.cancel_channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        await self._dispatch_cancel(json.loads(message["data"]))
+                    except Exception as e:
+                        print(f"处理取消信号失败: {e}")
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                print(f"取消信号订阅断开, 1 秒后重连: {e}")
+                await pubsub.aclose()
+                await asyncio.sleep(1)
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.expire(self._key("connections"), self.node_ttl)
+                    pipe.expire(self._key("streams"), self.node_ttl)
+                    await pipe.execute()
+            except Exception as e:
+                print(f"集群心跳失败: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.redis.delete(self._key("connections"), self._key("streams"))
+        await self.redis.aclose()
+
+    async def add_connection(self, socket_id: str, user_info: dict):
+        key = self._key("connections")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, socket_id, json.dumps({**user_info, "node": self.node_id}, ensure_ascii=False))
+            pipe.expire(key, self.node_ttl)
+            await pipe.execute()
+
+    async def remove_connection(self, socket_id: str):
+        await self.redis.hdel(self._key("connections"), socket_id)
+
+    async def list_connections(self) -> dict[str, dict]:
+        connections = {}
+        async for key in self.redis.scan_iter(match=self._key("connections", "*")):
+            for sid, info in (await self.redis.hgetall(key)).items():
+                connections[sid] = json.loads(info)
+        return connections
+
+    async def register_stream(self, session_id: str):
+        key = self._key("streams")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, session_id, self.node_id)
+            pipe.expire(key, self.node_ttl)
+            await pipe.execute()
+
+    async def unregister_stream(self, session_id: str):
+        await self.redis.hdel(self._key("streams"), session_id)
+
+    async def find_stream(self, session_id: str) -> str | None:
+        async for key in self.redis.scan_iter(match=self._key("streams", "*")):
+            if node := await self.redis.hget(key, session_id):
+                return node
+        return None
+
+    async def publish_cancel(self, session_id: str):
+        node = await self.find_stream(session_id)
+        await self.redis.publish(self.cancel_channel, json.dumps({"session_id": session_id, "node": node}))
+
+
+def create_cluster_backend() -> ClusterBackend:
+    """按配置创建后端, cluster.backend = "redis" 时要求配置 settings.redis"""
+    if settings.cluster.backend == "redis":
+        if settings.redis is None:
+            raise ValueError("cluster.backend = 'redis' 需要配置 [redis]")
+        return RedisClusterBackend(settings.redis_dsn, prefix=settings.cluster.prefix)
+    return InProcessClusterBackend()
@@ -1,21 +1,252 @@
+"""
+内存模式的存储与 checkpointer
+
+两者都有上限(条数/字节/闲置时间, 见 settings.memory), 按 LRU 淘汰, 长时间运行的开发/测试环境不会无限增长.
+"""
+
+import time
 import asyncio
+import bisect
 from uuid import UUID
+from collections import OrderedDict
 
 from api.domain.canvas import Canvas
 from api.domain.chat import Chat, ChatMessage, ChatSession
 from langgraph.checkpoint.memory import InMemorySaver
 
-memory_checkpointer = InMemorySaver()
+from lib import metrics, settings
+from lib.bounded import BoundedDict, MemoryBudget, SqliteSpill
+from lib.config import MemoryConfig
+
+
+class BoundedInMemorySaver(InMemorySaver):
+    """
+    限制线程数/每个线程的 checkpoint 数/总字节数的内存 checkpointer
+    每个 (thread, ns) 只保留最近的 checkpoint(连同其 writes 与不再被引用的 blobs), 超出上限时按 LRU 删除整个线程
+    """
+
+    def __init__(
+        self,
+        *,
+        max_threads: int | None = None,
+        max_checkpoints_per_thread: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # thread_id -> 最近访问时间
+        self._threads: OrderedDict[str, float] = OrderedDict()
+        # 各线程的字节数与总和, 写入与删除时增量更新
+        self._bytes: dict[str, int] = {}
+        self._total_bytes = 0
+        # (thread_id, checkpoint_ns) -> checkpoint_id -> channel_versions, 按写入顺序
+        self._versions: dict[tuple[str, str], OrderedDict[str, dict]] = {}
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+    def _checkpoint_size(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> int:
+        # storage/writes 是 defaultdict, 用 get 避免留下空条目
+        entry = self.storage.get(thread_id, {}).get(checkpoint_ns, {}).get(checkpoint_id)
+        return len(entry[0][1]) + len(entry[1][1]) if entry else 0
+
+    def _writes_size(self, key: tuple[str, str, str]) -> int:
+        return sum(len(value[1]) for _, _, value, _ in self.writes.get(key, {}).values())
+
+    def _blob_size(self, key: tuple) -> int:
+        return len(self.blobs[key][1]) if key in self.blobs else 0
+
+    def _add_bytes(self, thread_id: str, delta: int):
+        """按写入/删除的条目增量维护各线程与总的字节数, 不重新遍历线程"""
+        self._bytes[thread_id] = self._bytes.get(thread_id, 0) + delta
+        self._total_bytes += delta
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        versions = self._versions[(thread_id, checkpoint_ns)]
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        dropped = set()
+        freed = 0
+        while len(versions) > self.max_checkpoints_per_thread:
+            checkpoint_id, channel_versions = versions.popitem(last=False)
+            freed += self._checkpoint_size(thread_id, checkpoint_ns, checkpoint_id)
+            freed += self._writes_size((thread_id, checkpoint_ns, checkpoint_id))
+            checkpoints.pop(checkpoint_id, None)
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            dropped.update(channel_versions.items())
+            self.pruned_checkpoints += 1
+        # 仍被保留的 checkpoint 引用的 blob 不能删除
+        dropped.difference_update(item for channel_versions in versions.values() for item in channel_versions.items())
+        for channel, version in dropped:
+            key = (thread_id, checkpoint_ns, channel, version)
+            freed += self._blob_size(key)
+            self.blobs.pop(key, None)
+        self._add_bytes(thread_id, -freed)
+
+    def _touch(self, thread_id: str):
+        self._threads[thread_id] = time.monotonic()
+        self._threads.move_to_end(thread_id)
+
+    def _shrink(self, keep: str):
+        deadline = time.monotonic() - self.ttl if self.ttl else None
+        while self._threads:
+            oldest, accessed = next(iter(self._threads.items()))
+            if oldest == keep:
+                break
+            over_threads = self.max_threads is not None and len(self._threads) > self.max_threads
+            over_bytes = self.max_bytes is not None and self._total_bytes > self.max_bytes
+            expired = deadline is not None and accessed < deadline
+            if not (over_threads or over_bytes or expired):
+                break
+            self.delete_thread(oldest)
+            self.evicted_threads += 1
+            metrics.inc("memory_checkpointer_evictions_total")
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        blob_keys = [(thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()]
+
+        def size() -> int:
+            checkpoint_size = self._checkpoint_size(thread_id, checkpoint_ns, checkpoint["id"])
+            return checkpoint_size + sum(self._blob_size(key) for key in blob_keys)
+
+        before = size()
+        result = super().put(config, checkpoint, metadata, new_versions)
+        self._add_bytes(thread_id, size() - before)
+        versions = self._versions.setdefault((thread_id, checkpoint_ns), OrderedDict())
+        versions[checkpoint["id"]] = dict(checkpoint["channel_versions"])
+        if self.max_checkpoints_per_thread and len(versions) > self.max_checkpoints_per_thread:
+            self._prune(thread_id, checkpoint_ns)
+        self._touch(thread_id)
+        self._shrink(keep=thread_id)
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+        before = self._writes_size(key)
+        super().put_writes(config, writes, task_id, task_path)
+        self._add_bytes(thread_id, self._writes_size(key) - before)
+        self._touch(thread_id)
+        self._shrink(keep=thread_id)
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self.storage:
+            # 父类按 defaultdict 访问, 会为不存在的线程留下空条目
+            return None
+        result = super().get_tuple(config)
+        if thread_id in self._threads:
+            self._threads[thread_id] = time.monotonic()
+            self._threads.move_to_end(thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str):
+        # 按索引删除, 父类实现需要扫描所有线程的 writes/blobs
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for channel_versions in self._versions.pop((thread_id, checkpoint_ns), {}).values():
+                for channel, version in channel_versions.items():
+                    self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        self._threads.pop(thread_id, None)
+        self._total_bytes -= self._bytes.pop(thread_id, 0)
+
+    def usage(self) -> dict:
+        return {
+            "threads": len(self._threads),
+            "checkpoints": sum(len(versions) for versions in self._versions.values()),
+            "bytes": self._total_bytes,
+            "evicted_threads": self.evicted_threads,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "max_threads": self.max_threads,
+            "max_checkpoints_per_thread": self.max_checkpoints_per_thread,
+            "max_bytes": self.max_bytes,
+        }
 
 
 class AppStore:
-    def __init__(self):
-        self.canvas: dict[str | UUID, Canvas] = {}
-        self.chat_session: dict[str | UUID, ChatSession] = {}
-        self.chat: dict[str | UUID, Chat] = {}
-        self.chat_message: dict[str | UUID, ChatMessage] = {}
+    def __init__(self, config: MemoryConfig | None = None):
+        config = config or MemoryConfig()
+        self.spill = SqliteSpill(config.spill_path) if config.spill_path else None
+        self.budget = MemoryBudget(config.max_bytes) if config.max_bytes else None
+
+        def bounded(name: str, max_items: int | None, **kwargs) -> BoundedDict:
+            return BoundedDict(
+                name, max_items=max_items, ttl=config.ttl_seconds, spill=self.spill, budget=self.budget, **kwargs
+            )
+
+        self.canvas: BoundedDict[str | UUID, Canvas] = bounded("canvas", config.max_canvases)
+        self.chat_session: BoundedDict[str | UUID, ChatSession] = bounded("chat_session", config.max_sessions)
+        self.chat: BoundedDict[str | UUID, Chat] = bounded("chat", config.max_sessions)
+        self.chat_message: BoundedDict[str | UUID, ChatMessage] = bounded(
+            "chat_message", config.max_messages, on_evict=self._forget_message
+        )
+        # session_id -> 按 id(uuid7, 时间有序) 升序排列的消息 id
+        self.chat_message_ids: BoundedDict[str, list[UUID]] = bounded(
+            "chat_message_ids", config.max_sessions, on_evict=self._forget_session
+        )
+        # lc_id -> 消息 id, 用于按 lc_id 幂等写入
+        # 不单独淘汰, 只随消息一起删除(_forget_message/_forget_session), 否则仍存在的消息再次写入时会产生重复记录
+        self.chat_message_lc_ids: BoundedDict[str, UUID] = BoundedDict("chat_message_lc_ids")
 
         self.lock = asyncio.Lock()
 
+    def _forget_message(self, id: UUID, message: ChatMessage):
+        """消息被丢弃时同步删除索引"""
+        if message.lc_id:
+            self.chat_message_lc_ids.discard(message.lc_id)
+        ids = self.chat_message_ids.peek(message.session_id)
+        if ids is not None:
+            index = bisect.bisect_left(ids, id)
+            if index < len(ids) and ids[index] == id:
+                del ids[index]
+
+    def _forget_session(self, session_id: str, ids: list[UUID]):
+        """会话的消息索引被丢弃时, 消息也无法再按会话读取, 一并删除"""
+        for id in ids:
+            if (message := self.chat_message.peek(id)) is not None and message.lc_id:
+                self.chat_message_lc_ids.discard(message.lc_id)
+            self.chat_message.discard(id)
+
+    def mappings(self) -> list[BoundedDict]:
+        return [
+            self.canvas,
+            self.chat_session,
+            self.chat,
+            self.chat_message,
+            self.chat_message_ids,
+            self.chat_message_lc_ids,
+        ]
+
+    def usage(self) -> dict:
+        return {
+            "bytes": self.budget.bytes if self.budget else sum(mapping.bytes for mapping in self.mappings()),
+            "max_bytes": self.budget.max_bytes if self.budget else None,
+            "spill_path": str(self.spill.path) if self.spill else None,
+            "mappings": {mapping.name: mapping.usage() for mapping in self.mappings()},
+        }
+
+
+memory_store = AppStore(settings.memory)
+memory_checkpointer = BoundedInMemorySaver(
+    max_threads=settings.memory.checkpoint_max_threads,
+    max_checkpoints_per_thread=settings.memory.checkpoint_max_per_thread,
+    max_bytes=settings.memory.checkpoint_max_bytes,
+    ttl=settings.memory.ttl_seconds,
+)
+
 
-memory_store = AppStore()
+def update_memory_metrics():
+    """将内存模式的占用写入指标"""
+    for name, usage in memory_store.usage()["mappings"].items():
+        metrics.set_gauge("memory_store_items", usage["items"], store=name)
+        metrics.set_gauge("memory_store_bytes", usage["bytes"], store=name)
+        metrics.set_gauge("memory_store_spilled_items", usage["spilled_items"], store=name)
+    checkpointer = memory_checkpointer.usage()
+    metrics.set_gauge("memory_checkpointer_threads", checkpointer["threads"])
+    metrics.set_gauge("memory_checkpointer_bytes", checkpointer["bytes"])
@@ -19,6 +19,8 @@ class Canvas(BaseModel):
     system_prompt: str | None = None
     tool_list: list[str] | None = None
     thumbnail: str | None = None
+    version: int = 0
+    snapshot_version: int = 0
     created_at: str | None = get_current_date()
     updated_at: str | None = get_current_date()
 
@@ -23,7 +23,7 @@ class ChatMessage(BaseModel):
     session_id: str
     chat_id: str | None = None
     role: str
-    message: Json | None = None
+    message: Json | dict | list | None = None
     content: str | None = None
     created_at: str = get_current_date()
     updated_at: str = get_current_date()
@@ -0,0 +1,49 @@
+from uuid import UUID
+from typing import Any, Literal
+from datetime import UTC, datetime
+
+import uuid_utils as uuid
+from pydantic import Field, BaseModel, ConfigDict
+
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+
+def utcnow() -> datetime:
+    return datetime.now(UTC)
+
+
+class Job(BaseModel):
+    id: UUID = Field(default_factory=lambda: UUID(str(uuid.uuid7())))
+    kind: str
+    status: JobStatus = "queued"
+    payload: dict[str, Any] = Field(default_factory=dict)
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    session_id: str | None = None
+    canvas_id: str | None = None
+    attempts: int = 0
+    max_attempts: int = 3
+    run_at: datetime = Field(default_factory=utcnow)
+    locked_by: str | None = None
+    locked_until: datetime | None = None
+    finished_at: datetime | None = None
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def event(self) -> dict:
+        """推送给前端的任务状态事件"""
+        return {
+            "type": "job_update",
+            "job_id": str(self.id),
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "result": self.result,
+        }
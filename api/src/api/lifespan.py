@@ -2,12 +2,19 @@ import logging
 from contextlib import asynccontextmanager
 
 from v2.nacos import NacosNamingService, ClientConfigBuilder, RegisterInstanceParam, DeregisterInstanceParam
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.checkpoint.postgres import PostgresSaver
 
 from lib import settings
+from lib.dedup import image_index
+from api.states import cluster
+from lib.compress import close_compress_executor
+from tools.hotspot import hotspot_service
+from api.services.jobs import stop_job_workers, start_job_workers
+from api.services.stream import cancel_local_stream_task
+from tools.images.common import close_async_client
 from agents.rednote_agent import build_rednote_agent
+from api.core.checkpointer import open_checkpointer, close_checkpointer
 from api.services.websocket import broadcast_init_done
+from api.services.tool_cache import close_tool_cache, configure_tool_cache
 
 
 async def initialize():
@@ -38,6 +45,29 @@ async def lifespan(app):
     print(f"当前数据仓储类型: {settings.repo_type=}")
     # init broadcast service
     await initialize()
+    # 监听其他 worker 转发过来的取消信号
+    await cluster.start(cancel_local_stream_task)
+    print(f"集群后端: {type(cluster).__name__}, 节点: {cluster.node_id}")
+
+    # 全局共享的 checkpointer, postgres 模式下打开连接池并执行一次 setup()
+    app.state.checkpointer = await open_checkpointer()
+    app.state.rednote_agent = build_rednote_agent(app.state.checkpointer)
+
+    # 图片去重索引持久化到 postgres, 多 worker 共享
+    if settings.repo_type == "postgres":
+        from api.services.image_asset import PostgresImageRecordStore
+
+        image_index.store = PostgresImageRecordStore()
+
+    # 工具结果缓存的共享存储(redis/postgres)
+    configure_tool_cache()
+
+    # 后台任务 worker, postgres 模式下也可以设为 0, 由独立的 api-worker 进程消费
+    app.state.job_workers = start_job_workers() if settings.jobs.enabled else []
+
+    # 定期刷新热榜缓存, 热点工具直接命中缓存
+    if settings.hotspot.refresh_interval:
+        hotspot_service.start_refresher()
 
     # 异步任务 适合添加长循环与定时器
     # app.state.listen_task = asyncio.create_task(listen_service())
@@ -78,5 +108,14 @@ async def lifespan(app):
             )
         )
 
+    # 未完成的任务放回队列, 由其他 worker 继续执行
+    await stop_job_workers(app.state.job_workers)
+    await cluster.stop()
+    await close_checkpointer()
+    await close_async_client()
+    await close_tool_cache()
+    await hotspot_service.close()
+    close_compress_executor()
+
     # app.state.listen_task.cancel()
     # 关闭全局资源
@@ -1,6 +1,20 @@
 from .base import Base
-from .canvas import Canvas
+from .canvas import Canvas, CanvasDelta
 from .chat import Chat, ChatMessage, ChatSession
+from .image import ImageAsset
+from .job import Job
 from .prompt import Prompt
+from .tool_cache import ToolResultCache
 
-__all__ = ["Base", "Canvas", "Chat", "ChatSession", "ChatMessage", "Prompt"]
+__all__ = [
+    "Base",
+    "Canvas",
+    "CanvasDelta",
+    "Chat",
+    "ChatSession",
+    "ChatMessage",
+    "Prompt",
+    "ImageAsset",
+    "Job",
+    "ToolResultCache",
+]
@@ -1,5 +1,8 @@
-from sqlalchemy import MetaData
+import json
+
+from sqlalchemy import MetaData, TypeDecorator
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.dialects.postgresql import JSONB
 
 # https://docs.sqlalchemy.org/en/20/core/constraints.html#configuring-constraint-naming-conventions
 convention = {
@@ -16,3 +19,21 @@ metadata = MetaData(naming_convention=convention)
 class Base(DeclarativeBase):
     metadata = metadata
     pass
+
+
+class JSONDocument(TypeDecorator):
+    """
+    JSONB 列, 读取时返回 dict/list
+    兼容写入已序列化的 JSON 字符串(空字符串视为 NULL)
+    """
+
+    impl = JSONB
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(none_as_null=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return json.loads(value) if value.strip() else None
+        return value
@@ -1,9 +1,9 @@
 from datetime import datetime
 
-from sqlalchemy import Text, String, Boolean, DateTime, func
+from sqlalchemy import Text, String, Boolean, Integer, DateTime, BigInteger, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .base import Base
+from .base import Base, JSONDocument
 
 
 class Canvas(Base):
@@ -14,14 +14,31 @@ class Canvas(Base):
     session_id: Mapped[str | None] = mapped_column(String, nullable=True)
     canvas_id: Mapped[str | None] = mapped_column(String, nullable=True)
     user_id: Mapped[str | None] = mapped_column(Text, nullable=True)
-    data: Mapped[str | None] = mapped_column(String, nullable=True, comment="画布数据")
-    messages: Mapped[str | None] = mapped_column(String, nullable=True)
+    data: Mapped[dict | None] = mapped_column(JSONDocument, nullable=True, comment="画布数据")
+    messages: Mapped[list | None] = mapped_column(JSONDocument, nullable=True)
     system_prompt: Mapped[str | None] = mapped_column(String, nullable=True)
     tool_list: Mapped[str | None] = mapped_column(String, nullable=True)
     thumbnail: Mapped[str | None] = mapped_column(String, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", comment="画布版本, 每次保存加一")
+    snapshot_version: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", comment="data 快照对应的版本, 之后的修改在 canvas_delta 中"
+    )
     completed = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     updated_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+
+class CanvasDelta(Base):
+    """画布增量(RFC 6902 JSON Patch), 快照之后的修改按版本顺序回放"""
+
+    __tablename__ = "canvas_delta"
+    __table_args__ = (UniqueConstraint("canvas_id", "version"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    canvas_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, comment="应用该补丁后的版本")
+    patch: Mapped[str] = mapped_column(Text, nullable=False, comment="JSON Patch")
+    created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), server_default=func.now())
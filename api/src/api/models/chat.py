@@ -1,9 +1,8 @@
 import uuid_utils as uuid
-from pydantic import Json
-from sqlalchemy import UUID, Boolean, DateTime, String, func, text
+from sqlalchemy import UUID, Boolean, DateTime, Index, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .base import Base
+from .base import Base, JSONDocument
 
 
 class Chat(Base):
@@ -26,7 +25,7 @@ class ChatSession(Base):
     title = mapped_column(String, index=True, nullable=False)
     model: Mapped[str] = mapped_column(String, nullable=False)
     provider: Mapped[str] = mapped_column(String, nullable=False)
-    messages: Mapped[str | None] = mapped_column(String, nullable=True)
+    messages: Mapped[list | None] = mapped_column(JSONDocument, nullable=True)
     completed = mapped_column(Boolean, default=False)
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -34,6 +33,9 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_message"
+    # 按会话分页读取历史: WHERE session_id = ? AND id < ? ORDER BY id DESC
+    __table_args__ = (Index(None, "session_id", "id"),)
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -44,7 +46,7 @@ class ChatMessage(Base):
     chat_id: Mapped[str | None] = mapped_column(String, nullable=True)
     session_id: Mapped[str | None] = mapped_column(String, nullable=True)
     role: Mapped[str | None] = mapped_column(String, nullable=True)
-    message: Mapped[Json | None] = mapped_column(String, nullable=True)
+    message: Mapped[dict | None] = mapped_column(JSONDocument, nullable=True)
     content: Mapped[str | None] = mapped_column(String, nullable=True)
 
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
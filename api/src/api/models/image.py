@@ -0,0 +1,19 @@
+from sqlalchemy import String, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ImageAsset(Base):
+    """按内容(sha256)去重的图片索引"""
+
+    __tablename__ = "image_asset"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True, comment="内容sha256")
+    url: Mapped[str] = mapped_column(String, nullable=False, comment="图片地址")
+    width: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    height: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    mime_type: Mapped[str | None] = mapped_column(String, nullable=True)
+    file_size: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,42 @@
+import uuid_utils as uuid
+from sqlalchemy import UUID, Text, Index, String, Integer, DateTime, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, JSONDocument
+
+
+class Job(Base):
+    """后台任务队列, worker 通过 SELECT ... FOR UPDATE SKIP LOCKED 领取"""
+
+    __tablename__ = "job"
+    __table_args__ = (
+        # 领取待执行的任务
+        Index(None, "run_at", postgresql_where=text("status = 'queued'")),
+        # 回收租约过期的任务
+        Index(None, "locked_until", postgresql_where=text("status = 'running'")),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid7,
+        server_default=text("uuidv7()"),  # noqa F821
+    )
+    kind: Mapped[str] = mapped_column(String, nullable=False, comment="任务类型, 对应 handler")
+    status: Mapped[str] = mapped_column(
+        String, nullable=False, server_default="queued", comment="queued/running/succeeded/failed/cancelled"
+    )
+    payload: Mapped[dict] = mapped_column(JSONDocument, nullable=False)
+    result: Mapped[dict | None] = mapped_column(JSONDocument, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    session_id: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+    canvas_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="3")
+    run_at = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_by: Mapped[str | None] = mapped_column(String, nullable=True, comment="持有租约的 worker")
+    locked_until = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at = mapped_column(DateTime(timezone=True), nullable=True)
+
+    created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,17 @@
+from sqlalchemy import String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, JSONDocument
+
+
+class ToolResultCache(Base):
+    """确定性工具调用的结果缓存, 键为规范化参数的 sha256"""
+
+    __tablename__ = "tool_result_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True, comment="规范化参数sha256")
+    tool: Mapped[str] = mapped_column(String, nullable=False)
+    value: Mapped[dict] = mapped_column(JSONDocument, nullable=False)
+    expires_at = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+    created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
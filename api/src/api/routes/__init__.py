@@ -6,6 +6,8 @@ from . import (  # noqa F401
     chat,
     config,
     file,
+    job,
+    metrics,
     prompt,
     root,
     tool,
@@ -25,3 +27,5 @@ router.include_router(tool.router, prefix="/tools", tags=["tool"])
 router.include_router(agent.router, prefix="/agents", tags=["agents"])
 router.include_router(file.router, prefix="", tags=["file"])
 router.include_router(prompt.router, prefix="/prompts", tags=["prompt"])
+router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+router.include_router(job.router, prefix="/jobs", tags=["jobs"])
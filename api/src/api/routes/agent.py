@@ -32,7 +32,6 @@ async def generate_rednote(
 
     # TODO 总是从redis中召回对话历史
 
-    agent = request.app.state.rednote_agent
     input: RednoteState = RednoteState(
         messages=[HumanMessage(content=body.prompt)],
         aspect_ratio=body.aspect_ratio,
@@ -44,7 +43,8 @@ async def generate_rednote(
     if body.aspect_ratio:
         input["aspect_ratio"] = body.aspect_ratio
 
-    response = agent.invoke(
+    # 共享的 AsyncPostgresSaver 只支持异步调用
+    response = await agent.ainvoke(
         input,
         config=RunnableConfig(configurable={"thread_id": body.conversation_id}),
         context=RednoteContext(user_id=body.user_id, conversation_id=body.conversation_id),
@@ -2,19 +2,25 @@ import json
 import asyncio
 from typing import Annotated
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from fastapi.params import Header, Depends
 from starlette.requests import Request
 
 from lib import settings
 from api.deps import handle_chat, get_chat_service, get_canvas_service
+from lib.json_patch import JsonPatchError
 from api.services.chat import ChatService
-from api.schemas.canvas import CanvasCreate, CanvasResponse
-from api.services.canvas import CanvasService
+from api.schemas.canvas import CanvasCreate, CanvasResponse, CanvasSaveRequest
+from api.services.canvas import CanvasService, CanvasVersionConflict
 
 router = APIRouter()
 
 
+def _busy(e: CanvasVersionConflict) -> HTTPException:
+    """读取时画布持续被并发修改(多次回放增量都未读到一致的版本), 客户端稍后重试即可"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
 @router.get("/list", response_model=list[CanvasResponse])
 async def list_canvases(
     canvas_service: CanvasService = Depends(get_canvas_service),
@@ -54,20 +60,52 @@ async def create_canvas(
 
 @router.get("/{id}")
 async def get_canvas(id: str, canvas_service: CanvasService = Depends(get_canvas_service)):
-    canvas = await canvas_service.get_canvas_data(id)
+    try:
+        canvas = await canvas_service.get_canvas_data(id)
+    except CanvasVersionConflict as e:
+        raise _busy(e)
     return canvas
 
 
+@router.get("/{id}/layout")
+async def get_canvas_layout(id: str, canvas_service: CanvasService = Depends(get_canvas_service)):
+    """只返回元素的 id/类型/位置/尺寸, 用于布局计算"""
+    try:
+        layout = await canvas_service.get_canvas_layout(id)
+    except CanvasVersionConflict as e:
+        raise _busy(e)
+    if layout is None:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    version, elements = layout
+    return {"id": id, "version": version, "elements": elements}
+
+
 @router.post("/{id}/save")
 async def save_canvas(
     id: str,
-    request: Request,
+    payload: CanvasSaveRequest,
     canvas_service: CanvasService = Depends(get_canvas_service),
 ):
-    payload = await request.json()
-    data_str = json.dumps(payload["data"])
-    await canvas_service.save_canvas_data(id, data_str, payload["thumbnail"])
-    return {"id": id}
+    """
+    保存画布, 两种模式:
+    - 完整保存: {"data": {...}, "thumbnail": "...", "version": 可选}
+    - 增量保存: {"patch": [RFC 6902 操作], "version": 补丁基于的版本, "thumbnail": 可选}
+    缺少字段时返回 422; 版本不一致时返回 409, 客户端需重新获取画布后再提交
+    """
+    try:
+        if payload.patch is not None:
+            version = await canvas_service.patch_canvas_data(id, payload.version, payload.patch, payload.thumbnail)
+            if version is None:
+                raise HTTPException(status_code=404, detail="Canvas not found")
+            return {"id": id, "version": version}
+
+        data_str = json.dumps(payload.data)
+        canvas = await canvas_service.save_canvas_data(id, data_str, payload.thumbnail, version=payload.version)
+    except CanvasVersionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "version": e.current_version})
+    except JsonPatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"id": id, "version": canvas.version if canvas else None}
 
 
 @router.post("/{id}/rename")
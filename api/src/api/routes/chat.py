@@ -1,7 +1,7 @@
 from api.deps import get_chat_service, handle_chat
 from api.schemas.chat import ChatRequest, MagicCreate
 from api.services.chat import ChatService, handle_magic
-from api.services.stream import get_stream_task
+from api.services.stream import cancel_stream_task
 from fastapi import APIRouter, Depends
 
 router = APIRouter()
@@ -28,9 +28,7 @@ async def cancel_chat(session_id: str):
         {"status": "cancelled"} if the task was cancelled.
         {"status": "not_found_or_done"} if no such task exists or it is already done.
     """
-    task = get_stream_task(session_id)
-    if task and not task.done():
-        task.cancel()
+    if await cancel_stream_task(session_id):
         return {"status": "cancelled"}
     return {"status": "not_found_or_done"}
 
@@ -70,8 +68,6 @@ async def cancel_magic(session_id: str) -> dict[str, str]:
         {"status": "cancelled"} if the task was cancelled.
         {"status": "not_found_or_done"} if no such task exists or it is already done.
     """
-    task = get_stream_task(session_id)
-    if task and not task.done():
-        task.cancel()
+    if await cancel_stream_task(session_id):
         return {"status": "cancelled"}
     return {"status": "not_found_or_done"}
@@ -1,23 +1,26 @@
 import os
 import re
 import base64
-import hashlib
 from io import BytesIO
 from typing import Annotated
+from pathlib import Path
 from mimetypes import guess_type
 
 import httpx
 import uuid_utils
-from PIL import Image
-from fastapi import Body, File, APIRouter, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from PIL import Image, UnidentifiedImageError
+from fastapi import Body, File, Query, Request, APIRouter, UploadFile, HTTPException
 from fastapi.concurrency import run_in_threadpool
 from aiohttp.web_fileresponse import extension
 
-from lib import settings, upload_image
-from lib.image import parse_data_url_to_bytes
+from lib import settings
+from lib.dedup import ImageRecord, sha256_hex, image_index
+from lib.image import LocalStorage, get_storage, parse_data_url_to_bytes
 from lib.utils import generate_file_id
 from tools.types import ImageInfo
+from lib.compress import compress_image_async
+from lib.transfer import transfer_url
+from api.services.thumbnail import ThumbnailFormat, image_response
 
 router = APIRouter()
 files_dir = settings.data_dir / "files"
@@ -25,6 +28,31 @@ FILES_DIR = str(files_dir)
 os.makedirs(FILES_DIR, exist_ok=True)
 
 
+async def _store_uploaded_image(content: bytes, original_filename: str | None = None) -> ImageInfo:
+    """按内容去重上传, 相同图片复用已上传的地址, 不再重复解码与上传"""
+    sha256 = await run_in_threadpool(sha256_hex, content)
+    try:
+        record = await image_index.get_or_upload(content, prefix="creative/uploaded", sha256=sha256)
+    except UnidentifiedImageError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {exc}") from exc
+    return _uploaded_image_info(record, original_filename)
+
+
+def _uploaded_image_info(record: ImageRecord, original_filename: str | None = None) -> ImageInfo:
+    return ImageInfo(
+        id=str(uuid_utils.uuid7()),
+        url=record.url,
+        mime_type=record.mime_type,  # noqa
+        filename=record.filename,
+        original_filename=original_filename,
+        file_size=record.file_size,
+        width=record.width,
+        height=record.height,
+        image_format=record.extension,
+        sha256=record.sha256,
+    )
+
+
 @router.post("/upload_image", response_model=ImageInfo)
 async def upload_image_(file: Annotated[UploadFile, File(..., description="待上传文件对象")]):
 
@@ -33,30 +61,7 @@ async def upload_image_(file: Annotated[UploadFile, File(..., description="待
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Error reading file: {exc}") from exc
 
-    original_filename = file.filename
-    id = str(uuid_utils.uuid7())
-    image_pil = Image.open(BytesIO(content))
-    width, height = image_pil.size
-    mime_type = Image.MIME.get(image_pil.format)
-    extension = (image_pil.format or "png").lower().replace("jpeg", "jpg")
-    filename = f"{id}.{extension}"
-    sha256 = hashlib.sha256(content).hexdigest()
-    image_url = upload_image(filename, content, prefix="creative/uploaded", rename=False)
-
-    file_size = file.size
-    return ImageInfo(
-        id=id,
-        url=image_url,
-        mime_type=mime_type,  # noqa
-        filename=filename,
-        original_filename=original_filename,
-        file_size=file_size,
-        width=width,
-        height=height,
-        image_format=extension,
-        sha256=sha256,
-    )
-    pass
+    return await _store_uploaded_image(content, original_filename=file.filename)
 
 
 @router.post("/upload_image_from_url", response_model=ImageInfo)
@@ -78,41 +83,21 @@ async def upload_image_from_url(url: str | None = Body(None, embed=True)):
             mime_type=f"image/{extension.replace('jpg', 'jpeg')}",
         )
     else:
+        # 流式转存, 不在内存中保留完整图片
         async with httpx.AsyncClient(timeout=60, proxy=settings.proxy_url) as client:
             print(f"Downloading from URL: {url}")
-            response = await client.get(url)
-            response.raise_for_status()
-            content = response.content
-
-    original_filename = None
-    id = str(uuid_utils.uuid7())
-    image_pil = Image.open(BytesIO(content))
-    width, height = image_pil.size
-    mime_type = Image.MIME.get(image_pil.format)
-    extension = (image_pil.format or "png").lower().replace("jpeg", "jpg")
-    filename = f"{id}.{extension}"
-    sha256 = hashlib.sha256(content).hexdigest()
-    image_url = upload_image(filename, content, prefix="creative/uploaded", rename=False)
-
-    file_size = len(content)
-    return ImageInfo(
-        id=id,
-        url=image_url,
-        mime_type=mime_type,  # noqa
-        filename=filename,
-        original_filename=original_filename,
-        file_size=file_size,
-        width=width,
-        height=height,
-        image_format=extension,
-        sha256=sha256,
-    )
-    pass
+            try:
+                record = await transfer_url(url, prefix="creative/uploaded", client=client)
+            except UnidentifiedImageError as exc:
+                raise HTTPException(status_code=400, detail=f"Invalid image: {exc}") from exc
+        return _uploaded_image_info(record)
+
+    return await _store_uploaded_image(content)
 
 
 # 上传图片接口，支持表单提交
 @router.post("/upload_image_to_local")
-async def upload_image_to_local(file: UploadFile = File(...), max_size_mb: float = 3.0):
+async def upload_image_to_local(file: UploadFile = File(...), max_size_mb: float = Query(3.0, gt=0)):
     print("🦄upload_image file", file.filename)
     # 生成文件 ID 和文件名
     file_id = generate_file_id()
@@ -133,38 +118,18 @@ async def upload_image_to_local(file: UploadFile = File(...), max_size_mb: float
         if original_size_mb > max_size_mb:
             print(f"🦄 Image size ({original_size_mb:.2f}MB) exceeds limit ({max_size_mb}MB), compressing...")
 
-            # Convert to RGB if necessary (for JPEG compression)
-            if img.mode in ("RGBA", "LA", "P"):
-                # Create a white background for transparent images
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                if img.mode == "P":
-                    img = img.convert("RGBA")
-                background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-                img = background
-            elif img.mode != "RGB":
-                img = img.convert("RGB")
-
-            # Compress the image
-            compressed_content = compress_image(img, max_size_mb)
-
-            # Save compressed image using Image.save
-            extension = "jpg"  # Force JPEG for compressed images
+            # 在进程池中压缩, 直接写入压缩结果, 不再解码后重新编码
+            compressed = await compress_image_async(content, int(max_size_mb * 1024 * 1024))
+            extension = compressed.extension
             file_path = os.path.join(FILES_DIR, f"{file_id}.{extension}")
-
-            # Create new image from compressed content and save
-            with Image.open(BytesIO(compressed_content)) as compressed_img:
-                width, height = compressed_img.size
-                await run_in_threadpool(
-                    compressed_img.save,
-                    file_path,
-                    format="JPEG",
-                    quality=95,
-                    optimize=True,
-                )
-                # compressed_img.save(file_path, format='JPEG', quality=95, optimize=True)
-
-            final_size_mb = len(compressed_content) / (1024 * 1024)
-            print(f"🦄 Compressed from {original_size_mb:.2f}MB to {final_size_mb:.2f}MB")
+            await run_in_threadpool(Path(file_path).write_bytes, compressed.data)
+            width, height = compressed.width, compressed.height
+
+            final_size_mb = len(compressed.data) / (1024 * 1024)
+            print(
+                f"🦄 Compressed from {original_size_mb:.2f}MB to {final_size_mb:.2f}MB "
+                f"({compressed.format} {width}x{height} q{compressed.quality}, {compressed.encodes} encodes)"
+            )
         else:
             # Determine the file extension from original file
             mime_type, _ = guess_type(filename)
@@ -291,58 +256,48 @@ async def upload_image_from_url_to_local(
         raise HTTPException(status_code=400, detail=f"Failed to process image: {str(e)}")
 
 
-def compress_image(img: Image.Image, max_size_mb: float) -> bytes:
-    """
-    Compress an image to be under the specified size limit.
-    """
-    # Start with high quality
-    quality = 95
-
-    while quality > 10:
-        # Save to bytes buffer
-        buffer = BytesIO()
-        img.save(buffer, format="JPEG", quality=quality, optimize=True)
-
-        # Check size
-        size_mb = len(buffer.getvalue()) / (1024 * 1024)
-
-        if size_mb <= max_size_mb:
-            return buffer.getvalue()
-
-        # Reduce quality for next iteration
-        quality -= 10
-
-    # If still too large, try reducing dimensions
-    original_width, original_height = img.size
-    scale_factor = 0.8
-
-    while scale_factor > 0.3:
-        new_width = int(original_width * scale_factor)
-        new_height = int(original_height * scale_factor)
-        resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # Try with moderate quality
-        buffer = BytesIO()
-        resized_img.save(buffer, format="JPEG", quality=70, optimize=True)
-
-        size_mb = len(buffer.getvalue()) / (1024 * 1024)
-
-        if size_mb <= max_size_mb:
-            return buffer.getvalue()
-
-        scale_factor -= 0.1
-
-    # Last resort: very low quality
-    buffer = BytesIO()
-    resized_img.save(buffer, format="JPEG", quality=30, optimize=True)
-    return buffer.getvalue()
-
-
-# 文件下载接口
+# 文件下载接口, 传入 width/height/format/quality 时返回缩放后的图片(缩略图)
 @router.get("/file/{file_id}")
-async def get_file(file_id: str):
-    file_path = os.path.join(FILES_DIR, f"{file_id}")
-    print("🦄get_file file_path", file_path)
-    if not os.path.exists(file_path):
+async def get_file(
+    request: Request,
+    file_id: str,
+    width: int | None = Query(None, ge=1, description="最大宽度, 按比例缩小, 不放大"),
+    height: int | None = Query(None, ge=1, description="最大高度"),
+    format: ThumbnailFormat | None = Query(None, description="输出格式, 默认沿用原图格式"),
+    quality: int | None = Query(None, ge=1, le=95, description="编码质量"),
+):
+    file_path = Path(FILES_DIR) / file_id
+    if not file_path.resolve().is_relative_to(files_dir.resolve()) or not file_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    return await _image_response(request, file_path, width, height, format, quality)
+
+
+# 本地存储后端(storage.backend = "local")的文件访问接口, 参数同 /file/{file_id}
+@router.get("/storage/{key:path}")
+async def get_storage_file(
+    request: Request,
+    key: str,
+    width: int | None = Query(None, ge=1),
+    height: int | None = Query(None, ge=1),
+    format: ThumbnailFormat | None = Query(None),
+    quality: int | None = Query(None, ge=1, le=95),
+):
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        file_path = storage.path(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not file_path.is_file():
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+    return await _image_response(request, file_path, width, height, format, quality)
+
+
+async def _image_response(request: Request, file_path: Path, width, height, format, quality):
+    try:
+        return await image_response(request, file_path, width, height, format, quality)
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail="Not an image")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
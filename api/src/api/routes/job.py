@@ -0,0 +1,32 @@
+from uuid import UUID
+
+from fastapi import Query, APIRouter, HTTPException
+
+from api.domain.job import Job
+from api.services.jobs import publish_job, get_job_queue
+
+router = APIRouter()
+
+
+@router.get("", response_model=list[Job])
+async def list_jobs(session_id: str, limit: int = Query(50, ge=1, le=200)):
+    """会话最近的后台任务"""
+    return await get_job_queue().list_by_session(session_id, limit)
+
+
+@router.get("/{id}", response_model=Job)
+async def get_job(id: UUID):
+    job = await get_job_queue().get(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/{id}/cancel", response_model=Job)
+async def cancel_job(id: UUID):
+    """取消排队中的任务; 执行中的任务在 worker 下次续约时中断"""
+    job = await get_job_queue().cancel(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    await publish_job(job)
+    return job
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from lib import metrics
+from api.core.memory import memory_store, memory_checkpointer, update_memory_metrics
+from api.core.checkpointer import update_pool_metrics
+
+router = APIRouter()
+
+
+@router.get("")
+async def get_metrics():
+    update_pool_metrics()
+    update_memory_metrics()
+    return metrics.snapshot()
+
+
+@router.get("/prometheus", response_class=PlainTextResponse)
+async def get_metrics_prometheus():
+    update_pool_metrics()
+    update_memory_metrics()
+    return metrics.render_prometheus()
+
+
+@router.get("/memory")
+async def get_memory_usage():
+    """内存模式存储与 checkpointer 的占用与上限"""
+    return {"store": memory_store.usage(), "checkpointer": memory_checkpointer.usage()}
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from uuid import UUID
+
+from fastapi import Query, APIRouter
 from fastapi.params import Depends
 
 from api.deps import get_chat_service
@@ -6,6 +8,7 @@ from api.domain.tool import ToolInfo
 
 # services
 from api.domain.model import ModelInfo
+from api.schemas.chat import ChatHistoryPage
 from api.services.chat import ChatService
 
 # from services.config_service import config_service
@@ -104,3 +107,26 @@ async def get_chat_session(session_id: str, chat_service: ChatService = Depends(
 
     """
     return await chat_service.get_chat_history(session_id=session_id)
+
+
+@router.get("/chat_session/{session_id}/messages", response_model=ChatHistoryPage)
+async def get_chat_session_messages(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: UUID | None = Query(None, description="上一页返回的 next_cursor"),
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """
+    分页获取会话历史, 从最新的消息开始
+
+    """
+    return await chat_service.get_chat_history_page(session_id, limit=limit, before=before)
+
+
+@router.get("/chat_session/{session_id}/index")
+async def get_chat_session_index(session_id: str, chat_service: ChatService = Depends(get_chat_service)):
+    """
+    获取会话中消息的 id/role/工具调用 id, 不返回消息正文
+
+    """
+    return await chat_service.get_message_index(session_id=session_id)
@@ -1,6 +1,8 @@
+from typing import Literal
+
 from fastapi import APIRouter
 from pydantic import BaseModel
-from tools.images.seedream import image_create_with_seedream
+from tools.images.seedream import image_create_with_seedream_async
 
 router = APIRouter()
 
@@ -14,14 +16,19 @@ class SeedreamRequest(BaseModel):
     prompt: str
     image_urls: list[str] | str | None = None
     aspect_ratio: str | None = None
+    image_size: Literal["1K", "2K", "4K"] | None = "2K"
+    force_regenerate: bool = False
 
 
 @router.post("/image_create_with_seedream")
 async def call_image_create_with_seedream(seedream: SeedreamRequest):
-    resp = image_create_with_seedream(
+    # 开启 settings.tool_cache 时相同参数直接返回缓存的结果, force_regenerate 强制重新生成
+    resp = await image_create_with_seedream_async(
         prompt=seedream.prompt,
         image_urls=seedream.image_urls,
         aspect_ratio=seedream.aspect_ratio,
+        image_size=seedream.image_size,
+        force_regenerate=seedream.force_regenerate,
     )
     return resp
 
@@ -1,5 +1,15 @@
-# routers/websocket_router.py
-from api.states import add_connection, remove_connection, sio
+# routes/websocket.py
+from api.states import add_connection, remove_connection, sio, session_room, canvas_room
+
+
+def _rooms(data: dict | None) -> list[str]:
+    data = data or {}
+    rooms = []
+    if data.get("session_id"):
+        rooms.append(session_room(data["session_id"]))
+    if data.get("canvas_id"):
+        rooms.append(canvas_room(data["canvas_id"]))
+    return rooms
 
 
 @sio.event
@@ -9,7 +19,11 @@ async def connect(sid, environ, auth):
     user_info = auth or {}
     # print(f"{user_info=}")
     print(f"{user_info=}, {sid=}")
-    add_connection(sid, user_info)
+    await add_connection(sid, user_info)
+
+    # 连接时可通过 auth 直接订阅会话/画布
+    for room in _rooms(user_info):
+        await sio.enter_room(sid, room)
 
     await sio.emit("connected", {"status": "connected"}, room=sid)
 
@@ -17,7 +31,22 @@ async def connect(sid, environ, auth):
 @sio.event
 async def disconnect(sid):
     print(f"Client {sid} disconnected")
-    remove_connection(sid)
+    await remove_connection(sid)
+
+
+@sio.event
+async def subscribe(sid, data):
+    """订阅会话/画布房间, data: {"session_id": ..., "canvas_id": ...}"""
+    rooms = _rooms(data)
+    for room in rooms:
+        await sio.enter_room(sid, room)
+    await sio.emit("subscribed", {"rooms": rooms}, room=sid)
+
+
+@sio.event
+async def unsubscribe(sid, data):
+    for room in _rooms(data):
+        await sio.leave_room(sid, room)
 
 
 @sio.event
@@ -2,7 +2,7 @@ from uuid import UUID
 from typing import Any
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
 
 from api.domain.tool import ToolInfo
 from api.domain.model import ModelInfo
@@ -37,3 +37,25 @@ class CanvasSave(BaseModel):
     canvas_id: str | UUID
     data: str
     thumbnail: str | None
+
+
+class CanvasSaveRequest(BaseModel):
+    """
+    POST /canvas/{id}/save 的请求体, 两种模式:
+    - 完整保存: data 为画布数据, version 可选
+    - 增量保存: patch 为 RFC 6902 操作列表, version 为补丁基于的版本
+    """
+
+    data: Any = None
+    patch: list[dict] | None = None
+    version: int | None = None
+    thumbnail: str | None = None
+
+    @model_validator(mode="after")
+    def check_mode(self) -> "CanvasSaveRequest":
+        if self.patch is not None:
+            if self.version is None:
+                raise ValueError("增量保存需要提供 version")
+        elif self.data is None:
+            raise ValueError("需要提供 data 或 patch")
+        return self
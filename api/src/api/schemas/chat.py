@@ -48,6 +48,12 @@ class SessionCreate(BaseModel):
     model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 
+class ChatHistoryPage(BaseModel):
+    messages: list[Any]
+    # 更早一页的游标(本页最早一条消息的 id), 没有更多时为 None
+    next_cursor: str | None = None
+
+
 class MagicCreate(BaseModel):
     canvas_id: str | UUID | None = None
     messages: list[dict] | None = None
@@ -1,20 +1,94 @@
+import copy
 import json
 import uuid
 from abc import ABC, abstractmethod
 from uuid import UUID
+from typing import Any
+from itertools import chain
+from collections import OrderedDict
 
 import uuid_utils
-from sqlalchemy import delete, select, update
+from sqlalchemy import func, column, delete, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import JSONB
 
-from lib import upload_image, get_current_date
-from lib.image import parse_data_url, parse_data_url_to_bytes
+from lib import metrics, settings, upload_image, get_current_date
+from lib.image import LocalStorage, get_storage, parse_data_url, parse_data_url_to_bytes
 from api.models import ChatSession as ChatSessionModel
+from lib.layout import RowLayout
+from lib.json_patch import apply_patch
 from api.core.memory import AppStore
 from api.domain.chat import ChatSession
 from api.domain.canvas import Canvas
-from api.models.canvas import Canvas as CanvasModel
+from api.models.canvas import Canvas as CanvasModel, CanvasDelta
 from api.schemas.canvas import CanvasCreate
+from api.services.websocket import broadcast_session_update
+from tools.types import ImageInfo
+
+
+class CanvasVersionConflict(Exception):
+    """保存时提交的版本与当前版本不一致(其他客户端已修改)"""
+
+    def __init__(self, current_version: int | None):
+        super().__init__(f"画布版本冲突, 当前版本: {current_version}")
+        self.current_version = current_version
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _loads(data: Any) -> Any:
+    """JSONB 列读出即为对象, 兼容内存仓库与旧数据中的字符串"""
+    if isinstance(data, str):
+        return json.loads(data) if data.strip() else None
+    return data
+
+
+# 布局计算只需要的元素字段
+LAYOUT_FIELDS = ("id", "type", "x", "y", "width", "height", "isDeleted")
+
+
+def _layout(doc: Any) -> list[dict]:
+    elements = (doc or {}).get("elements")
+    if not isinstance(elements, list):
+        return []
+    return [{field: element.get(field) for field in LAYOUT_FIELDS} for element in elements]
+
+
+class CanvasDocumentCache:
+    """
+    进程内缓存最近保存的画布文档 canvas_id -> (version, doc), LRU 淘汰
+    保存增量时在缓存的文档上校验并应用补丁, 无需从数据库读取整个画布
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._cache: OrderedDict[str, tuple[int, Any]] = OrderedDict()
+
+    def get(self, id: str, version: int) -> Any | None:
+        cached = self._cache.get(id)
+        if cached is None or cached[0] != version:
+            return None
+        self._cache.move_to_end(id)
+        return cached[1]
+
+    def put(self, id: str, version: int, doc: Any):
+        self._cache[id] = (version, doc)
+        self._cache.move_to_end(id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def discard(self, id: str):
+        self._cache.pop(id, None)
+
+
+canvas_documents = CanvasDocumentCache(settings.canvas.document_cache_size)
+# 元素放置用的行布局索引 canvas_id -> (已保存的版本, RowLayout), 包含该版本之后放置但尚未保存的元素
+canvas_layouts = CanvasDocumentCache(settings.canvas.document_cache_size)
+# 新图片在画布上的最大显示边长, 与前端 addImageToExcalidraw 一致
+IMAGE_MAX_SIDE = 350
 
 
 class CanvasRepo(ABC):
@@ -30,12 +104,28 @@ class CanvasRepo(ABC):
     async def get_canvas_data(self, id: str | UUID) -> dict | None:
         pass
 
+    @abstractmethod
+    async def get_canvas_layout(self, id: str | UUID) -> tuple[int, list[dict]] | None:
+        """只读取 (当前版本, 元素的 id/类型/位置/尺寸(LAYOUT_FIELDS)), 画布不存在时返回 None"""
+        pass
+
     @abstractmethod
     async def get_canvases(self, user_id: str | None = None, page: int = 1, page_size: int = 20):
         pass
 
     @abstractmethod
-    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str):
+    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str | None, version: int | None = None):
+        """保存完整画布数据, 传入 version 时进行版本校验"""
+        pass
+
+    @abstractmethod
+    async def patch_canvas_data(
+        self, id: str | UUID, version: int, patch: list[dict], thumbnail: str | None = None
+    ) -> int | None:
+        """
+        在 version 版本上应用 JSON Patch, 返回新版本, 画布不存在时返回 None
+        版本不一致时抛出 CanvasVersionConflict, 补丁无法应用时抛出 JsonPatchError
+        """
         pass
 
     @abstractmethod
@@ -75,11 +165,18 @@ class InMemoryCanvasRepo(CanvasRepo):
             data = {
                 "data": canvas.data,
                 "name": canvas.name,
+                "version": canvas.version,
                 "sessions": sessions,
             }
             return data
         return None
 
+    async def get_canvas_layout(self, id: str | UUID) -> tuple[int, list[dict]] | None:
+        canvas = self.store.canvas.get(id, None)
+        if canvas is None:
+            return None
+        return canvas.version, _layout(_loads(canvas.data))
+
     async def get_canvases(self, user_id: str | None = None, page: int = 1, page_size: int = 20) -> list[Canvas] | None:
         if len(self.store.canvas.items()) == 0:
             return None
@@ -94,19 +191,45 @@ class InMemoryCanvasRepo(CanvasRepo):
             self.store.canvas.pop(id)
         return True
 
-    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str) -> Canvas | None:
+    async def save_canvas_data(
+        self, id: str | UUID, data: str, thumbnail: str | None, version: int | None = None
+    ) -> Canvas | None:
         async with self.store.lock:
             raw = await self.get_canvas_by_id(id)
             if raw:
+                if version is not None and raw.version != version:
+                    raise CanvasVersionConflict(raw.version)
                 raw.data = data
-                raw.thumbnail = thumbnail
+                if thumbnail is not None:
+                    raw.thumbnail = thumbnail
                 raw.updated_at = get_current_date()
+                raw.version += 1
+                raw.snapshot_version = raw.version
 
             print(raw)
 
             # 显式修改 数据
             self.store.canvas[id] = raw
-        pass
+        return raw
+
+    async def patch_canvas_data(
+        self, id: str | UUID, version: int, patch: list[dict], thumbnail: str | None = None
+    ) -> int | None:
+        async with self.store.lock:
+            canvas = self.store.canvas.get(id)
+            if canvas is None:
+                return None
+            if canvas.version != version:
+                raise CanvasVersionConflict(canvas.version)
+            data = _loads(canvas.data) if isinstance(canvas.data, str) else copy.deepcopy(canvas.data or {})
+            canvas.data = apply_patch(data, patch)
+            if thumbnail is not None:
+                canvas.thumbnail = thumbnail
+            canvas.updated_at = get_current_date()
+            canvas.version += 1
+            # 重新写入以更新内存占用的估算
+            self.store.canvas[id] = canvas
+            return canvas.version
 
     async def rename_canvas(self, id: str | UUID, name: str) -> Canvas:
         canvas = self.store.canvas.get(id)
@@ -120,14 +243,13 @@ class PostgresCanvasRepo(CanvasRepo):
         self.session = session
 
     async def create_canvas(self, canvas: CanvasCreate) -> Canvas:
-        messages = json.dumps(canvas.messages, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
         canvas_db = CanvasModel(
             id=canvas.canvas_id,
             name=canvas.name,
             canvas_id=canvas.canvas_id,
             session_id=canvas.session_id,
             user_id=canvas.user_id,
-            messages=messages,
+            messages=canvas.messages,
         )
         self.session.add(canvas_db)
         self.session.commit()
@@ -152,14 +274,83 @@ class PostgresCanvasRepo(CanvasRepo):
             chat_sessions = result.scalars().all()
             sessions = [ChatSession.model_validate(session) for session in chat_sessions]
 
+            version, canvas_data = canvas.version, canvas.data
+            if canvas.version != canvas.snapshot_version:
+                # 快照之后还有增量, 回放得到最新数据
+                canvas_data = self._replay(str(id), canvas.data or {}, canvas.snapshot_version, canvas.version)
+                if canvas_data is None:
+                    version, canvas_data = self._materialize(str(id))
             data = {
-                "data": canvas.data,
+                "data": canvas_data,
                 "name": canvas.name,
+                "version": version,
                 "sessions": sessions,
             }
             return data
         return None
 
+    async def get_canvas_layout(self, id: str | UUID) -> tuple[int, list[dict]] | None:
+        id = str(id)
+        stmt = select(CanvasModel.version, CanvasModel.snapshot_version).where(CanvasModel.id == id)
+        row = self.session.execute(stmt).one_or_none()
+        if row is None:
+            return None
+        if row.version != row.snapshot_version:
+            # 快照之后还有增量, 在最新文档上取字段
+            version, doc = row.version, canvas_documents.get(id, row.version)
+            if doc is None:
+                version, doc = self._materialize(id)
+            return version, _layout(doc)
+
+        # 在数据库中展开 elements 并只取布局字段, 不传输整个画布
+        elements = CanvasModel.data["elements"]
+        element = func.jsonb_array_elements(elements).table_valued(column("value", JSONB)).render_derived("element")
+        stmt = (
+            select(
+                CanvasModel.version,
+                func.jsonb_build_object(*chain.from_iterable((f, element.c.value[f]) for f in LAYOUT_FIELDS)),
+            )
+            .select_from(CanvasModel, element)
+            .where(CanvasModel.id == id, func.jsonb_typeof(elements) == "array")
+        )
+        rows = self.session.execute(stmt).all()
+        # 版本与元素在同一条语句中读取, 两者对应同一份数据
+        return (rows[0][0] if rows else row.version), [layout for _, layout in rows]
+
+    def _replay(self, id: str, doc: Any, snapshot_version: int, version: int) -> Any | None:
+        """在快照上按顺序应用增量; 增量不完整(期间被其他进程合并)时返回 None"""
+        if version == snapshot_version:
+            return doc
+        stmt = (
+            select(CanvasDelta.patch)
+            .where(
+                CanvasDelta.canvas_id == id,
+                CanvasDelta.version > snapshot_version,
+                CanvasDelta.version <= version,
+            )
+            .order_by(CanvasDelta.version)
+        )
+        patches = self.session.execute(stmt).scalars().all()
+        if len(patches) != version - snapshot_version:
+            return None
+        for patch in patches:
+            doc = apply_patch(doc, json.loads(patch))
+        return doc
+
+    def _materialize(self, id: str) -> tuple[int | None, Any]:
+        """读取快照并回放增量, 返回 (当前版本, 文档)"""
+        for _ in range(3):
+            stmt = select(CanvasModel.data, CanvasModel.version, CanvasModel.snapshot_version).where(
+                CanvasModel.id == id
+            )
+            row = self.session.execute(stmt).one_or_none()
+            if row is None:
+                return None, None
+            doc = self._replay(id, _loads(row.data) or {}, row.snapshot_version, row.version)
+            if doc is not None:
+                return row.version, doc
+        raise CanvasVersionConflict(None)
+
     async def get_canvases(self, user_id: str | None = None, page: int = 1, page_size: int = 20) -> list[Canvas] | None:
 
         stmt = select(CanvasModel)
@@ -182,39 +373,117 @@ class PostgresCanvasRepo(CanvasRepo):
         self.session.commit()
         return True
 
-    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str) -> Canvas | None:
-        stmt = select(CanvasModel).where(CanvasModel.id == str(id))
-        result = self.session.execute(stmt)
-        canvas_db = result.scalar_one_or_none()
+    @staticmethod
+    def _thumbnail(thumbnail: str | None) -> str | None:
+        if not thumbnail:
+            return None
         thumbnail_url = None
         if thumbnail.startswith("https://cdn.fullspeed.cn/"):
             thumbnail_url = thumbnail
         elif thumbnail.startswith("http"):
             raise ValueError("未知的图像来源! 待实现")
             pass
-        elif not thumbnail:
-            thumbnail_url = None
         else:
             thumbnail_url = parse_data_url(thumbnail, prefix="thumbnail")
+        if not thumbnail_url:
+            return None
+        # 本地存储没有 OSS 的图片处理参数, 由 /api/storage 的缩放参数生成缩略图
+        storage = get_storage()
+        if isinstance(storage, LocalStorage) and thumbnail_url.startswith(storage.base_url):
+            return thumbnail_url + "?height=320"
+        return thumbnail_url + "?x-oss-process=image/resize,h_320"
+
+    async def save_canvas_data(
+        self, id: str | UUID, data: str, thumbnail: str | None, version: int | None = None
+    ) -> Canvas | None:
+        stmt = select(CanvasModel).where(CanvasModel.id == str(id))
+        result = self.session.execute(stmt)
+        canvas_db = result.scalar_one_or_none()
 
         if canvas_db:
-            stmt = (
-                update(CanvasModel)
-                .where(CanvasModel.id == str(id))
-                .values(
-                    data=data,
-                    thumbnail=thumbnail_url + "?x-oss-process=image/resize,h_320" if thumbnail_url else None,
-                    updated_at=get_current_date(),
-                )
-            )
-            self.session.execute(stmt)
+            values = {
+                "data": data,
+                "version": CanvasModel.version + 1,
+                "snapshot_version": CanvasModel.version + 1,
+                "updated_at": get_current_date(),
+            }
+            # 未提交缩略图时保留原有缩略图
+            if thumbnail is not None:
+                values["thumbnail"] = self._thumbnail(thumbnail)
+            # 完整保存即新快照, 之前的增量不再需要
+            stmt = update(CanvasModel).where(CanvasModel.id == str(id)).values(**values)
+            if version is not None:
+                stmt = stmt.where(CanvasModel.version == version)
+            if self.session.execute(stmt).rowcount == 0:
+                self.session.rollback()
+                raise CanvasVersionConflict(self._current_version(str(id)))
+            self.session.execute(delete(CanvasDelta).where(CanvasDelta.canvas_id == str(id)))
             self.session.commit()
+            canvas_documents.discard(str(id))
+            metrics.inc("canvas_save_bytes_total", len(data), mode="full")
             self.session.refresh(canvas_db)
             return Canvas.model_validate(canvas_db)
         return None
 
         pass
 
+    def _current_version(self, id: str) -> int | None:
+        return self.session.execute(select(CanvasModel.version).where(CanvasModel.id == id)).scalar_one_or_none()
+
+    async def patch_canvas_data(
+        self, id: str | UUID, version: int, patch: list[dict], thumbnail: str | None = None
+    ) -> int | None:
+        id = str(id)
+        stmt = select(CanvasModel.version, CanvasModel.snapshot_version).where(CanvasModel.id == id)
+        row = self.session.execute(stmt).one_or_none()
+        if row is None:
+            return None
+        if row.version != version:
+            raise CanvasVersionConflict(row.version)
+
+        # 会话为同步调用, 方法内没有 await, 同一进程内的保存不会交错修改缓存的文档
+        doc = canvas_documents.get(id, version)
+        if doc is None:
+            current, doc = self._materialize(id)
+            if current != version:
+                raise CanvasVersionConflict(current)
+
+        new_version = version + 1
+        # 快照之后累积的增量达到阈值时合并为新快照
+        compact = new_version - row.snapshot_version >= settings.canvas.compact_every
+        try:
+            doc = apply_patch(doc, patch)
+            values = {"version": new_version, "updated_at": get_current_date()}
+            if thumbnail is not None:
+                values["thumbnail"] = self._thumbnail(thumbnail)
+            if compact:
+                snapshot = _dumps(doc)
+                values.update(data=snapshot, snapshot_version=new_version)
+            # 乐观锁: 只有版本未变时才更新, 行锁使并发保存串行化
+            stmt = update(CanvasModel).where(CanvasModel.id == id, CanvasModel.version == version).values(**values)
+            if self.session.execute(stmt).rowcount == 0:
+                raise CanvasVersionConflict(None)
+            if compact:
+                self.session.execute(delete(CanvasDelta).where(CanvasDelta.canvas_id == id))
+                written = len(snapshot)
+            else:
+                delta = _dumps(patch)
+                self.session.add(CanvasDelta(canvas_id=id, version=new_version, patch=delta))
+                written = len(delta)
+            self.session.commit()
+        except (CanvasVersionConflict, IntegrityError):
+            self.session.rollback()
+            canvas_documents.discard(id)
+            raise CanvasVersionConflict(self._current_version(id))
+        except BaseException:
+            self.session.rollback()
+            canvas_documents.discard(id)
+            raise
+
+        canvas_documents.put(id, new_version, doc)
+        metrics.inc("canvas_save_bytes_total", written, mode="compact" if compact else "delta")
+        return new_version
+
     async def rename_canvas(self, id: str | UUID, name: str) -> Canvas:
         stmt = select(CanvasModel).where(CanvasModel.id == str(id))
         result = self.session.execute(stmt)
@@ -250,6 +519,19 @@ class CanvasService:
     async def get_canvas_data(self, id: str | UUID) -> Canvas | None:
         return await self.repo.get_canvas_data(id)
 
+    async def get_canvas_layout(self, id: str | UUID) -> tuple[int, list[dict]] | None:
+        return await self.repo.get_canvas_layout(id)
+
+    async def place_elements(
+        self, id: str | UUID, sizes: list[tuple[float, float]]
+    ) -> list[tuple[float, float]] | None:
+        """为一批新元素计算位置, 复用该画布当前版本的布局索引, 画布不存在时返回 None"""
+        layout = await self.repo.get_canvas_layout(id)
+        if layout is None:
+            return None
+        version, elements = layout
+        return await find_next_best_element_positions({"elements": elements}, sizes, canvas_id=str(id), version=version)
+
     async def save_canvas(self, id: str | UUID, data: str, thumbnail: str):
         canvas = await self.repo.get_canvas_by_id(id)
         if canvas:
@@ -258,8 +540,13 @@ class CanvasService:
             return await self.repo.save_canvas(canvas)
         return None
 
-    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str):
-        return await self.repo.save_canvas_data(id, data, thumbnail)
+    async def save_canvas_data(self, id: str | UUID, data: str, thumbnail: str | None, version: int | None = None):
+        return await self.repo.save_canvas_data(id, data, thumbnail, version=version)
+
+    async def patch_canvas_data(
+        self, id: str | UUID, version: int, patch: list[dict], thumbnail: str | None = None
+    ) -> int | None:
+        return await self.repo.patch_canvas_data(id, version, patch, thumbnail)
 
     async def delete_canvas(self, id: str | UUID) -> bool:
         return await self.repo.delete_canvas(id)
@@ -292,54 +579,71 @@ class CanvasService:
 async def find_next_best_element_position(canvas_data, max_num_per_row=4, spacing=20):
     """
     Calculates the next best position for a new element on the canvas.
-    This final version uses a robust row detection algorithm to handle complex layouts.
+    Elements are grouped into rows by vertical overlap, see lib.layout.RowLayout.
+    """
+    layout = RowLayout.from_elements(canvas_data.get("elements", []), max_num_per_row, spacing)
+    return layout.next_position()
+
+
+async def find_next_best_element_positions(
+    canvas_data,
+    sizes: list[tuple[float, float]],
+    max_num_per_row=4,
+    spacing=20,
+    *,
+    canvas_id: str | None = None,
+    version: int | None = None,
+) -> list[tuple[float, float]]:
     """
-    elements = canvas_data.get("elements", [])
-
-    media_elements = [
-        e for e in elements if e.get("type") in ["image", "embeddable", "video"] and not e.get("isDeleted")
-    ]
-
-    if not media_elements:
-        return 0, 0
-
-    # Sort elements by their top-left corner
-    media_elements.sort(key=lambda e: (e.get("y", 0), e.get("x", 0)))
-
-    # Group elements into rows based on vertical overlap
-    rows = []
-    for element in media_elements:
-        y, height = element.get("y", 0), element.get("height", 0)
-        placed = False
-        for row in rows:
-            # Check if the element vertically overlaps with any element in the row
-            if any(max(y, r.get("y", 0)) < min(y + height, r.get("y", 0) + r.get("height", 0)) for r in row):
-                row.append(element)
-                placed = True
-                break
-        if not placed:
-            rows.append([element])
-
-    # Sort rows by their average y-coordinate
-    rows.sort(key=lambda row: sum(e.get("y", 0) for e in row) / len(row))
-
-    if not rows:
-        return 0, 0
-
-    last_row = rows[-1]
-    last_row.sort(key=lambda e: e.get("x", 0))
-
-    if len(last_row) < max_num_per_row:
-        # Add to the last row
-        rightmost_element = last_row[-1]
-        new_x = rightmost_element.get("x", 0) + rightmost_element.get("width", 0) + spacing
-        # Align with the top of the last row for consistency
-        new_y = min(e.get("y", 0) for e in last_row)
-    else:
-        # Start a new row
-        new_x = 0
-        # Position below the entire last row
-        bottom_of_last_row = max(e.get("y", 0) + e.get("height", 0) for e in last_row)
-        new_y = bottom_of_last_row + spacing
-
-    return new_x, new_y
+    一次放置多个新元素, sizes 为 (width, height) 列表, 返回对应的位置
+    传入 canvas_id 与 version(canvas_data 对应的已保存版本) 时复用该画布的布局索引:
+    同一版本上的多次调用共用索引, 后一次调用会避开前一次放置但尚未保存的元素; 版本变化(任何保存)时按 canvas_data 重建.
+    RowLayout.place 只近似重建的结果, 同一批元素保存后重建与复用索引放置的位置可能略有不同.
+    """
+    layout = None
+    if canvas_id is not None and version is not None:
+        layout = canvas_layouts.get(canvas_id, version)
+    if layout is None or (layout.max_num_per_row, layout.spacing) != (max_num_per_row, spacing):
+        layout = RowLayout.from_elements(canvas_data.get("elements", []), max_num_per_row, spacing)
+
+    positions = layout.place_many(sizes)
+    if canvas_id is not None and version is not None:
+        canvas_layouts.put(canvas_id, version, layout)
+    return positions
+
+
+def display_size(width: float, height: float, max_side: float = IMAGE_MAX_SIDE) -> tuple[float, float]:
+    ratio = min(1, max_side / width, max_side / height)
+    return width * ratio, height * ratio
+
+
+async def place_images(canvas_id: str | None, images: list[ImageInfo]) -> list[dict]:
+    """
+    为一批生成的图片计算画布上的位置与显示尺寸, 返回与 images 对应的 {"x", "y", "width", "height"}
+    画布不存在或图片尺寸未知时返回空字典, 由前端按原逻辑放置
+    """
+    if not canvas_id or not all(image.width and image.height for image in images):
+        return [{} for _ in images]
+    # api.deps 间接导入了工具模块, 延迟导入避免循环依赖
+    from api.deps import open_canvas_service
+
+    sizes = [display_size(image.width, image.height) for image in images]
+    try:
+        async with open_canvas_service() as service:
+            positions = await service.place_elements(canvas_id, sizes)
+    except Exception as e:
+        print(f"Error placing images on canvas {canvas_id}: {e}")
+        positions = None
+    if positions is None:
+        return [{} for _ in images]
+    return [dict(x=x, y=y, width=width, height=height) for (x, y), (width, height) in zip(positions, sizes)]
+
+
+async def broadcast_generated_images(session_id: str, canvas_id: str | None, images: list[ImageInfo], **extra: Any):
+    """推送生成的图片, 整批图片按画布布局一次放置, 前端按给定的位置与显示尺寸添加"""
+    for image, placement in zip(images, await place_images(canvas_id, images)):
+        await broadcast_session_update(
+            session_id,
+            canvas_id,
+            {"type": "image_generated", "element": "", "file": "", "image_url": image.url, **placement, **extra},
+        )
@@ -1,11 +1,14 @@
+import bisect
 import asyncio
 import json
+import traceback
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Callable, Dict, List
+from uuid import UUID
 
 import uuid_utils as uuid
-from sqlalchemy import Insert, delete, func, select, update
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Insert, cast, delete, func, select, update
+from sqlalchemy.dialects.postgresql import JSONPATH, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
@@ -20,13 +23,24 @@ from api.models import (
 from api.models import (
     ChatSession as ChatSessionModel,
 )
-from api.schemas.chat import ChatCreate, MagicCreate, SessionCreate
+from api.schemas.chat import ChatCreate, ChatHistoryPage, MagicCreate, SessionCreate
 from api.services.stream import add_stream_task, remove_stream_task
-from api.services.websocket import broadcast_session_update, send_to_websocket
+from api.services.websocket import broadcast_session_update
 from lib.image import parse_data_url
 from tools.images.gemini import magic_generate_with_gemini
 
 
+def _message_uuid(id: Any) -> UUID:
+    return id if isinstance(id, UUID) else UUID(str(id))
+
+
+def _loads(message: Any) -> Any:
+    """JSONB 列读出即为对象, 兼容旧数据中的 JSON 字符串"""
+    if isinstance(message, str):
+        return json.loads(message)
+    return message
+
+
 class ChatRepo(ABC):
     @abstractmethod
     async def create_chat(self, id: int, name: str):
@@ -51,6 +65,10 @@ class ChatRepo(ABC):
     async def create_message_async(self, message: ChatCreate):
         pass
 
+    @abstractmethod
+    async def create_messages_async(self, messages: list[dict]) -> None:
+        pass
+
     @abstractmethod
     def chat_message(self, message: ChatCreate):
         pass
@@ -59,6 +77,16 @@ class ChatRepo(ABC):
     async def get_chat_history(self, session_id: str):
         pass
 
+    @abstractmethod
+    async def get_chat_history_page(self, session_id: str, limit: int, before: UUID | None = None) -> ChatHistoryPage:
+        """按 id(uuid7, 随写入时间递增)倒序取 before 之前最新的 limit 条消息, 页内按时间正序返回"""
+        pass
+
+    @abstractmethod
+    async def get_message_index(self, session_id: str) -> list[dict]:
+        """只读取消息的 id/role/tool_call_id/tool_call_ids, 不加载消息正文"""
+        pass
+
     @abstractmethod
     async def save_chat(self, chat: Chat) -> Chat:
         pass
@@ -85,6 +113,8 @@ class InMemoryChatRepo(ChatRepo):
         self.chat: dict[int, Chat] = store.chat
         self.chat_session: dict[str, ChatSession] = store.chat_session
         self.chat_message: dict[str, ChatMessage] = store.chat_message
+        self.chat_message_ids: dict[str, list[UUID]] = store.chat_message_ids
+        self.chat_message_lc_ids: dict[str, UUID] = store.chat_message_lc_ids
         self.next_id = 1
 
     async def create_chat(self, id: int, name: str) -> Chat:
@@ -97,20 +127,55 @@ class InMemoryChatRepo(ChatRepo):
             chat.messages.append(message)
         return chat
 
+    def _put_message(self, chat_message: ChatMessage):
+        id = _message_uuid(chat_message.id)
+        self.chat_message[id] = chat_message
+        if chat_message.lc_id:
+            self.chat_message_lc_ids[chat_message.lc_id] = id
+        ids = self.chat_message_ids.get(chat_message.session_id, [])
+        # uuid7 随时间递增, 通常直接追加到末尾
+        index = bisect.bisect_left(ids, id)
+        if index == len(ids) or ids[index] != id:
+            ids.insert(index, id)
+            # 重新写入, 使有上限的映射重新估算索引的大小
+            self.chat_message_ids[chat_message.session_id] = ids
+
     async def get_chat_history(self, session_id: str) -> list[dict]:
         messages = []
-
-        matched_messages = [message for message in self.chat_message.values() if message.session_id == session_id]
-        messages_raw = sorted(matched_messages, key=lambda m: str(m.created_at))
-        for chat_message in messages_raw:
-            if chat_message.message:
-                try:
-                    msg = json.loads(chat_message.message)
-                    messages.append(msg)
-                except:
-                    pass
+        for id in self.chat_message_ids.get(session_id, []):
+            chat_message = self.chat_message.get(id)
+            if chat_message and chat_message.message:
+                messages.append(_loads(chat_message.message))
         return messages
 
+    async def get_chat_history_page(self, session_id: str, limit: int, before: UUID | None = None) -> ChatHistoryPage:
+        ids = self.chat_message_ids.get(session_id, [])
+        index = bisect.bisect_left(ids, before) if before else len(ids)
+        page: list[tuple[UUID, Any]] = []
+        while index > 0 and len(page) < limit:
+            index -= 1
+            chat_message = self.chat_message.get(ids[index])
+            if chat_message and chat_message.message:
+                page.append((ids[index], _loads(chat_message.message)))
+        page.reverse()
+        return ChatHistoryPage(
+            messages=[message for _, message in page],
+            next_cursor=str(page[0][0]) if page and index > 0 else None,
+        )
+
+    async def get_message_index(self, session_id: str) -> list[dict]:
+        index = []
+        for message in await self.get_chat_history(session_id):
+            if not isinstance(message, dict):
+                continue
+            index.append({
+                "id": message.get("id"),
+                "role": message.get("role"),
+                "tool_call_id": message.get("tool_call_id"),
+                "tool_call_ids": [call.get("id") for call in message.get("tool_calls") or []],
+            })
+        return index
+
     async def save_chat(self, chat: Chat) -> Chat:
         self.chat[chat.id] = chat
         return chat
@@ -139,12 +204,24 @@ class InMemoryChatRepo(ChatRepo):
         message_id: str = None,
         lc_id: str = None,
     ):
-        id = message_id or str(uuid.uuid4())
+        id = message_id or str(uuid.uuid7())
         chat_message = ChatMessage(id=id, session_id=session_id, role=role, message=message, lc_id=lc_id)
-        self.chat_message[id] = chat_message
+        self._put_message(chat_message)
 
         return chat_message
 
+    async def create_messages_async(self, messages: list[dict]) -> None:
+        # 与 postgres 的 ON CONFLICT (lc_id) 语义保持一致
+        for item in messages:
+            id = self.chat_message_lc_ids.get(item.get("lc_id")) or item["id"]
+            self._put_message(ChatMessage(**{**item, "id": id}))
+
+    async def create_message_async(self, session_id: str, role: str, message: str, message_id: str = None):
+        return await self.create_message(session_id, role, message, message_id)
+
+    def get_latest_chat_message(self):
+        return max(self.chat_message.values(), key=lambda message: message.id, default=None)
+
 
 class PostgresChatRepo(ChatRepo):
     def __init__(self, session: Session, asession: AsyncSession):
@@ -163,12 +240,42 @@ class PostgresChatRepo(ChatRepo):
         pass
 
     async def get_chat_history(self, session_id: str) -> list[dict]:
-        stmt = select(ChatMessageModel).where(ChatMessageModel.session_id == session_id).order_by(ChatMessageModel.id)
-        result = self.session.execute(stmt)
-        rows: list[ChatMessageModel] = result.scalars().all()
-        messages = [json.loads(row.message) for row in rows]
-        return messages
-        pass
+        stmt = (
+            select(ChatMessageModel.message)
+            .where(ChatMessageModel.session_id == session_id)
+            .order_by(ChatMessageModel.id)
+        )
+        return [_loads(message) for message in self.session.execute(stmt).scalars() if message is not None]
+
+    async def get_chat_history_page(self, session_id: str, limit: int, before: UUID | None = None) -> ChatHistoryPage:
+        # 走 (session_id, id) 索引, 只读取一页
+        stmt = select(ChatMessageModel.id, ChatMessageModel.message).where(
+            ChatMessageModel.session_id == session_id, ChatMessageModel.message.is_not(None)
+        )
+        if before is not None:
+            stmt = stmt.where(ChatMessageModel.id < before)
+        rows = self.session.execute(stmt.order_by(ChatMessageModel.id.desc()).limit(limit + 1)).all()
+        more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        return ChatHistoryPage(
+            messages=[_loads(row.message) for row in rows],
+            next_cursor=str(rows[0].id) if rows and more else None,
+        )
+
+    async def get_message_index(self, session_id: str) -> list[dict]:
+        message = ChatMessageModel.message
+        tool_call_ids = func.jsonb_path_query_array(message, cast("$.tool_calls[*].id", JSONPATH))
+        stmt = (
+            select(
+                message["id"].astext.label("id"),
+                message["role"].astext.label("role"),
+                message["tool_call_id"].astext.label("tool_call_id"),
+                tool_call_ids.label("tool_call_ids"),
+            )
+            .where(ChatMessageModel.session_id == session_id, message.is_not(None))
+            .order_by(ChatMessageModel.id)
+        )
+        return [dict(row._mapping) for row in self.session.execute(stmt)]
 
     async def save_chat(self, chat: Chat) -> Chat:
         chat_db = ChatModel(**chat.model_dump(exclude_unset=True))
@@ -295,6 +402,23 @@ class PostgresChatRepo(ChatRepo):
 
         pass
 
+    async def create_messages_async(self, messages: list[dict]) -> None:
+        """一条 INSERT ... ON CONFLICT 批量写入消息, messages 中的 lc_id 不能重复"""
+        if not messages:
+            return
+        stmt = insert(ChatMessageModel).values(messages)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["lc_id"],
+            set_={
+                "session_id": stmt.excluded.session_id,
+                "role": stmt.excluded.role,
+                "message": stmt.excluded.message,
+                "updated_at": func.now(),
+            },
+        )
+        await self.asession.execute(stmt)
+        await self.asession.commit()
+
     def get_latest_chat_message(self):
         stmt = select(ChatMessageModel).order_by(ChatMessageModel.id.desc()).limit(1)
         result = self.session.execute(stmt)
@@ -330,6 +454,16 @@ class ChatService:
         """Get chat history for a session"""
         return await self.repo.get_chat_history(session_id)
 
+    async def get_chat_history_page(
+        self, session_id: str, limit: int = 50, before: UUID | None = None
+    ) -> ChatHistoryPage:
+        """Get the newest messages before the cursor"""
+        return await self.repo.get_chat_history_page(session_id, limit, before)
+
+    async def get_message_index(self, session_id: str) -> list[dict]:
+        """Get message ids, roles and tool call ids for a session"""
+        return await self.repo.get_message_index(session_id)
+
     async def get_sessions(self, canvas_id: str) -> list[ChatSession]:
         """List all chat sessions"""
         return await self.repo.get_sessions(canvas_id)
@@ -340,6 +474,84 @@ class ChatService:
         return await self.repo.create_message_async(session_id, role, message, message_id)
 
 
+class ChatMessageWriter:
+    """
+    会话级消息写缓冲(write-behind)
+
+    按 lc_id 合并同一条消息的多次 upsert, 达到数量阈值或时间阈值时通过 write 批量落库,
+    写入失败的消息留在缓冲中重试; 流结束时调用 close() 保证最后一次 flush 完成, 仍失败时抛出异常.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        write: Callable[[list[dict]], Awaitable[None]],
+        *,
+        max_batch: int = 20,
+        flush_interval: float = 0.5,
+    ):
+        self.session_id = session_id
+        self.write = write
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self.last_error: Exception | None = None
+
+    async def add(
+        self,
+        role: str,
+        message: str,
+        message_id: str = None,
+        lc_id: str = None,
+    ) -> None:
+        id = message_id or str(uuid.uuid7())
+        self._pending[lc_id or id] = dict(id=id, session_id=self.session_id, role=role, message=message, lc_id=lc_id)
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        if not await self.flush() and self._timer is None:
+            # 写入失败的消息留在缓冲中, 稍后重试
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> bool:
+        """写入失败时消息放回缓冲(不覆盖期间更新的同一条消息), 返回是否成功"""
+        async with self._lock:
+            if not self._pending:
+                return True
+            pending, self._pending = self._pending, {}
+            try:
+                await self.write(list(pending.values()))
+            except Exception as e:
+                pending.update(self._pending)
+                self._pending = pending
+                self.last_error = e
+                print(f"Error flushing {len(pending)} messages for session {self.session_id}: {e}")
+                traceback.print_exc()
+                return False
+            return True
+
+    async def close(self, retries: int = 3) -> None:
+        """最后一次 flush, 失败时重试, 仍失败则抛出异常, 不静默丢失消息"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for attempt in range(retries + 1):
+            if await self.flush():
+                return
+            if attempt < retries:
+                await asyncio.sleep(self.flush_interval * 2**attempt)
+        raise RuntimeError(
+            f"Failed to persist {len(self._pending)} messages for session {self.session_id}"
+        ) from self.last_error
+
+
 # services/magic_service.py
 
 # Import necessary modules
@@ -396,8 +608,7 @@ async def handle_magic(magic: MagicCreate, chat_service: ChatService) -> None:
             session_id,
             messages[-1].get("role", "user"),
             json.dumps(messages[-1], ensure_ascii=False),
-            messages[-1].get("id"),
-            messages[-1].get("id"),
+            lc_id=messages[-1].get("id"),
         )
 
     # Create and start magic generation task
@@ -405,7 +616,7 @@ async def handle_magic(magic: MagicCreate, chat_service: ChatService) -> None:
     task = asyncio.create_task(magic_generation(magic, chat_service))
 
     # Register the task in stream_tasks (for possible cancellation)
-    add_stream_task(session_id, task)
+    await add_stream_task(session_id, task)
     try:
         # Await completion of the magic generation task
         await task
@@ -413,9 +624,9 @@ async def handle_magic(magic: MagicCreate, chat_service: ChatService) -> None:
         print(f"🛑Magic generation session {session_id} cancelled")
     finally:
         # Always remove the task from stream_tasks after completion/cancellation
-        remove_stream_task(session_id)
+        await remove_stream_task(session_id)
         # Notify frontend WebSocket that magic generation is done
-        await send_to_websocket(session_id, {"type": "done"})
+        await broadcast_session_update(session_id, canvas_id, {"type": "done"})
 
     print("✨ magic_service 处理完成")
 
@@ -493,4 +704,6 @@ async def magic_generation(magic: MagicCreate, chat_service: ChatService):
 
     # Send messages to frontend immediately
     all_messages = magic.messages + [ai_response]
-    await send_to_websocket(magic.session_id, {"type": "all_messages", "messages": all_messages})
+    await broadcast_session_update(
+        magic.session_id, magic.canvas_id, {"type": "all_messages", "messages": all_messages}
+    )
@@ -0,0 +1,30 @@
+# services/image_asset.py
+from sqlalchemy.dialects.postgresql import insert
+
+from lib.dedup import ImageRecord, ImageRecordStore
+from api.models import ImageAsset
+from api.core.db import async_session
+
+
+class PostgresImageRecordStore(ImageRecordStore):
+    """图片去重索引的 postgres 存储, 多进程/多节点共享"""
+
+    async def get(self, sha256: str) -> ImageRecord | None:
+        async with async_session() as session:
+            asset = await session.get(ImageAsset, sha256)
+            if asset is None:
+                return None
+            return ImageRecord(
+                sha256=asset.sha256,
+                url=asset.url,
+                width=asset.width,
+                height=asset.height,
+                mime_type=asset.mime_type,
+                file_size=asset.file_size,
+            )
+
+    async def put(self, record: ImageRecord):
+        async with async_session() as session:
+            stmt = insert(ImageAsset).values(**record.model_dump())
+            await session.execute(stmt.on_conflict_do_nothing(index_elements=["sha256"]))
+            await session.commit()
@@ -0,0 +1,91 @@
+# services/image_jobs.py
+"""
+生图任务: 工具调用通过 submit_image_job 入队, worker 执行对应的 tools.images 异步函数,
+推送 image_generated 事件并把结果作为一条 assistant 消息写回会话
+"""
+
+import json
+from typing import Any
+
+import uuid_utils as uuid
+
+from tools.types import ImageToolResponse
+from tools.images import (
+    image_edit_with_qwen_async,
+    image_create_with_gemini_async,
+    image_generate_with_qwen_async,
+    image_create_with_seedream_async,
+    image_create_with_seedream4_5_async,
+)
+from api.domain.job import Job
+from api.services.jobs import JobError, enqueue_job, job_handler
+from api.services.canvas import broadcast_generated_images
+
+# 服务商临时不可用, 任务稍后重试; 其他错误(参数/内容审核等)直接失败
+RETRYABLE_ERRORS = {"provider_unavailable", "rate_limited", "timeout", "provider_error"}
+
+
+async def submit_image_job(kind: str, payload: dict[str, Any], *, session_id: str, canvas_id: str | None) -> str:
+    """入队并返回给模型的工具结果"""
+    job = await enqueue_job(kind, payload, session_id=session_id, canvas_id=canvas_id)
+    return (
+        f"生图任务已提交(job_id: {job.id}), 正在后台生成, 完成后图像会自动添加到画布并通知用户. "
+        "无需等待或重复调用工具, 可以告知用户稍候查看."
+    )
+
+
+async def attach_to_session(job: Job, content: str):
+    """把任务结果追加到会话历史, lc_id 取自 job id, 任务重试不会产生重复消息"""
+    # api.deps 间接导入了工具模块, 延迟导入避免循环依赖
+    from api.deps import open_chat_repo
+
+    message = {"role": "assistant", "content": content}
+    async with open_chat_repo() as repo:
+        await repo.create_messages_async([
+            dict(
+                id=str(uuid.uuid7()),
+                session_id=job.session_id,
+                role="assistant",
+                message=json.dumps(message, ensure_ascii=False),
+                lc_id=f"job:{job.id}",
+            )
+        ])
+
+
+async def run_image_job(job: Job, response: ImageToolResponse) -> dict:
+    if not response.images:
+        raise JobError(response.content, retryable=response.error in RETRYABLE_ERRORS)
+    if job.session_id:
+        await broadcast_generated_images(job.session_id, job.canvas_id, response.images, job_id=str(job.id))
+        markdown = "\n".join(f"![image]({image.url})" for image in response.images)
+        content = f"图像生成完成\n{markdown}"
+        await attach_to_session(job, content)
+    return {
+        "content": response.content,
+        "images": [image.model_dump(mode="json", exclude_none=True) for image in response.images],
+    }
+
+
+@job_handler("image_create_with_seedream")
+async def seedream(job: Job) -> dict:
+    return await run_image_job(job, await image_create_with_seedream_async(**job.payload))
+
+
+@job_handler("image_create_with_seedream4_5")
+async def seedream4_5(job: Job) -> dict:
+    return await run_image_job(job, await image_create_with_seedream4_5_async(**job.payload))
+
+
+@job_handler("image_create_with_gemini")
+async def gemini(job: Job) -> dict:
+    return await run_image_job(job, await image_create_with_gemini_async(**job.payload))
+
+
+@job_handler("image_edit_with_qwen")
+async def qwen_edit(job: Job) -> dict:
+    return await run_image_job(job, await image_edit_with_qwen_async(**job.payload))
+
+
+@job_handler("image_generate_with_qwen")
+async def qwen_generate(job: Job) -> dict:
+    return await run_image_job(job, await image_generate_with_qwen_async(**job.payload))
@@ -0,0 +1,518 @@
+# services/jobs.py
+"""
+后台任务队列
+
+长耗时的工具调用(如 4K 生图)不在对话流中同步执行: 工具调用 enqueue_job 入队后立即返回,
+worker 领取并执行任务, 通过 broadcast_session_update 推送 job_update 事件, 结果由 handler 写回会话.
+
+- PostgresJobQueue: job 表 + SELECT ... FOR UPDATE SKIP LOCKED,
+  API 进程内的 worker 与独立的 worker 进程(api-worker)共同消费, 增加 worker 进程即可扩容
+- InMemoryJobQueue: 内存模式, 只能由 API 进程内的 worker 消费
+执行中的任务定期续约(locked_until), worker 崩溃后租约过期的任务由其他 worker 重新领取;
+正常关闭时未完成的任务立即放回队列.
+"""
+
+import time
+import random
+import asyncio
+import importlib
+import traceback
+from abc import ABC, abstractmethod
+from uuid import UUID
+from typing import Any, Callable, Awaitable
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from lib import metrics, settings
+from api.models import Job as JobModel
+from api.core.db import async_session
+from api.domain.job import Job, utcnow
+from api.core.cluster import new_node_id
+from api.services.websocket import broadcast_session_update
+
+JobHandler = Callable[[Job], Awaitable[dict | None]]
+
+JOB_HANDLERS: dict[str, JobHandler] = {}
+
+# 注册 handler 的模块, worker 启动时导入
+HANDLER_MODULES = ["api.services.image_jobs"]
+
+# 内存模式保留的已结束任务数
+MAX_FINISHED_JOBS = 1000
+
+
+class JobError(Exception):
+    """handler 抛出的任务失败, retryable=False 时不再重试"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    def decorator(fn: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = fn
+        return fn
+
+    return decorator
+
+
+def load_job_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+class JobQueue(ABC):
+    """
+    任务状态流转: queued -> running -> succeeded/failed/cancelled, 失败且可重试时回到 queued
+    running 状态的写操作都以 locked_by 校验租约, 租约已被回收的 worker 的写入不生效
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """唤醒本进程内空闲的 worker, 其他进程的 worker 依靠轮询"""
+        self._wakeup.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    @abstractmethod
+    async def enqueue(self, job: Job) -> Job: ...
+
+    @abstractmethod
+    async def get(self, id: UUID) -> Job | None: ...
+
+    @abstractmethod
+    async def list_by_session(self, session_id: str, limit: int = 50) -> list[Job]:
+        """会话最近的任务, 按创建时间倒序"""
+
+    @abstractmethod
+    async def claim(self, worker_id: str, lease: float) -> Job | None:
+        """领取一个到期的任务(优先回收租约过期的), attempts 加一"""
+
+    @abstractmethod
+    async def heartbeat(self, job: Job, worker_id: str, lease: float) -> bool:
+        """续约, 返回 False 表示租约已丢失(任务被取消或被其他 worker 回收)"""
+
+    @abstractmethod
+    async def complete(self, job: Job, worker_id: str, result: dict | None) -> Job | None: ...
+
+    @abstractmethod
+    async def fail(self, job: Job, worker_id: str, error: str, retry_at: datetime | None) -> Job | None:
+        """retry_at 不为空时重新入队, 否则标记为失败"""
+
+    @abstractmethod
+    async def release(self, job: Job, worker_id: str) -> Job | None:
+        """worker 关闭时放回队列, 不计入执行次数"""
+
+    @abstractmethod
+    async def cancel(self, id: UUID) -> Job | None:
+        """取消排队或执行中的任务, 已结束的任务不变"""
+
+
+class InMemoryJobQueue(JobQueue):
+    def __init__(self):
+        super().__init__()
+        self.jobs: dict[UUID, Job] = {}
+        self._finished: list[UUID] = []
+
+    def _update(self, job: Job, **values) -> Job:
+        job = job.model_copy(update={**values, "updated_at": utcnow()})
+        self.jobs[job.id] = job
+        if job.done:
+            self._finished.append(job.id)
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                self.jobs.pop(self._finished.pop(0), None)
+        return job
+
+    def _owned(self, job: Job, worker_id: str) -> Job | None:
+        current = self.jobs.get(job.id)
+        if current is None or current.status != "running" or current.locked_by != worker_id:
+            return None
+        return current
+
+    async def enqueue(self, job: Job) -> Job:
+        self.jobs[job.id] = job
+        self.notify()
+        return job
+
+    async def get(self, id: UUID) -> Job | None:
+        return self.jobs.get(id)
+
+    async def list_by_session(self, session_id: str, limit: int = 50) -> list[Job]:
+        jobs = [job for job in self.jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:limit]
+
+    async def claim(self, worker_id: str, lease: float) -> Job | None:
+        now = utcnow()
+        expired = [job for job in self.jobs.values() if job.status == "running" and job.locked_until < now]
+        queued = [job for job in self.jobs.values() if job.status == "queued" and job.run_at <= now]
+        candidates = expired or queued
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda job: job.run_at)
+        return self._update(
+            job,
+            status="running",
+            attempts=job.attempts + 1,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease),
+        )
+
+    async def heartbeat(self, job: Job, worker_id: str, lease: float) -> bool:
+        if (current := self._owned(job, worker_id)) is None:
+            return False
+        self._update(current, locked_until=utcnow() + timedelta(seconds=lease))
+        return True
+
+    async def complete(self, job: Job, worker_id: str, result: dict | None) -> Job | None:
+        if (current := self._owned(job, worker_id)) is None:
+            return None
+        return self._update(
+            current,
+            status="succeeded",
+            result=result,
+            error=None,
+            locked_by=None,
+            locked_until=None,
+            finished_at=utcnow(),
+        )
+
+    async def fail(self, job: Job, worker_id: str, error: str, retry_at: datetime | None) -> Job | None:
+        if (current := self._owned(job, worker_id)) is None:
+            return None
+        if retry_at is not None:
+            return self._update(
+                current, status="queued", error=error, run_at=retry_at, locked_by=None, locked_until=None
+            )
+        return self._update(
+            current, status="failed", error=error, locked_by=None, locked_until=None, finished_at=utcnow()
+        )
+
+    async def release(self, job: Job, worker_id: str) -> Job | None:
+        if (current := self._owned(job, worker_id)) is None:
+            return None
+        job = self._update(
+            current, status="queued", attempts=max(current.attempts - 1, 0), locked_by=None, locked_until=None
+        )
+        self.notify()
+        return job
+
+    async def cancel(self, id: UUID) -> Job | None:
+        job = self.jobs.get(id)
+        if job is None or job.done:
+            return job
+        return self._update(job, status="cancelled", locked_by=None, locked_until=None, finished_at=utcnow())
+
+
+class PostgresJobQueue(JobQueue):
+    def __init__(self, session_factory: async_sessionmaker = async_session):
+        super().__init__()
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _job(row) -> Job | None:
+        return Job.model_validate(row) if row is not None else None
+
+    async def _execute(self, stmt) -> Job | None:
+        async with self.session_factory() as session:
+            row = (await session.execute(stmt)).scalar_one_or_none()
+            await session.commit()
+            return self._job(row)
+
+    def _owned(self, job: Job, worker_id: str):
+        return update(JobModel).where(
+            JobModel.id == job.id, JobModel.status == "running", JobModel.locked_by == worker_id
+        )
+
+    async def enqueue(self, job: Job) -> Job:
+        async with self.session_factory() as session:
+            row = JobModel(**job.model_dump(exclude={"created_at", "updated_at"}))
+            session.add(row)
+            await session.commit()
+        self.notify()
+        return job
+
+    async def get(self, id: UUID) -> Job | None:
+        async with self.session_factory() as session:
+            return self._job(await session.get(JobModel, id))
+
+    async def list_by_session(self, session_id: str, limit: int = 50) -> list[Job]:
+        stmt = select(JobModel).where(JobModel.session_id == session_id).order_by(JobModel.id.desc()).limit(limit)
+        async with self.session_factory() as session:
+            return [self._job(row) for row in (await session.execute(stmt)).scalars()]
+
+    async def claim(self, worker_id: str, lease: float) -> Job | None:
+        # 两个条件分别命中 job 表上的两个部分索引
+        for condition in (
+            and_(JobModel.status == "running", JobModel.locked_until < func.now()),
+            and_(JobModel.status == "queued", JobModel.run_at <= func.now()),
+        ):
+            candidate = (
+                select(JobModel.id)
+                .where(condition)
+                .order_by(JobModel.run_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(JobModel)
+                .where(JobModel.id == candidate)
+                .values(
+                    status="running",
+                    attempts=JobModel.attempts + 1,
+                    locked_by=worker_id,
+                    locked_until=func.now() + timedelta(seconds=lease),
+                    updated_at=func.now(),
+                )
+                .returning(JobModel)
+            )
+            if (job := await self._execute(stmt)) is not None:
+                return job
+        return None
+
+    async def heartbeat(self, job: Job, worker_id: str, lease: float) -> bool:
+        stmt = (
+            self
+            ._owned(job, worker_id)
+            .values(locked_until=func.now() + timedelta(seconds=lease), updated_at=func.now())
+            .returning(JobModel)
+        )
+        return await self._execute(stmt) is not None
+
+    async def complete(self, job: Job, worker_id: str, result: dict | None) -> Job | None:
+        stmt = (
+            self
+            ._owned(job, worker_id)
+            .values(
+                status="succeeded",
+                result=result,
+                error=None,
+                locked_by=None,
+                locked_until=None,
+                finished_at=func.now(),
+                updated_at=func.now(),
+            )
+            .returning(JobModel)
+        )
+        return await self._execute(stmt)
+
+    async def fail(self, job: Job, worker_id: str, error: str, retry_at: datetime | None) -> Job | None:
+        if retry_at is not None:
+            values = dict(status="queued", run_at=retry_at)
+        else:
+            values = dict(status="failed", finished_at=func.now())
+        stmt = (
+            self
+            ._owned(job, worker_id)
+            .values(**values, error=error, locked_by=None, locked_until=None, updated_at=func.now())
+            .returning(JobModel)
+        )
+        return await self._execute(stmt)
+
+    async def release(self, job: Job, worker_id: str) -> Job | None:
+        stmt = (
+            self
+            ._owned(job, worker_id)
+            .values(
+                status="queued",
+                attempts=func.greatest(JobModel.attempts - 1, 0),
+                locked_by=None,
+                locked_until=None,
+                updated_at=func.now(),
+            )
+            .returning(JobModel)
+        )
+        return await self._execute(stmt)
+
+    async def cancel(self, id: UUID) -> Job | None:
+        stmt = (
+            update(JobModel)
+            .where(JobModel.id == id, JobModel.status.in_(["queued", "running"]))
+            .values(
+                status="cancelled", locked_by=None, locked_until=None, finished_at=func.now(), updated_at=func.now()
+            )
+            .returning(JobModel)
+        )
+        return await self._execute(stmt) or await self.get(id)
+
+
+async def publish_job(job: Job):
+    if job.session_id:
+        await broadcast_session_update(job.session_id, job.canvas_id, job.event())
+
+
+class JobWorker:
+    """从队列领取任务并发执行, 每个任务由独立的协程续约"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        *,
+        worker_id: str | None = None,
+        concurrency: int | None = None,
+        lease_seconds: float | None = None,
+        poll_interval: float | None = None,
+        retry_backoff: float | None = None,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id or new_node_id()
+        self.concurrency = concurrency or settings.jobs.concurrency
+        self.lease_seconds = lease_seconds or settings.jobs.lease_seconds
+        self.poll_interval = poll_interval or settings.jobs.poll_interval
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.jobs.retry_backoff
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._running: dict[UUID, asyncio.Task] = {}
+        self._loop_task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self):
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            await self._slots.acquire()
+            try:
+                job = await self.queue.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Error claiming job on {self.worker_id}: {e}")
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._slots.release()
+                await self.queue.wait(self.poll_interval)
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running[job.id] = task
+            task.add_done_callback(lambda _, id=job.id: self._finish(id))
+
+    def _finish(self, id: UUID):
+        self._running.pop(id, None)
+        self._slots.release()
+
+    def _retry_at(self, job: Job) -> datetime:
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        return utcnow() + timedelta(seconds=random.uniform(delay / 2, delay))
+
+    async def _heartbeat(self, job: Job, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                alive = await self.queue.heartbeat(job, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Error renewing lease of job {job.id}: {e}")
+                continue
+            if not alive:
+                # 任务被取消或租约已被其他 worker 回收, 停止执行
+                task.cancel()
+                return
+
+    async def _execute(self, job: Job):
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            await self._settle(job, await self.queue.fail(job, self.worker_id, f"未知的任务类型: {job.kind}", None))
+            return
+        if job.attempts > job.max_attempts:
+            # 多次在执行中丢失租约(worker 崩溃/被杀), 不再重试
+            await self._settle(job, await self.queue.fail(job, self.worker_id, job.error or "任务多次执行中断", None))
+            return
+
+        await publish_job(job)
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(job, asyncio.current_task()))
+        try:
+            result = await handler(job)
+        except asyncio.CancelledError:
+            if self._stopping:
+                await self.queue.release(job, self.worker_id)
+            metrics.inc("jobs_total", kind=job.kind, result="interrupted")
+            return
+        except Exception as e:
+            retryable = getattr(e, "retryable", True) and job.attempts < job.max_attempts
+            if not isinstance(e, JobError):
+                traceback.print_exc()
+            updated = await self.queue.fail(job, self.worker_id, str(e), self._retry_at(job) if retryable else None)
+        else:
+            updated = await self.queue.complete(job, self.worker_id, result)
+        finally:
+            heartbeat.cancel()
+            metrics.inc("job_seconds_total", time.perf_counter() - started, kind=job.kind)
+        await self._settle(job, updated)
+
+    async def _settle(self, job: Job, updated: Job | None):
+        if updated is None:
+            # 租约已丢失, 以当前持有者/取消操作的结果为准
+            return
+        metrics.inc("jobs_total", kind=job.kind, result=updated.status)
+        await publish_job(updated)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    async def stop(self, timeout: float = 10):
+        """停止领取新任务, 等待执行中的任务至多 timeout 秒, 之后中断并放回队列"""
+        self._stopping = True
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+        tasks = list(self._running.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = PostgresJobQueue() if settings.repo_type == "postgres" else InMemoryJobQueue()
+    return _queue
+
+
+async def enqueue_job(
+    kind: str,
+    payload: dict[str, Any],
+    *,
+    session_id: str | None = None,
+    canvas_id: str | None = None,
+) -> Job:
+    job = Job(
+        kind=kind,
+        payload=payload,
+        session_id=session_id,
+        canvas_id=canvas_id,
+        max_attempts=settings.jobs.max_attempts,
+    )
+    job = await get_job_queue().enqueue(job)
+    metrics.inc("jobs_enqueued_total", kind=kind)
+    await publish_job(job)
+    return job
+
+
+def start_job_workers(count: int | None = None) -> list[JobWorker]:
+    load_job_handlers()
+    count = settings.jobs.inline_workers if count is None else count
+    if not isinstance(get_job_queue(), PostgresJobQueue):
+        # 内存队列只有本进程能消费
+        count = max(count, 1)
+    workers = [JobWorker(get_job_queue()) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+async def stop_job_workers(workers: list[JobWorker]):
+    await asyncio.gather(*(worker.stop() for worker in workers))
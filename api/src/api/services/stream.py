@@ -2,34 +2,40 @@
 import asyncio
 from typing import Any, Dict, Optional
 
-# Dictionary to store active stream tasks, keyed by session_id
+from api.states import cluster
+
+# Dictionary to store active stream tasks of this process, keyed by session_id
 stream_tasks: Dict[str, asyncio.Task[Any]] = {}
 
 
-def add_stream_task(session_id: str, task: asyncio.Task[Any]) -> None:
+async def add_stream_task(session_id: str, task: asyncio.Task[Any]) -> None:
     """
-    Add a stream task for the given session_id.
+    Add a stream task for the given session_id and register it in the cluster,
+    so a cancel request landing on another worker can find it.
 
     Args:
         session_id (str): Unique identifier for the session.
         task: The task object to associate with the session.
     """
     stream_tasks[session_id] = task
+    await cluster.register_stream(session_id)
 
 
-def remove_stream_task(session_id: str) -> None:
+async def remove_stream_task(session_id: str) -> None:
     """
     Remove the stream task associated with the given session_id.
 
     Args:
         session_id (str): Unique identifier for the session.
     """
-    stream_tasks.pop(session_id, None)
+    # 仅当任务属于本进程时注销, 避免同一会话在另一节点上重新开始后被误删
+    if stream_tasks.pop(session_id, None) is not None:
+        await cluster.unregister_stream(session_id)
 
 
 def get_stream_task(session_id: str) -> Optional[asyncio.Task[Any]]:
     """
-    Retrieve the stream task associated with the given session_id.
+    Retrieve the stream task of this process associated with the given session_id.
 
     Args:
         session_id (str): Unique identifier for the session.
@@ -40,4 +46,28 @@ def get_stream_task(session_id: str) -> Optional[asyncio.Task[Any]]:
     return stream_tasks.get(session_id)
 
 
+async def cancel_local_stream_task(session_id: str) -> bool:
+    """取消本进程内的任务, 也是集群取消信号的处理函数"""
+    task = stream_tasks.get(session_id)
+    if task and not task.done():
+        task.cancel()
+        return True
+    return False
+
+
+async def cancel_stream_task(session_id: str) -> bool:
+    """
+    Cancel the stream task for the given session_id on whichever worker runs it.
+
+    Returns:
+        True if a running task was found (locally or on another node) and signalled.
+    """
+    if await cancel_local_stream_task(session_id):
+        return True
+    if await cluster.find_stream(session_id):
+        await cluster.publish_cancel(session_id)
+        return True
+    return False
+
+
 # 你也可以加一个 list_stream_tasks() 返回所有 session_id
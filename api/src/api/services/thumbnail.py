@@ -0,0 +1,231 @@
+# services/thumbnail.py
+"""
+图片缩放服务(/api/file/{file_id} 与 /api/storage/{key} 的 width/height/format/quality 参数)
+
+- 派生图按 (原图内容 sha256, 缩放参数) 寻址, 缓存在磁盘上, 总大小超过 settings.thumbnails.max_cache_bytes 时
+  按最近访问时间淘汰; 命中时更新文件的 mtime, 多个进程共享同一个缓存目录
+- 同一派生图的并发请求只生成一次: 进程内共享同一个任务, 跨进程用文件锁, 生成后写临时文件再原子替换
+- 缩放与编码在 lib.compress 的进程池中执行
+- 响应带内容寻址的 ETag, 支持 If-None-Match(304) 与 Range(由 FileResponse 处理)
+"""
+
+import os
+import asyncio
+import hashlib
+import threading
+from typing import Literal
+from pathlib import Path
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response, FileResponse
+
+from lib import metrics, settings
+from lib.compress import FORMAT_EXTENSIONS, render_thumbnail, available_formats, run_in_process_pool
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只做进程内去重
+    fcntl = None
+
+ThumbnailFormat = Literal["jpeg", "webp", "png", "avif"]
+
+# 未指定格式时沿用原图格式, 其他格式输出 JPEG
+SOURCE_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png", "avif": "image/avif"}
+
+# 原图 (路径, mtime, 大小) -> 内容 sha256
+SOURCE_HASHES_SIZE = 4096
+# 跨进程文件锁的分片数
+LOCK_STRIPES = 256
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DerivativeCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        # 缓存文件 -> 大小, 最久未访问的在前; 首次使用时扫描目录
+        self._index: OrderedDict[str, int] | None = None
+        self._total = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._source_hashes: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+        # 索引在线程池中读写
+        self._mutex = threading.Lock()
+
+    def path(self, key: str, extension: str) -> Path:
+        return self.root / key[:2] / f"{key}.{extension}"
+
+    def source_hash(self, path: Path) -> str:
+        """原图内容的 sha256, 按 (路径, mtime, 大小) 缓存(阻塞)"""
+        stat = path.stat()
+        cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._mutex:
+            if digest := self._source_hashes.get(cache_key):
+                self._source_hashes.move_to_end(cache_key)
+                return digest
+        digest = _sha256_file(path)
+        with self._mutex:
+            self._source_hashes[cache_key] = digest
+            while len(self._source_hashes) > SOURCE_HASHES_SIZE:
+                self._source_hashes.popitem(last=False)
+        return digest
+
+    def _scan(self):
+        """按 mtime 重建索引, 其他进程写入与访问的文件也会计入"""
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, str(path), stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((path, size) for _, path, size in entries)
+        self._total = sum(self._index.values())
+
+    def _hit(self, path: Path) -> bool:
+        try:
+            size = path.stat().st_size
+            # 更新 mtime, 其他进程重新扫描时按它判断最近访问
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        with self._mutex:
+            if self._index is None:
+                self._scan()
+            key = str(path)
+            if key not in self._index:
+                self._index[key] = size
+                self._total += size
+            self._index.move_to_end(key)
+        return True
+
+    def _store(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{path.name}.{os.getpid()}.part")
+        try:
+            temp.write_bytes(data)
+            temp.replace(path)
+        finally:
+            temp.unlink(missing_ok=True)
+        with self._mutex:
+            if self._index is None:
+                self._scan()
+            elif str(path) not in self._index:
+                self._index[str(path)] = len(data)
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict(keep=str(path))
+
+    def _evict(self, keep: str):
+        """淘汰最久未访问的文件, 直到总大小降到上限的 90%, 保留刚写入的 keep(调用方持有 _mutex)"""
+        self._scan()
+        target = self.max_bytes * 0.9
+        for path, size in list(self._index.items()):
+            if self._total <= target:
+                break
+            if path == keep:
+                continue
+            del self._index[path]
+            Path(path).unlink(missing_ok=True)
+            self._total -= size
+            metrics.inc("thumbnail_cache_evictions_total")
+
+    def _lock(self, key: str):
+        """跨进程的文件锁(阻塞), 返回持有锁的文件对象, 关闭即释放"""
+        if fcntl is None:
+            return None
+        lock_dir = self.root / ".locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        lock = (lock_dir / f"{int(key[:4], 16) % LOCK_STRIPES}.lock").open("wb")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    async def _create(self, key: str, path: Path, source: Path, width, height, fmt: str, quality: int) -> Path:
+        lock = await asyncio.to_thread(self._lock, key)
+        try:
+            # 等锁期间可能已由其他进程生成
+            if await asyncio.to_thread(self._hit, path):
+                return path
+            data = await run_in_process_pool(render_thumbnail, str(source), width, height, fmt.upper(), quality)
+            await asyncio.to_thread(self._store, path, data)
+            return path
+        finally:
+            if lock is not None:
+                lock.close()
+
+    async def get_or_create(self, key: str, source: Path, width, height, fmt: str, quality: int) -> Path:
+        path = self.path(key, FORMAT_EXTENSIONS[fmt.upper()])
+        if await asyncio.to_thread(self._hit, path):
+            metrics.inc("thumbnail_cache_total", result="hit")
+            return path
+        if (task := self._inflight.get(key)) is not None:
+            metrics.inc("thumbnail_cache_total", result="inflight")
+        else:
+            metrics.inc("thumbnail_cache_total", result="miss")
+            task = asyncio.create_task(self._create(key, path, source, width, height, fmt, quality))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 单个请求断开不影响其他等待同一派生图的请求
+        return await asyncio.shield(task)
+
+
+derivative_cache = DerivativeCache(
+    settings.thumbnails.cache_dir or settings.data_dir / "thumbnails", settings.thumbnails.max_cache_bytes
+)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+async def image_response(
+    request: Request,
+    source: Path,
+    width: int | None = None,
+    height: int | None = None,
+    fmt: ThumbnailFormat | None = None,
+    quality: int | None = None,
+) -> Response:
+    """原图或缩放后的图片, 未指定任何参数时返回原图; 参数不支持时抛出 ValueError"""
+    digest = await asyncio.to_thread(derivative_cache.source_hash, source)
+    headers = {"cache-control": settings.thumbnails.cache_control}
+    resize = not (width is None and height is None and fmt is None and quality is None)
+
+    if resize:
+        fmt = fmt or SOURCE_FORMATS.get(source.suffix.lower(), "jpeg")
+        if not available_formats([fmt.upper()]):
+            raise ValueError(f"不支持的图片格式: {fmt}")
+        max_side = settings.thumbnails.max_side
+        width = min(width, max_side) if width else None
+        height = min(height, max_side) if height else None
+        quality = quality or settings.thumbnails.quality
+        key = hashlib.sha256(f"{digest}:{width}:{height}:{fmt}:{quality}".encode()).hexdigest()
+        etag = f'"{key}"'
+    else:
+        etag = f'"{digest}"'
+    headers["etag"] = etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if not resize:
+        return FileResponse(source, headers=headers)
+    path = await derivative_cache.get_or_create(key, source, width, height, fmt, quality)
+    if not await asyncio.to_thread(path.is_file):
+        # 刚好被其他进程淘汰, 重新生成
+        path = await derivative_cache.get_or_create(key, source, width, height, fmt, quality)
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
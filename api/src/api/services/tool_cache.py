@@ -0,0 +1,76 @@
+# services/tool_cache.py
+from datetime import timedelta
+
+from sqlalchemy import func, delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from lib import settings
+from api.models import ToolResultCache
+from api.core.db import async_session
+from lib.tool_cache import ToolCacheStore, RedisToolCacheStore, tool_cache
+
+# 每写入多少次清理一次过期与超出上限的条目
+PRUNE_EVERY = 100
+
+
+class PostgresToolCacheStore(ToolCacheStore):
+    """工具结果缓存的 postgres 存储, 多进程/多节点共享"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._puts = 0
+
+    async def get(self, key: str) -> dict | None:
+        stmt = select(ToolResultCache.value).where(ToolResultCache.key == key, ToolResultCache.expires_at > func.now())
+        async with async_session() as session:
+            return (await session.execute(stmt)).scalar_one_or_none()
+
+    async def put(self, key: str, tool: str, value: dict, ttl: float):
+        expires_at = func.now() + timedelta(seconds=ttl)
+        stmt = insert(ToolResultCache).values(key=key, tool=tool, value=value, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"tool": tool, "value": stmt.excluded.value, "expires_at": expires_at, "created_at": func.now()},
+        )
+        async with async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+        self._puts += 1
+        if self._puts % PRUNE_EVERY == 0:
+            await self.prune()
+
+    async def delete(self, key: str):
+        async with async_session() as session:
+            await session.execute(delete(ToolResultCache).where(ToolResultCache.key == key))
+            await session.commit()
+
+    async def prune(self):
+        """删除过期条目, 以及超出 max_entries 的最早过期的条目"""
+        overflow = (
+            select(ToolResultCache.key)
+            .order_by(ToolResultCache.expires_at.desc())
+            .offset(self.max_entries)
+            .scalar_subquery()
+        )
+        async with async_session() as session:
+            await session.execute(delete(ToolResultCache).where(ToolResultCache.expires_at <= func.now()))
+            await session.execute(delete(ToolResultCache).where(ToolResultCache.key.in_(overflow)))
+            await session.commit()
+
+
+def configure_tool_cache():
+    """按配置注册共享存储, API 进程与 worker 进程启动时调用"""
+    config = settings.tool_cache
+    if not config.enabled:
+        return
+    if config.store == "redis":
+        if settings.redis is None:
+            raise ValueError("tool_cache.store = 'redis' 需要配置 [redis]")
+        tool_cache.store = RedisToolCacheStore(settings.redis_dsn, prefix=settings.cluster.prefix)
+    elif config.store == "postgres":
+        tool_cache.store = PostgresToolCacheStore(config.max_entries)
+
+
+async def close_tool_cache():
+    if isinstance(tool_cache.store, RedisToolCacheStore):
+        await tool_cache.store.close()
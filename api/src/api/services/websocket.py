@@ -1,25 +1,27 @@
 # services/websocket_service.py
+import time
+import asyncio
 import traceback
-from typing import Any, Dict
+from typing import Any, Dict, Callable, Awaitable
 
-from api.states import get_all_socket_ids, sio
+from lib import metrics
+from api.states import sio, canvas_room, session_room
 
 
 async def broadcast_session_update(session_id: str, canvas_id: str | None, event: Dict[str, Any]):
-    socket_ids = get_all_socket_ids()
-    # print(f"{socket_ids=}")
-    if socket_ids:
-        try:
-            for socket_id in socket_ids:
-                # print("发送到对应房间")
-                await sio.emit(
-                    "session_update",
-                    {"canvas_id": canvas_id, "session_id": session_id, **event},
-                    room=socket_id,
-                )
-        except Exception as e:
-            print(f"Error broadcasting session update for {session_id}: {e}")
-            traceback.print_exc()
+    """推送到会话房间和画布房间, 一次 emit, 同时在两个房间的连接只会收到一次"""
+    rooms = [session_room(session_id)]
+    if canvas_id:
+        rooms.append(canvas_room(canvas_id))
+    try:
+        await sio.emit(
+            "session_update",
+            {"canvas_id": canvas_id, "session_id": session_id, **event},
+            to=rooms,
+        )
+    except Exception as e:
+        print(f"Error broadcasting session update for {session_id}: {e}")
+        traceback.print_exc()
 
 
 # compatible with legacy codes
@@ -37,3 +39,97 @@ async def broadcast_init_done():
     except Exception as e:
         print(f"Error broadcasting init_done: {e}")
         traceback.print_exc()
+
+
+class DeltaCoalescer:
+    """
+    流式增量事件合并
+
+    delta / tool_call_arguments 事件先进入缓冲, 相邻且属于同一输出(同类型, 同 tool_call id)的文本拼接成一个事件,
+    每 flush_interval_ms 毫秒或累计 flush_bytes 字节推送一次. 其他事件(tool_call, tool_call_result, done 等)
+    推送前先 flush 缓冲, 保证前端收到的顺序与产生顺序一致.
+    """
+
+    COALESCE_TYPES = {"delta", "tool_call_arguments"}
+
+    def __init__(
+        self,
+        session_id: str,
+        send: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        *,
+        flush_interval_ms: int = 50,
+        flush_bytes: int = 2048,
+    ):
+        self.session_id = session_id
+        self.send = send
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self.events_in = 0
+        self.events_out = 0
+        self._buffer: list[Dict[str, Any]] = []
+        self._buffered_bytes = 0
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self._started_at = time.perf_counter()
+
+    async def __call__(self, session_id: str, event: Dict[str, Any]) -> None:
+        self.events_in += 1
+        metrics.inc("stream_events_in_total", type=event.get("type"))
+        async with self._lock:
+            if event.get("type") not in self.COALESCE_TYPES or self.flush_interval <= 0:
+                await self._flush()
+                await self._send(session_id, event)
+                return
+
+            text = event.get("text")
+            last = self._buffer[-1] if self._buffer else None
+            if (
+                last is not None
+                and last.get("type") == event.get("type")
+                and last.get("id") == event.get("id")
+                and isinstance(last.get("text"), str)
+                and isinstance(text, str)
+            ):
+                last["text"] += text
+            else:
+                self._buffer.append(dict(event))
+            self._buffered_bytes += len(text.encode()) if isinstance(text, str) else len(str(text))
+
+            if self._buffered_bytes >= self.flush_bytes:
+                await self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # 进入发送前清除, close 只会取消仍在等待的定时器, 不会打断发送到一半的缓冲
+        self._timer = None
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        """需在持有 _lock 时调用"""
+        buffer, self._buffer, self._buffered_bytes = self._buffer, [], 0
+        for event in buffer:
+            await self._send(self.session_id, event)
+
+    async def _send(self, session_id: str, event: Dict[str, Any]) -> None:
+        self.events_out += 1
+        metrics.inc("stream_events_out_total", type=event.get("type"))
+        await self.send(session_id, event)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            await self._flush()
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        elapsed = time.perf_counter() - self._started_at
+        if elapsed > 0:
+            print(
+                f"📨 session {self.session_id} events: in={self.events_in} ({self.events_in / elapsed:.1f}/s), "
+                f"out={self.events_out} ({self.events_out / elapsed:.1f}/s)"
+            )
@@ -2,33 +2,52 @@ from typing import Dict
 
 import socketio
 
+from api.core.cluster import create_cluster_backend
+
+# 跨进程协作后端, 多 worker 部署时 Socket.IO 推送/连接登记/取消信号经由它共享
+cluster = create_cluster_backend()
+
 # 配置 Socket.IO 服务器，允许所有来源并启用日志
 sio = socketio.AsyncServer(
     cors_allowed_origins="*",
     async_mode="asgi",
+    client_manager=cluster.client_manager(),
     # logger=True,
     # engineio_logger=True,
 )
 
+# 本进程的连接, 全部节点的连接通过 cluster.list_connections() 获取
 active_connections: Dict[str, dict] = {}
 
 
-def add_connection(socket_id: str, user_info: dict = None):
+async def add_connection(socket_id: str, user_info: dict = None):
     active_connections[socket_id] = user_info or {}
+    await cluster.add_connection(socket_id, user_info or {})
     print("激活的连接: ", active_connections)
 
     print(f"New connection added: {socket_id}, total connections: {len(active_connections)}")
 
 
-def remove_connection(socket_id: str):
+async def remove_connection(socket_id: str):
     if socket_id in active_connections:
         del active_connections[socket_id]
         print(f"Connection removed: {socket_id}, total connections: {len(active_connections)}")
+    await cluster.remove_connection(socket_id)
+
+
+async def get_all_socket_ids():
+    return list((await cluster.list_connections()).keys())
+
+
+async def get_connection_count():
+    return len(await cluster.list_connections())
 
 
-def get_all_socket_ids():
-    return list(active_connections.keys())
+def session_room(session_id: str) -> str:
+    """会话房间名, 同一会话的所有订阅者共享"""
+    return f"session:{session_id}"
 
 
-def get_connection_count():
-    return len(active_connections)
+def canvas_room(canvas_id: str) -> str:
+    """画布房间名, 打开同一画布的所有订阅者共享"""
+    return f"canvas:{canvas_id}"
@@ -0,0 +1,53 @@
+"""
+独立的后台任务 worker 进程, 与 API 进程共同消费 postgres 中的 job 表, 按需增加进程数扩容
+
+    uv run api-worker
+
+推送 job_update/image_generated 事件需要 cluster.backend = "redis", 经由 redis 转发到持有连接的 API 进程
+"""
+
+import signal
+import asyncio
+
+from lib import settings
+from lib.dedup import image_index
+from api.states import cluster
+from api.services.jobs import JobWorker, get_job_queue, load_job_handlers
+from tools.images.common import close_async_client
+from api.services.tool_cache import close_tool_cache, configure_tool_cache
+from api.services.image_asset import PostgresImageRecordStore
+
+
+async def run():
+    if settings.repo_type != "postgres":
+        raise SystemExit("独立 worker 需要 repo_type = 'postgres', 内存模式由 API 进程内的 worker 执行任务")
+    if settings.cluster.backend != "redis":
+        print("⚠️ cluster.backend 不是 redis, worker 推送的事件无法到达其他进程的客户端")
+
+    # 与 API 进程共享图片去重索引与工具结果缓存
+    image_index.store = PostgresImageRecordStore()
+    configure_tool_cache()
+    load_job_handlers()
+    worker = JobWorker(get_job_queue())
+    worker.start()
+    print(f"job worker {worker.worker_id} 已启动, 并发: {worker.concurrency}")
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+
+    print(f"job worker {worker.worker_id} 正在关闭, 执行中的任务: {worker.in_flight}")
+    await worker.stop()
+    await cluster.stop()
+    await close_async_client()
+    await close_tool_cache()
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
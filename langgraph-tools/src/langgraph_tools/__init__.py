@@ -1,6 +1,7 @@
 from collections.abc import Callable
 
 from langgraph_tools.images import (
+    image_split_layers,
     image_create_with_qwen,
     image_create_with_gemini,
     image_create_with_seedream,
@@ -19,6 +20,8 @@ def get_langgraph_tools(tools: list[str]) -> list[Callable]:
             tool_instances.append(image_create_with_seedream4_5)
         elif tool == "image_create_with_qwen":
             tool_instances.append(image_create_with_qwen)
+        elif tool == "image_split_layers":
+            tool_instances.append(image_split_layers)
         # elif tool.name == "web_search":
         #     tool_instances.append(web_search_tool)
         # elif tool.name ==
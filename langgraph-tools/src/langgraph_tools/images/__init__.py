@@ -1,5 +1,6 @@
 from .qwen import image_create_with_qwen
 from .gemini import image_create_with_gemini
+from .layers import image_split_layers
 from .seedream import image_create_with_seedream
 from .seedream4_5 import image_create_with_seedream4_5
 
@@ -8,4 +9,5 @@ __all__ = [
     "image_create_with_seedream",
     "image_create_with_seedream4_5",
     "image_create_with_qwen",
+    "image_split_layers",
 ]
@@ -10,8 +10,10 @@ from langgraph.prebuilt import ToolRuntime
 from langchain_core.tools import tool
 
 from lib import settings, upload_image
-from tools.images import image_create_with_gemini as image_create_with_gemini_tool
-from api.services.websocket import broadcast_session_update
+from lib.image import probe_image
+from tools.images import image_create_with_gemini_async as image_create_with_gemini_tool
+from api.services.canvas import broadcast_generated_images
+from api.services.image_jobs import submit_image_job
 
 api_key = settings.providers.gemini.api_key
 http_options = genai.types.HttpOptions(
@@ -41,6 +43,9 @@ class GeminiArgs(BaseModel):
       values are `1K`, `2K`, `4K`. If not specified, the model will use default
       value `2K`.""",
     )
+    force_regenerate: bool = Field(
+        False, description="Optional. 用户明确要求重新生成时设为 true, 否则相同参数会直接返回之前生成的图像"
+    )
 
 
 @tool(
@@ -54,22 +59,32 @@ async def image_create_with_gemini(
     image_urls: str | None = None,
     aspect_ratio: str | None = None,
     image_size: Literal["1K", "2K", "4K", "1k", "2k", "4k"] | None = "2K",
+    force_regenerate: bool = False,
 ) -> str:
-    image_tool_response = image_create_with_gemini_tool(
-        prompt, image_urls=image_urls, aspect_ratio=aspect_ratio, image_size=image_size.upper() if image_size else None
+    if settings.jobs.enabled:
+        return await submit_image_job(
+            "image_create_with_gemini",
+            dict(
+                prompt=prompt,
+                image_urls=image_urls,
+                aspect_ratio=aspect_ratio,
+                image_size=image_size.upper() if image_size else None,
+                force_regenerate=force_regenerate,
+            ),
+            session_id=runtime.context.session_id,
+            canvas_id=runtime.context.canvas_id,
+        )
+    image_tool_response = await image_create_with_gemini_tool(
+        prompt,
+        image_urls=image_urls,
+        aspect_ratio=aspect_ratio,
+        image_size=image_size.upper() if image_size else None,
+        force_regenerate=force_regenerate,
     )
     if image_tool_response.images:
-        for image in image_tool_response.images:
-            await broadcast_session_update(
-                runtime.context.session_id,
-                runtime.context.canvas_id,
-                {
-                    "type": "image_generated",
-                    "element": "",
-                    "file": "",
-                    "image_url": image.url,
-                },
-            )
+        await broadcast_generated_images(
+            runtime.context.session_id, runtime.context.canvas_id, image_tool_response.images
+        )
     return image_tool_response.content
 
 
@@ -99,8 +114,7 @@ def magic_generate_with_gemini(*, prompt: str | None = None, image_url: str) ->
             filename = f"{str(uuid.uuid4())}.{ext}"
             url = upload_image(filename, data=image_bytes, prefix="creative", rename=False)
 
-            image = Image.open(BytesIO(part.inline_data.data))
-            width, height = image.size
+            width, height, *_ = probe_image(part.inline_data.data)
             image_urls.append(
                 dict(
                     image_url=url,
@@ -0,0 +1,52 @@
+from pydantic import Field, BaseModel
+from langgraph.prebuilt import ToolRuntime
+from langchain_core.tools import tool
+
+from tools.images import image_split_layers_async as image_split_layers_tool
+from api.services.websocket import broadcast_session_update
+
+
+class SplitLayersArgs(BaseModel):
+    image_url: str = Field(description="Required. 要拆分图层的图片 url 或本地文件名, 只传一张")
+    max_layers: int = Field(8, description="Optional. 最多拆出的对象图层数, 不含背景")
+    alpha_matting: bool = Field(
+        False, description="Optional. 细化对象边缘(头发/毛发/半透明边缘), 更慢, 用户要求精细抠图时设为 true"
+    )
+    include_background: bool = Field(True, description="Optional. 是否输出挖空对象后的背景图层")
+
+
+@tool(
+    "image_split_layers",
+    description="Layer splitting tool (拆分图层/素材拆分/素材提取). Split one image into transparent PNG layers in a"
+    " single call: one layer per separable object plus the background, each with its bounding box in the source"
+    " image. Runs locally, no prompt needed.",
+    args_schema=SplitLayersArgs,
+)
+async def image_split_layers(
+    runtime: ToolRuntime,
+    *,
+    image_url: str,
+    max_layers: int = 8,
+    alpha_matting: bool = False,
+    include_background: bool = True,
+) -> str:
+    image_tool_response = await image_split_layers_tool(
+        image_url, max_layers=max_layers, alpha_matting=alpha_matting, include_background=include_background
+    )
+    bundle = getattr(image_tool_response, "bundle", None)
+    if bundle is not None:
+        # 一次推送全部图层, 画布按 bbox 自下而上还原原图中的构图
+        await broadcast_session_update(
+            runtime.context.session_id,
+            runtime.context.canvas_id,
+            {
+                "type": "layers_generated",
+                "width": bundle.width,
+                "height": bundle.height,
+                "layers": [
+                    {"name": layer.name, "bbox": list(layer.bbox), "image_url": layer.image.url}
+                    for layer in bundle.layers
+                ],
+            },
+        )
+    return image_tool_response.content
@@ -4,11 +4,13 @@ from pydantic import Field, BaseModel
 from langgraph.prebuilt import ToolRuntime
 from langchain_core.tools import tool
 
+from lib import settings
 from tools.images import (
-    image_edit_with_qwen as image_edit_with_qwen_tool,
-    image_generate_with_qwen as image_generate_with_qwen_tool,
+    image_edit_with_qwen_async as image_edit_with_qwen_tool,
+    image_generate_with_qwen_async as image_generate_with_qwen_tool,
 )
-from api.services.websocket import broadcast_session_update
+from api.services.canvas import broadcast_generated_images
+from api.services.image_jobs import submit_image_job
 
 
 class QwenArgs(BaseModel):
@@ -24,6 +26,9 @@ class QwenArgs(BaseModel):
         description="""Optional. Aspect ratio of the generated images. Supported values are
       "1:1", "2:3", "3:2", "3:4", "4:3", "9:16", "16:9", and "21:9".""",
     )
+    force_regenerate: bool = Field(
+        False, description="Optional. 用户明确要求重新生成时设为 true, 否则相同参数会直接返回之前生成的图像"
+    )
 
 
 @tool(
@@ -39,33 +44,39 @@ async def image_create_with_qwen(
     prompt: str,
     image_urls: list[str] | str | None = None,
     aspect_ratio: str | None = None,
+    force_regenerate: bool = False,
 ) -> str:
 
+    if settings.jobs.enabled:
+        if image_urls:
+            kind, payload = (
+                "image_edit_with_qwen",
+                dict(prompt=prompt, image_urls=image_urls, force_regenerate=force_regenerate),
+            )
+        else:
+            kind, payload = (
+                "image_generate_with_qwen",
+                dict(prompt=prompt, aspect_ratio=aspect_ratio, force_regenerate=force_regenerate),
+            )
+        return await submit_image_job(
+            kind, payload, session_id=runtime.context.session_id, canvas_id=runtime.context.canvas_id
+        )
+
     if image_urls:
-        image_tool_response = image_edit_with_qwen_tool(prompt=prompt, image_urls=image_urls)
+        image_tool_response = await image_edit_with_qwen_tool(
+            prompt=prompt, image_urls=image_urls, force_regenerate=force_regenerate
+        )
         if image_tool_response.images:
-            await broadcast_session_update(
-                runtime.context.session_id,
-                runtime.context.canvas_id,
-                {
-                    "type": "image_generated",
-                    "element": "",
-                    "file": "",
-                    "image_url": image_tool_response.images[0].url,
-                },
+            await broadcast_generated_images(
+                runtime.context.session_id, runtime.context.canvas_id, image_tool_response.images[:1]
             )
         return image_tool_response.content
     else:
-        image_tool_response = image_generate_with_qwen_tool(prompt=prompt, aspect_ratio=aspect_ratio)
+        image_tool_response = await image_generate_with_qwen_tool(
+            prompt=prompt, aspect_ratio=aspect_ratio, force_regenerate=force_regenerate
+        )
         if image_tool_response.images:
-            await broadcast_session_update(
-                runtime.context.session_id,
-                runtime.context.canvas_id,
-                {
-                    "type": "image_generated",
-                    "element": "",
-                    "file": "",
-                    "image_url": image_tool_response.images[0].url,
-                },
+            await broadcast_generated_images(
+                runtime.context.session_id, runtime.context.canvas_id, image_tool_response.images[:1]
             )
         return image_tool_response.content
@@ -4,10 +4,12 @@ from pydantic import Field, BaseModel
 from langgraph.prebuilt import ToolRuntime
 from langchain_core.tools import tool
 
+from lib import settings
 from tools.images.seedream import (
-    image_create_with_seedream as image_create_with_seedream_tool,
+    image_create_with_seedream_async as image_create_with_seedream_tool,
 )
-from api.services.websocket import broadcast_session_update
+from api.services.canvas import broadcast_generated_images
+from api.services.image_jobs import submit_image_job
 
 
 class SeedreamArgs(BaseModel):
@@ -25,6 +27,9 @@ class SeedreamArgs(BaseModel):
     image_size: Literal["1K", "2K", "4K", "1k", "2k", "4k"] | None = Field(
         "2K", description="Optional. 图像分辨率, 默认2K, 支持设置为4K, 可选1K"
     )
+    force_regenerate: bool = Field(
+        False, description="Optional. 用户明确要求重新生成时设为 true, 否则相同参数会直接返回之前生成的图像"
+    )
 
 
 @tool(
@@ -38,26 +43,34 @@ async def image_create_with_seedream(
     image_urls: list[str] | str | None = None,
     aspect_ratio: str | None = None,
     image_size: Literal["1K", "2K", "4K", "1k", "2k", "4k"] | None = "1K",
+    force_regenerate: bool = False,
 ) -> str:
 
-    image_tool_response = image_create_with_seedream_tool(
+    if settings.jobs.enabled:
+        return await submit_image_job(
+            "image_create_with_seedream",
+            dict(
+                image_urls=image_urls,
+                prompt=prompt,
+                aspect_ratio=aspect_ratio,
+                image_size=image_size.upper() if image_size else None,
+                force_regenerate=force_regenerate,
+            ),
+            session_id=runtime.context.session_id,
+            canvas_id=runtime.context.canvas_id,
+        )
+
+    image_tool_response = await image_create_with_seedream_tool(
         image_urls=image_urls,
         prompt=prompt,
         aspect_ratio=aspect_ratio,
         image_size=image_size.upper() if image_size else None,
+        force_regenerate=force_regenerate,
     )
     if image_tool_response.images:
-        for image in image_tool_response.images:
-            await broadcast_session_update(
-                runtime.context.session_id,
-                runtime.context.canvas_id,
-                {
-                    "type": "image_generated",
-                    "element": "",
-                    "file": "",
-                    "image_url": image.url,
-                },
-            )
+        await broadcast_generated_images(
+            runtime.context.session_id, runtime.context.canvas_id, image_tool_response.images
+        )
     return image_tool_response.content
 
 
@@ -1,5 +1,5 @@
 from .config import settings
-from .image import upload_image
+from .image import upload_many, upload_image, upload_image_async
 from .utils import get_current_date
 
 
@@ -7,4 +7,4 @@ def hello() -> str:
     return "Hello from lib!"
 
 
-__all__ = ["settings", "hello", "get_current_date", "upload_image"]
+__all__ = ["settings", "hello", "get_current_date", "upload_image", "upload_image_async", "upload_many"]
@@ -0,0 +1,234 @@
+"""
+有上限的进程内映射
+
+按条数/估算字节数/闲置时间(TTL)以 LRU 顺序淘汰, 可选把淘汰的条目写入本地 SQLite 文件, 再次访问时读回内存.
+值的大小按写入时 pickle 后的长度估算, 写入后原地修改的对象不会重新计算.
+"""
+
+import time
+import pickle
+import sqlite3
+import threading
+from typing import Any, Generic, TypeVar, Callable, Iterator
+from pathlib import Path
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from lib import metrics
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+def _dumps(obj: Any) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SqliteSpill:
+    """淘汰条目的溢出文件, 多个映射共用一个文件, 按 name 区分; 只是内存的延伸, 打开时清空"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spill (name TEXT NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL,"
+            " PRIMARY KEY (name, key))"
+        )
+        self._conn.execute("DELETE FROM spill")
+
+    def put(self, name: str, key: bytes, value: bytes):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO spill (name, key, value) VALUES (?, ?, ?)", (name, key, value))
+
+    def get(self, name: str, key: bytes) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM spill WHERE name = ? AND key = ?", (name, key)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, name: str, key: bytes):
+        with self._lock:
+            self._conn.execute("DELETE FROM spill WHERE name = ? AND key = ?", (name, key))
+
+    def values(self, name: str) -> list[bytes]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT value FROM spill WHERE name = ?", (name,))]
+
+    def size(self, name: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM spill WHERE name = ?", (name,))
+            return row.fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryBudget:
+    """多个映射共享的字节上限, 超出时淘汰其中最久未访问的条目"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.members: list["BoundedDict"] = []
+
+    @property
+    def bytes(self) -> int:
+        return sum(member.bytes for member in self.members)
+
+    def shrink(self):
+        while self.bytes > self.max_bytes:
+            candidates = [member for member in self.members if member._data]
+            # 只剩一个条目时保留, 避免刚写入的大对象被立即淘汰
+            if sum(len(member._data) for member in candidates) <= 1:
+                return
+            min(candidates, key=lambda member: member._oldest_access())._evict_one()
+
+
+class BoundedDict(MutableMapping, Generic[K, V]):
+    """
+    LRU 映射, 读写都会刷新访问时间
+    配置 spill 时淘汰的条目写入溢出文件(读取时自动读回), 否则丢弃并调用 on_evict(key, value)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_items: int | None = None,
+        ttl: float | None = None,
+        spill: SqliteSpill | None = None,
+        budget: MemoryBudget | None = None,
+        on_evict: Callable[[K, V], None] | None = None,
+    ):
+        self.name = name
+        self.max_items = max_items
+        self.ttl = ttl
+        self.spill = spill
+        self.budget = budget
+        self.on_evict = on_evict
+        # key -> (value, 估算字节数, 最近访问时间)
+        self._data: OrderedDict[K, tuple[V, int, float]] = OrderedDict()
+        self._spilled: set[K] = set()
+        self.bytes = 0
+        self.evictions = 0
+        if budget is not None:
+            budget.members.append(self)
+
+    def _oldest_access(self) -> float:
+        return next(iter(self._data.values()))[2]
+
+    def _evict_one(self):
+        key, (value, size, _) = self._data.popitem(last=False)
+        self.bytes -= size
+        self.evictions += 1
+        if self.spill is not None:
+            self.spill.put(self.name, _dumps(key), _dumps(value))
+            self._spilled.add(key)
+        elif self.on_evict is not None:
+            self.on_evict(key, value)
+        metrics.inc("memory_store_evictions_total", store=self.name, spilled=self.spill is not None)
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._data and self._oldest_access() < deadline:
+            self._evict_one()
+
+    def _store(self, key: K, value: V, size: int):
+        if key in self._data:
+            self.bytes -= self._data[key][1]
+        self._data[key] = (value, size, time.monotonic())
+        self._data.move_to_end(key)
+        self.bytes += size
+        while self.max_items is not None and len(self._data) > self.max_items:
+            self._evict_one()
+        if self.budget is not None:
+            self.budget.shrink()
+
+    def __getitem__(self, key: K) -> V:
+        self._expire()
+        if key in self._data:
+            value, size, _ = self._data[key]
+            self._data[key] = (value, size, time.monotonic())
+            self._data.move_to_end(key)
+            return value
+        if key in self._spilled:
+            raw = self.spill.get(self.name, _dumps(key))
+            self._spilled.discard(key)
+            if raw is not None:
+                self.spill.delete(self.name, _dumps(key))
+                value = pickle.loads(raw)
+                self._store(key, value, len(raw))
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key: K, value: V):
+        self._expire()
+        try:
+            size = len(_dumps(value))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            size = 0
+        if key in self._spilled:
+            self._spilled.discard(key)
+            self.spill.delete(self.name, _dumps(key))
+        self._store(key, value, size)
+
+    def __delitem__(self, key: K):
+        if not self.discard(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data or key in self._spilled
+
+    def __iter__(self) -> Iterator[K]:
+        return iter([*self._data, *self._spilled])
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._spilled)
+
+    def __repr__(self) -> str:
+        return f"<BoundedDict {self.name}: {len(self._data)} resident, {len(self._spilled)} spilled>"
+
+    def discard(self, key: K) -> bool:
+        """删除条目, 不刷新其他条目的访问时间也不触发淘汰"""
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[1]
+            return True
+        if key in self._spilled:
+            self._spilled.discard(key)
+            self.spill.delete(self.name, _dumps(key))
+            return True
+        return False
+
+    def peek(self, key: K) -> V | None:
+        """读取内存中的条目, 不刷新访问时间也不从溢出文件读回"""
+        entry = self._data.get(key)
+        return entry[0] if entry else None
+
+    def values(self) -> list[V]:
+        """所有值的快照, 溢出的条目读出但不放回内存"""
+        values = [value for value, _, _ in self._data.values()]
+        if self._spilled:
+            values.extend(pickle.loads(raw) for raw in self.spill.values(self.name))
+        return values
+
+    def items(self) -> list[tuple[K, V]]:
+        items = [(key, value) for key, (value, _, _) in self._data.items()]
+        for key in self._spilled:
+            if (raw := self.spill.get(self.name, _dumps(key))) is not None:
+                items.append((key, pickle.loads(raw)))
+        return items
+
+    def usage(self) -> dict:
+        return {
+            "items": len(self._data),
+            "bytes": self.bytes,
+            "spilled_items": len(self._spilled),
+            "spilled_bytes": self.spill.size(self.name) if self._spilled else 0,
+            "evictions": self.evictions,
+            "max_items": self.max_items,
+        }
@@ -0,0 +1,271 @@
+"""
+把图片压缩到指定体积以内
+
+有损编码的体积随质量单调变化, 随像素数近似线性变化:
+1. 从原图均匀取 TILE_GRID x TILE_GRID 块原分辨率的小块拼成样图, 按几档质量试编码(耗时可忽略),
+   得到每像素字节数随质量变化的曲线; 缩小后的样图细节密度与原图不同, 估计偏差很大, 因此不使用
+2. 原尺寸下按曲线估计满足预算的最高质量, 以估计为引导二分, 每次完整编码后用实测体积校准曲线
+3. 最低质量仍超出时固定质量, 按实测体积与像素数成正比调整尺寸
+完整编码通常不超过 max_encodes 次, 在进程池中执行, 不占用事件循环与 API 进程的 GIL.
+"""
+
+import math
+import asyncio
+import functools
+import multiprocessing
+from io import BytesIO
+from typing import Any, TypeVar, Callable, Iterable, NamedTuple
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ExifTags, ImageOps, features
+
+from lib import settings
+
+TILE_SIZE = 128
+TILE_GRID = 4
+TRIAL_QUALITIES = (15, 30, 45, 60, 75, 85, 95)
+MIN_QUALITY = 15
+MAX_QUALITY = 95
+# 不缩小尺寸时的最低质量, 需要更低时缩小尺寸的画质更好
+QUALITY_FLOOR = 50
+# 缩小尺寸时使用的质量, 也用于比较不同格式的体积
+RESIZE_QUALITY = 75
+# 估计时只用到预算的该比例, 留出误差
+TARGET_RATIO = 0.95
+# 实测体积达到预算的该比例时不再尝试更高的质量
+GOOD_ENOUGH_RATIO = 0.85
+# 缩小尺寸时短边不小于该值, 预算小于此时的体积则放弃
+MIN_SIDE = 16
+# 完整编码次数的硬上限, 无法满足预算时不会一直尝试
+MAX_ENCODES_LIMIT = 12
+
+T = TypeVar("T")
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "AVIF": "avif", "PNG": "png"}
+
+
+class CompressedImage(NamedTuple):
+    data: bytes
+    format: str
+    width: int
+    height: int
+    quality: int
+    # 完整编码次数
+    encodes: int
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS[self.format]
+
+
+def available_formats(formats: Iterable[str]) -> list[str]:
+    """当前 Pillow 支持编码的格式"""
+    return [fmt for fmt in formats if fmt in ("JPEG", "PNG") or features.check(fmt.lower())]
+
+
+def _prepare(image: Image.Image, fmt: str) -> Image.Image:
+    """JPEG 把透明部分铺在白色背景上, 其他格式保留透明通道"""
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    if not has_alpha:
+        return image if image.mode == "RGB" else image.convert("RGB")
+    rgba = image.convert("RGBA")
+    if fmt != "JPEG":
+        return rgba
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def _encode(image: Image.Image, fmt: str, quality: int, icc_profile: bytes | None = None) -> bytes:
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, "JPEG", quality=quality, optimize=True, icc_profile=icc_profile)
+    elif fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4, icc_profile=icc_profile)
+    elif fmt == "PNG":
+        image.save(buffer, "PNG", icc_profile=icc_profile)
+    else:
+        image.save(buffer, "AVIF", quality=quality, speed=8, icc_profile=icc_profile)
+    return buffer.getvalue()
+
+
+def _sample(image: Image.Image) -> Image.Image:
+    """均匀分布的原分辨率小块拼成的样图"""
+    side = TILE_SIZE * TILE_GRID
+    if image.width <= side and image.height <= side:
+        return image
+    tile_w, tile_h = min(TILE_SIZE, image.width), min(TILE_SIZE, image.height)
+    sample = Image.new(image.mode, (tile_w * TILE_GRID, tile_h * TILE_GRID))
+    for row in range(TILE_GRID):
+        for col in range(TILE_GRID):
+            x = (image.width - tile_w) * col // (TILE_GRID - 1)
+            y = (image.height - tile_h) * row // (TILE_GRID - 1)
+            sample.paste(image.crop((x, y, x + tile_w, y + tile_h)), (col * tile_w, row * tile_h))
+    return sample
+
+
+def _trial_curve(sample: Image.Image, fmt: str) -> dict[int, float]:
+    """样图上各档质量的每像素字节数"""
+    pixels = sample.width * sample.height
+    return {quality: len(_encode(sample, fmt, quality)) / pixels for quality in TRIAL_QUALITIES}
+
+
+def _bpp(curve: dict[int, float], quality: int) -> float:
+    """按试编码的质量档位线性插值"""
+    qualities = sorted(curve)
+    for low, high in zip(qualities, qualities[1:], strict=False):
+        if quality <= high:
+            ratio = (quality - low) / (high - low)
+            return curve[low] + (curve[high] - curve[low]) * max(ratio, 0)
+    return curve[qualities[-1]]
+
+
+def compress_image(
+    content: bytes | Image.Image,
+    max_bytes: int,
+    formats: Iterable[str] = ("JPEG",),
+    max_encodes: int = 3,
+) -> CompressedImage:
+    """
+    压缩到 max_bytes 以内, formats 中有多种格式时选择同等质量下体积最小的
+
+    缩小到短边 MIN_SIDE 像素(或编码 MAX_ENCODES_LIMIT 次)仍超出预算时, 以 MIN_QUALITY 编码最小尺寸并返回,
+    结果可能超过 max_bytes, 由调用方决定是否接受.
+    """
+    if isinstance(content, Image.Image):
+        image = ImageOps.exif_transpose(content)
+    else:
+        with Image.open(BytesIO(content)) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    icc_profile = image.info.get("icc_profile")
+
+    width, height = image.size
+    budget = max_bytes * TARGET_RATIO
+
+    def candidate(fmt: str) -> tuple[Image.Image, dict[int, float]]:
+        prepared = _prepare(image, fmt)
+        return prepared, _trial_curve(_sample(prepared), fmt)
+
+    # JPEG 编码最快且兼容性最好, 原尺寸下能保持 RESIZE_QUALITY 时直接使用, 不再试编码其他格式;
+    # 否则选择同一质量档下体积最小的格式(不同编码器的质量刻度不完全可比), 其他格式至少小 10% 才使用
+    formats = available_formats(formats) or ["JPEG"]
+    fmt = "JPEG" if "JPEG" in formats else formats[0]
+    candidates = {fmt: candidate(fmt)}
+    if _bpp(candidates[fmt][1], RESIZE_QUALITY) * width * height > budget:
+        candidates.update((f, candidate(f)) for f in formats if f not in candidates)
+        fmt = min(candidates, key=lambda f: candidates[f][1][RESIZE_QUALITY] * (1.0 if f == "JPEG" else 1.1))
+    prepared, curve = candidates[fmt]
+    calibration = 1.0
+    encodes = 0
+
+    def estimate(quality: int) -> float:
+        return _bpp(curve, quality) * width * height * calibration
+
+    def encode(quality: int, scale: float = 1.0) -> CompressedImage:
+        nonlocal encodes
+        size = (max(round(width * scale), 1), max(round(height * scale), 1))
+        frame = prepared if size == prepared.size else prepared.resize(size, Image.Resampling.LANCZOS)
+        encodes += 1
+        return CompressedImage(_encode(frame, fmt, quality, icc_profile), fmt, *size, quality, encodes)
+
+    # 原尺寸下搜索质量: lo 为已满足预算的最高质量, hi 为超出预算的最低质量
+    best = None
+    lo, hi = QUALITY_FLOOR - 1, MAX_QUALITY + 1
+    while estimate(QUALITY_FLOOR) <= budget and encodes < max_encodes and hi - lo > 1:
+        fits = [quality for quality in range(hi - 1, lo, -1) if estimate(quality) <= budget]
+        quality = fits[0] if fits else lo + 1
+        result = encode(quality)
+        calibration *= len(result.data) / estimate(quality)
+        if len(result.data) <= max_bytes:
+            best, lo = result, quality
+            if len(result.data) >= max_bytes * GOOD_ENOUGH_RATIO:
+                break
+        else:
+            hi = quality
+    if best is not None:
+        return best._replace(encodes=encodes)
+
+    # 缩小尺寸: 体积近似为缩放比例的幂函数(纯像素数时指数为 2, 噪点多的图片缩小后更易压缩, 指数更大),
+    # 用原尺寸的估计与最近的实测点拟合指数, 计算下一次的缩放比例
+    points = [(1.0, _bpp(curve, RESIZE_QUALITY) * width * height * calibration)]
+    min_scale = min(MIN_SIDE / min(width, height), 1.0)
+    scale = max(min(math.sqrt(budget / points[0][1]), 1.0), min_scale)
+    fail_scale = 1.0
+    while True:
+        result = encode(RESIZE_QUALITY, scale)
+        size = len(result.data)
+        points.append((scale, size))
+        (s0, b0), (s1, b1) = points[-2:]
+        exponent = math.log(b0 / b1) / math.log(s0 / s1) if s0 != s1 and b0 != b1 else 2.0
+        next_scale = scale * (budget / size) ** (1 / min(max(exponent, 1.0), 3.0))
+        if size <= max_bytes:
+            best = result
+            if encodes >= max_encodes or size >= max_bytes * GOOD_ENOUGH_RATIO:
+                break
+            # 不超过已知超出预算的比例
+            next_scale = min(next_scale, (scale + fail_scale) / 2)
+            if next_scale - scale < 0.01:
+                break
+        elif best is not None:
+            break
+        elif scale <= min_scale or encodes >= MAX_ENCODES_LIMIT:
+            # 最小尺寸下仍超出预算, 最后用最低质量编码一次
+            return encode(MIN_QUALITY, min_scale)
+        else:
+            # 每次至少缩小 5%, 保证结束
+            fail_scale, next_scale = scale, min(next_scale, scale * 0.95)
+        scale = max(min(next_scale, 1.0), min_scale)
+    return best._replace(encodes=encodes)
+
+
+def render_thumbnail(path: str | Path, width: int | None, height: int | None, fmt: str, quality: int) -> bytes:
+    """按比例缩小到 width x height 以内(不放大)并编码, 读取文件在子进程中完成"""
+    with Image.open(path) as source:
+        box = (width or source.width, height or source.height)
+        # EXIF 方向为旋转 90 度时, 解码出的宽高与显示的相反
+        if source.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            box = box[::-1]
+        # JPEG 解码时直接按 1/2^n 缩小, 大图可省去大部分解码
+        source.draft("RGB", box)
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return _encode(_prepare(image, fmt), fmt, quality, source.info.get("icc_profile"))
+
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # API 进程中有多个线程, 使用 spawn 避免 fork 继承锁状态
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.storage.compress_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def compress_image_async(
+    content: bytes,
+    max_bytes: int,
+    formats: Iterable[str] | None = None,
+    max_encodes: int = 3,
+) -> CompressedImage:
+    """在进程池中压缩, 传给子进程的是原始字节, formats 默认为 settings.storage.compress_formats"""
+    formats = tuple(formats or settings.storage.compress_formats)
+    return await run_in_process_pool(compress_image, content, max_bytes, formats, max_encodes)
+
+
+async def run_in_process_pool(fn: Callable[..., T], *args: Any) -> T:
+    """在图片处理进程池中执行, fn 与参数需要可以序列化"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args))
+
+
+def close_compress_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -41,6 +41,8 @@ class PostgresConfig(BaseModel):
     password: SecretStr
     database: str
     pool_size: int = 30
+    checkpointer_pool_min: int = Field(2, title="checkpointer 连接池最小连接数")
+    checkpointer_pool_max: int = Field(20, title="checkpointer 连接池最大连接数")
 
 
 class AliyunOssConfig(BaseModel):
@@ -50,6 +52,8 @@ class AliyunOssConfig(BaseModel):
     bucket_name: str
     domain: str
     path_prefix: str = "midjourney_simple_api"
+    connection_pool_size: int = Field(32, title="OSS HTTP 连接池大小")
+    connect_timeout: int = Field(10, title="OSS 连接超时(秒)")
 
 
 class NacosConfig(BaseModel):
@@ -96,6 +100,148 @@ class SolutionConfig(BaseModel):
     kontext: Any | None = None
 
 
+class StreamConfig(BaseModel):
+    messages_delta: bool = Field(
+        True, title="增量消息模式", description="values 事件仅转换/推送/持久化新增或变更的消息"
+    )
+    persist_batch_size: int = Field(20, title="消息批量落库条数阈值")
+    persist_flush_interval: float = Field(0.5, title="消息批量落库时间阈值(秒)")
+    delta_flush_interval_ms: int = Field(
+        50, title="delta 事件合并窗口(毫秒)", description="0 表示不合并, 逐 token 推送"
+    )
+    delta_flush_bytes: int = Field(2048, title="delta 事件合并字节阈值")
+
+
+class StorageConfig(BaseModel):
+    backend: Literal["oss", "local"] = Field(
+        "oss", title="文件存储后端", description="local 为本地文件系统, 用于开发与测试"
+    )
+    upload_workers: int = Field(16, title="异步上传线程数")
+    dedup_cache_size: int = Field(4096, title="图片去重索引进程内缓存条数")
+    compress_workers: int = Field(2, title="图片压缩进程数")
+    compress_formats: list[Literal["JPEG", "WEBP", "AVIF"]] = Field(
+        ["JPEG"], title="压缩输出格式候选", description="可加入 WEBP/AVIF, 预估体积更小时使用"
+    )
+    local_dir: Path | None = Field(None, title="本地存储目录", description="默认 data_dir/storage")
+    local_base_url: str | None = Field(
+        None, title="本地存储访问地址", description="默认 http://localhost:{api_port}/api/storage"
+    )
+
+
+class ThumbnailConfig(BaseModel):
+    cache_dir: Path | None = Field(None, title="缩略图缓存目录", description="默认 data_dir/thumbnails")
+    max_cache_bytes: int = Field(
+        1024 * 1024 * 1024, title="缩略图缓存大小上限", description="超出时按最近访问时间淘汰到上限的 90%"
+    )
+    max_side: int = Field(4096, title="缩放后的最大边长")
+    quality: int = Field(80, title="默认编码质量")
+    cache_control: str = Field("public, max-age=604800", title="图片响应的 Cache-Control")
+
+
+class CanvasConfig(BaseModel):
+    compact_every: int = Field(50, title="增量合并阈值", description="快照之后累积的增量条数达到该值时合并为新快照")
+    document_cache_size: int = Field(256, title="进程内缓存的画布文档数量", description="用于校验增量, 避免每次读取")
+
+
+class ProviderLimitConfig(BaseModel):
+    concurrency: int = Field(4, title="最大并发请求数")
+    rate: float | None = Field(2, title="每秒请求数", description="令牌桶速率, 为空不限速")
+    burst: int = Field(4, title="令牌桶容量")
+    max_retries: int = Field(2, title="临时错误(429/5xx/超时)的重试次数")
+    backoff: float = Field(1, title="重试退避基数(秒)", description="指数退避, 全抖动")
+    max_backoff: float = Field(20, title="最大退避时间(秒)")
+    failure_threshold: int = Field(5, title="熔断阈值", description="连续失败次数达到该值后熔断, 快速失败")
+    recovery_seconds: float = Field(30, title="熔断恢复时间(秒)", description="熔断后经过该时间放行一个探测请求")
+
+
+def _default_image_providers() -> dict[str, ProviderLimitConfig]:
+    return {
+        "ark": ProviderLimitConfig(concurrency=8, rate=5, burst=8),
+        "gemini": ProviderLimitConfig(concurrency=4, rate=2, burst=4),
+        "dashscope": ProviderLimitConfig(concurrency=2, rate=1, burst=2),
+    }
+
+
+class RembgConfig(BaseModel):
+    model: str = Field("u2net", title="抠图模型", description="rembg 的模型名, 如 u2net/u2netp/isnet-general-use")
+    pool_size: int = Field(2, title="会话池大小", description="进程内同时推理的图片数, 每个会话各占一份模型内存")
+    threads_per_session: int | None = Field(
+        None, title="每个会话的推理线程数", description="为空时为 CPU 核数 / pool_size"
+    )
+
+
+class MemoryConfig(BaseModel):
+    max_canvases: int | None = Field(1000, title="内存模式最多保留的画布数")
+    max_sessions: int | None = Field(5000, title="内存模式最多保留的会话数")
+    max_messages: int | None = Field(200_000, title="内存模式最多保留的消息数")
+    max_bytes: int | None = Field(
+        512 * 1024 * 1024,
+        title="内存模式数据的估算字节上限",
+        description="画布/会话/消息共享, 超出时淘汰最久未访问的条目; 不含随消息增删的 lc_id 索引",
+    )
+    ttl_seconds: int | None = Field(
+        None, title="闲置过期时间(秒)", description="超过该时间未访问的条目被淘汰, 为空不过期"
+    )
+    spill_path: Path | None = Field(
+        None, title="溢出文件", description="被淘汰的条目写入该 SQLite 文件, 再次访问时读回; 为空时直接丢弃, 启动时清空"
+    )
+    checkpoint_max_threads: int | None = Field(1000, title="内存 checkpointer 最多保留的线程数")
+    checkpoint_max_per_thread: int | None = Field(20, title="每个线程保留的 checkpoint 数", description="更早的被删除")
+    checkpoint_max_bytes: int | None = Field(512 * 1024 * 1024, title="内存 checkpointer 的字节上限")
+
+
+class JobConfig(BaseModel):
+    enabled: bool = Field(
+        False,
+        title="生图等长任务走任务队列",
+        description="关闭时在工具调用中同步执行; 开启后结果只写入聊天记录与画布, 不进入智能体的对话状态, "
+        "模型看不到生成的图片地址",
+    )
+    inline_workers: int = Field(
+        1, title="API 进程内的 worker 数", description="0 表示只由独立的 worker 进程执行(仅 postgres 模式)"
+    )
+    concurrency: int = Field(4, title="每个 worker 同时执行的任务数")
+    lease_seconds: float = Field(
+        120, title="任务租约(秒)", description="执行中定期续约, worker 崩溃后租约过期的任务由其他 worker 重新领取"
+    )
+    poll_interval: float = Field(1, title="空闲时轮询队列的间隔(秒)")
+    max_attempts: int = Field(3, title="最大执行次数", description="失败或租约过期后重新入队, 超过后标记为失败")
+    retry_backoff: float = Field(5, title="重试退避基数(秒)")
+
+
+class ToolCacheConfig(BaseModel):
+    enabled: bool = Field(
+        False, title="缓存生图工具结果", description="相同模型/提示词/输入图片内容/尺寸参数直接返回上次的结果"
+    )
+    store: Literal["memory", "redis", "postgres"] = Field(
+        "memory", title="共享存储", description="memory 只使用进程内缓存; redis 需要配置 [redis]"
+    )
+    ttl_seconds: int = Field(7 * 24 * 3600, title="缓存有效期(秒)")
+    memory_size: int = Field(512, title="进程内缓存条数")
+    max_entries: int = Field(
+        100_000, title="postgres 中保留的条目数", description="超出时删除最早写入的条目, redis 由 maxmemory 策略约束"
+    )
+
+
+class HotspotConfig(BaseModel):
+    ttl_seconds: float = Field(300, title="热榜缓存有效期(秒)", description="TopHub 榜单每几分钟更新一次")
+    stale_seconds: float = Field(
+        1800, title="过期后仍可返回的时间(秒)", description="期间先返回旧数据并在后台刷新(stale-while-revalidate)"
+    )
+    concurrency: int = Field(7, title="TopHub 最大并发请求数")
+    timeout: float = Field(30, title="请求超时(秒)")
+    refresh_interval: float | None = Field(
+        None, title="后台刷新间隔(秒)", description="设置后 API 进程定期刷新各平台热榜, 为空时只在访问时刷新"
+    )
+
+
+class ClusterConfig(BaseModel):
+    backend: Literal["local", "redis"] = Field(
+        "local", title="跨进程协作后端", description="多 worker/多节点部署时使用 redis"
+    )
+    prefix: str = Field("aicanvas", title="redis 键与频道前缀")
+
+
 class Settings(BaseSettings):
     app_name: str = "ai-tools"
     project_name: str = "AiMark Design Agent"
@@ -122,6 +268,22 @@ class Settings(BaseSettings):
     apps: Any | None = Field(None, title="多应用配置")
     tools: Any | None = Field(None, title="私有化部署工具")
     infras: Any | None = Field(None, title="基础设施配置")
+    stream: StreamConfig = Field(default_factory=StreamConfig, title="流式输出配置")
+    cluster: ClusterConfig = Field(default_factory=ClusterConfig, title="集群配置")
+    storage: StorageConfig = Field(default_factory=StorageConfig, title="文件存储配置")
+    canvas: CanvasConfig = Field(default_factory=CanvasConfig, title="画布存储配置")
+    thumbnails: ThumbnailConfig = Field(default_factory=ThumbnailConfig, title="缩略图服务")
+    memory: MemoryConfig = Field(default_factory=MemoryConfig, title="内存模式存储上限")
+    image_providers: dict[str, ProviderLimitConfig] = Field(
+        default_factory=_default_image_providers,
+        title="图像服务限流与熔断",
+        description="按服务商配置, 未配置的使用默认值",
+    )
+    rembg: RembgConfig = Field(default_factory=RembgConfig, title="本地抠图")
+    tool_cache: ToolCacheConfig = Field(default_factory=ToolCacheConfig, title="工具结果缓存")
+    hotspot: HotspotConfig = Field(default_factory=HotspotConfig, title="热点数据服务")
+    jobs: JobConfig = Field(default_factory=JobConfig, title="后台任务队列")
+    agent_cache_size: int = Field(16, title="已编译智能体缓存数量", description="按模型/工具组合缓存, LRU 淘汰")
 
     postgres: PostgresConfig = None
 
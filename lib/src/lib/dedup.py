@@ -0,0 +1,126 @@
+"""
+按内容(sha256)去重的图片索引
+
+sha256 -> 已上传的 url 与尺寸, 进程内 LRU + 可选的持久化存储(由 api 在启动时注册 postgres 实现).
+相同内容的图片只解码、上传一次.
+"""
+
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from lib import metrics, settings
+from lib.image import probe_image, upload_image_async
+
+
+@dataclass
+class ImageRecord:
+    sha256: str
+    url: str
+    width: int | None = None
+    height: int | None = None
+    mime_type: str | None = None
+    file_size: int | None = None
+
+    @property
+    def extension(self) -> str:
+        return (self.mime_type or "image/png").split("/")[-1].replace("jpeg", "jpg")
+
+    @property
+    def filename(self) -> str:
+        return self.url.split("/")[-1]
+
+    def model_dump(self) -> dict:
+        return asdict(self)
+
+
+class ImageRecordStore(ABC):
+    """持久化存储接口"""
+
+    @abstractmethod
+    async def get(self, sha256: str) -> ImageRecord | None: ...
+
+    @abstractmethod
+    async def put(self, record: ImageRecord): ...
+
+
+def sha256_hex(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class ImageIndex:
+    def __init__(self, maxsize: int = 4096, store: ImageRecordStore | None = None):
+        self.maxsize = maxsize
+        self.store = store
+        self._cache: OrderedDict[str, ImageRecord] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.lookups = 0
+
+    def _remember(self, record: ImageRecord):
+        self._cache[record.sha256] = record
+        self._cache.move_to_end(record.sha256)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _count(self, result: str):
+        self.lookups += 1
+        if result != "miss":
+            self.hits += 1
+        metrics.inc("image_dedup_total", result=result)
+        metrics.set_gauge("image_dedup_hit_rate", self.hits / self.lookups)
+
+    async def lookup(self, sha256: str) -> ImageRecord | None:
+        if record := self._cache.get(sha256):
+            self._cache.move_to_end(sha256)
+            self._count("memory_hit")
+            return record
+        if self.store and (record := await self.store.get(sha256)):
+            self._remember(record)
+            self._count("store_hit")
+            return record
+        self._count("miss")
+        return None
+
+    async def add(self, record: ImageRecord):
+        self._remember(record)
+        if self.store:
+            await self.store.put(record)
+
+    async def get_or_upload(self, content: bytes, *, prefix: str, sha256: str | None = None) -> ImageRecord:
+        """
+        已存在相同内容时直接返回记录, 否则解析尺寸并以 sha256 命名上传
+        同一内容的并发请求只上传一次
+        """
+        sha256 = sha256 or await asyncio.to_thread(sha256_hex, content)
+        if sha256 in self._inflight:
+            return await asyncio.shield(self._inflight[sha256])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[sha256] = future
+        try:
+            record = await self.lookup(sha256)
+            if record is None:
+                probe = probe_image(content)
+                record = ImageRecord(sha256, "", probe.width, probe.height, probe.mime_type, len(content))
+                record.url = await upload_image_async(f"{sha256}.{record.extension}", content, prefix=prefix)
+                if not record.url:
+                    raise RuntimeError(f"图片上传失败: {sha256}")
+                await self.add(record)
+            future.set_result(record)
+            return record
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(sha256, None)
+
+
+image_index = ImageIndex(maxsize=settings.storage.dedup_cache_size)
@@ -1,10 +1,165 @@
 import base64
+import struct
+import asyncio
+import functools
+import threading
+from io import BytesIO
+from abc import ABC, abstractmethod
+from typing import Any, TypeVar, Callable, Iterable, Sequence, NamedTuple
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import oss2
 import uuid_utils as uuid
+from PIL import Image
 
 from lib import settings
 
+T = TypeVar("T")
+
+
+class Storage(ABC):
+    """对象存储后端, put 返回可访问的 url"""
+
+    @abstractmethod
+    def put(self, key: str, data: str | bytes, domain: str | None = None) -> str | None: ...
+
+    def put_stream(self, key: str, chunks: Iterable[bytes], domain: str | None = None) -> str | None:
+        """分块上传, 不在内存中拼接完整内容; 默认实现拼接后调用 put"""
+        return self.put(key, b"".join(chunks), domain=domain)
+
+    @abstractmethod
+    def move(self, src: str, dst: str, domain: str | None = None) -> str | None:
+        """把已上传的 src 移动到 dst(已存在时覆盖), 返回 dst 的 url"""
+
+    @abstractmethod
+    def delete(self, key: str): ...
+
+
+class OssStorage(Storage):
+    """阿里云 OSS, 进程内共享同一个 Bucket(及其 HTTP 连接池), 连接保持复用"""
+
+    def __init__(self):
+        self._bucket: oss2.Bucket | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self) -> oss2.Bucket:
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    oss = settings.oss
+                    self._bucket = oss2.Bucket(
+                        oss2.Auth(oss.access_key_id, oss.access_key_secret),
+                        oss.endpoint,
+                        oss.bucket_name,
+                        session=oss2.Session(pool_size=oss.connection_pool_size),
+                        connect_timeout=oss.connect_timeout,
+                    )
+        return self._bucket
+
+    def url(self, key: str, domain: str | None = None) -> str:
+        oss = settings.oss
+        domain = domain or oss.domain
+        if domain:
+            return f"https://{domain}/{key}"
+        return f"https://{oss.bucket_name}.{oss.endpoint}/{key}"
+
+    def put(self, key: str, data: str | bytes | Iterable[bytes], domain: str | None = None) -> str | None:
+        result = self.bucket.put_object(key, data)
+        if result.status == 200:
+            return self.url(key, domain)
+        else:
+            return None
+
+    def put_stream(self, key: str, chunks: Iterable[bytes], domain: str | None = None) -> str | None:
+        # oss2 对可迭代对象使用 chunked 编码上传
+        return self.put(key, chunks, domain=domain)
+
+    def move(self, src: str, dst: str, domain: str | None = None) -> str | None:
+        # OSS 没有重命名, 服务端复制后删除源对象
+        result = self.bucket.copy_object(self.bucket.bucket_name, src, dst)
+        self.delete(src)
+        return self.url(dst, domain) if result.status == 200 else None
+
+    def delete(self, key: str):
+        self.bucket.delete_object(key)
+
+
+class LocalStorage(Storage):
+    """本地文件系统, 用于开发与测试, 文件通过 /api/storage/{key} 访问"""
+
+    def __init__(self, root: Path | None = None, base_url: str | None = None):
+        self.root = root or settings.storage.local_dir or settings.data_dir / "storage"
+        self.base_url = (
+            base_url or settings.storage.local_base_url or f"http://localhost:{settings.api_port}/api/storage"
+        )
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put(self, key: str, data: str | bytes, domain: str | None = None) -> str | None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data.encode() if isinstance(data, str) else data)
+        return f"{self.base_url.rstrip('/')}/{key}"
+
+    def put_stream(self, key: str, chunks: Iterable[bytes], domain: str | None = None) -> str | None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件, 传输中断时不留下不完整的文件
+        temp = path.with_name(f".{path.name}.part")
+        try:
+            with temp.open("wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            temp.replace(path)
+        finally:
+            temp.unlink(missing_ok=True)
+        return f"{self.base_url.rstrip('/')}/{key}"
+
+    def move(self, src: str, dst: str, domain: str | None = None) -> str | None:
+        path = self.path(dst)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path(src).replace(path)
+        return f"{self.base_url.rstrip('/')}/{dst}"
+
+    def delete(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+
+_storage: Storage | None = None
+_upload_executor: ThreadPoolExecutor | None = None
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        _storage = LocalStorage() if settings.storage.backend == "local" else OssStorage()
+    return _storage
+
+
+def set_storage(storage: Storage | None):
+    """替换存储后端(测试用), 传 None 时按配置重新创建"""
+    global _storage
+    _storage = storage
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = ThreadPoolExecutor(max_workers=settings.storage.upload_workers, thread_name_prefix="upload")
+    return _upload_executor
+
+
+async def run_in_upload_executor(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在有界的上传线程池中执行阻塞的上传函数, 并发数受 storage.upload_workers 限制"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_upload_executor(), functools.partial(fn, *args, **kwargs))
+
 
 def upload_image(
     filename: str,
@@ -21,13 +176,6 @@ def upload_image(
     :param rename: 是否重命名, 默认为True
     :param domain: OSS域名, 默认为None时使用bucket_name+endpoint
     """
-    oss = settings.oss
-    endpoint = oss.endpoint
-
-    auth = oss2.Auth(oss.access_key_id, oss.access_key_secret)
-    bucket_name = oss.bucket_name
-    bucket = oss2.Bucket(auth, endpoint, bucket_name)
-
     if rename:
         uid = uuid.uuid7()
         upload_file_name = f"{prefix}/{uid}.{filename.split('.')[-1]}"
@@ -37,16 +185,122 @@ def upload_image(
         # 临时文件, 使用OSS生命周期自动删除
         upload_file_name = f"tmp/{upload_file_name}"
 
-    result = bucket.put_object(upload_file_name, data)
-    domain = domain or oss.domain
-    if domain:
-        image_link = f"https://{domain}/{upload_file_name}"
-    else:
-        image_link = f"https://{bucket_name}.{endpoint}/{upload_file_name}"
-    if result.status == 200:
-        return image_link
-    else:
-        return None
+    return get_storage().put(upload_file_name, data, domain=domain)
+
+
+async def upload_image_async(
+    filename: str,
+    data: str | bytes,
+    prefix: str = "tmp",
+    rename: bool = False,
+    domain: str = None,
+) -> str | None:
+    """upload_image 的异步版本, 在有界线程池中执行, 并发上传数受 storage.upload_workers 限制"""
+    return await run_in_upload_executor(upload_image, filename, data, prefix=prefix, rename=rename, domain=domain)
+
+
+async def upload_many(
+    files: Sequence[tuple[str, str | bytes]],
+    prefix: str = "tmp",
+    rename: bool = False,
+    domain: str = None,
+) -> list[str | None]:
+    """
+    并发上传多个文件, 返回的 url 与 files 顺序一致
+    :param files: (filename, data) 列表
+    """
+    tasks = [upload_image_async(name, data, prefix=prefix, rename=rename, domain=domain) for name, data in files]
+    return list(await asyncio.gather(*tasks))
+
+
+class ImageProbe(NamedTuple):
+    width: int
+    height: int
+    mime_type: str
+    extension: str
+
+
+# JPEG 中携带尺寸的 SOF 段, 排除 DHT(C4)/JPG(C8)/DAC(CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _probe_png(data: bytes) -> tuple[int, int] | None:
+    if len(data) >= 24 and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    return None
+
+
+def _probe_gif(data: bytes) -> tuple[int, int] | None:
+    if len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    return None
+
+
+def _probe_webp(data: bytes) -> tuple[int, int] | None:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def _probe_jpeg(data: bytes) -> tuple[int, int] | None:
+    i, size = 2, len(data)
+    while i + 4 <= size:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        # 填充字节与无长度的标记
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            i += 2
+            continue
+        (length,) = struct.unpack(">H", data[i + 2 : i + 4])
+        if marker in _JPEG_SOF:
+            if i + 9 > size:
+                return None
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def probe_image_header(data: bytes) -> ImageProbe | None:
+    """只读取文件头获取 PNG/JPEG/WebP/GIF 的尺寸与格式, 数据不完整或格式不支持时返回 None"""
+    probed = None
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        probed, mime_type, extension = _probe_png(data), "image/png", "png"
+    elif data.startswith(b"\xff\xd8"):
+        probed, mime_type, extension = _probe_jpeg(data), "image/jpeg", "jpg"
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        probed, mime_type, extension = _probe_webp(data), "image/webp", "webp"
+    elif data[:6] in (b"GIF87a", b"GIF89a"):
+        probed, mime_type, extension = _probe_gif(data), "image/gif", "gif"
+    if probed:
+        return ImageProbe(*probed, mime_type, extension)
+    return None
+
+
+def probe_image(data: bytes) -> ImageProbe:
+    """
+    获取图片尺寸与格式, 不解码像素
+    PNG/JPEG/WebP/GIF 只解析文件头, 其他格式回退到 PIL
+    """
+    if probed := probe_image_header(data):
+        return probed
+
+    with Image.open(BytesIO(data)) as pil:
+        img_format = (pil.format or "png").lower()
+        return ImageProbe(
+            *pil.size, Image.MIME.get(pil.format, f"image/{img_format}"), img_format.replace("jpeg", "jpg")
+        )
 
 
 def parse_data_url_to_bytes(data_url: str) -> bytes:
@@ -0,0 +1,139 @@
+"""
+RFC 6902 JSON Patch
+
+apply_patch 原地修改文档并返回结果(根路径被替换时返回新对象), make_patch 生成两个文档之间的补丁.
+"""
+
+import copy
+from typing import Any
+
+
+class JsonPatchError(ValueError):
+    """补丁格式错误或无法应用到当前文档"""
+
+
+def _parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"无效的 JSON Pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _escape(token: str | int) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _index(container: list, token: str, *, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"无效的数组下标: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"数组下标越界: {index}")
+    return index
+
+
+def _resolve(doc: Any, tokens: list[str]) -> Any:
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"路径不存在: {token!r}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        else:
+            raise JsonPatchError(f"路径不存在: {token!r}")
+    return doc
+
+
+def _add(doc: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, key = _resolve(doc, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"无法在非容器上添加: {key!r}")
+    return doc
+
+
+def _remove(doc: Any, tokens: list[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("不能删除根节点")
+    parent, key = _resolve(doc, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"路径不存在: {key!r}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, key))
+    raise JsonPatchError(f"路径不存在: {key!r}")
+
+
+def apply_patch(doc: Any, patch: list[dict]) -> Any:
+    """按顺序应用补丁, 失败时抛出 JsonPatchError(此时文档可能已被部分修改)"""
+    if not isinstance(patch, list):
+        raise JsonPatchError("补丁必须是操作数组")
+    for operation in patch:
+        try:
+            op, path = operation["op"], _parse_pointer(operation["path"])
+        except (KeyError, TypeError) as e:
+            raise JsonPatchError(f"无效的补丁操作: {operation!r}") from e
+
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"{op} 操作缺少 value")
+        if op == "add":
+            doc = _add(doc, path, operation["value"])
+        elif op == "remove":
+            _remove(doc, path)
+        elif op == "replace":
+            if path:
+                _remove(doc, path)
+            doc = _add(doc, path, operation["value"])
+        elif op in ("move", "copy"):
+            source = _parse_pointer(operation.get("from", ""))
+            if op == "move" and path[: len(source)] == source and path != source:
+                raise JsonPatchError("不能将节点移动到其子节点")
+            value = _remove(doc, source) if op == "move" else copy.deepcopy(_resolve(doc, source))
+            doc = _add(doc, path, value)
+        elif op == "test":
+            if _resolve(doc, path) != operation["value"]:
+                raise JsonPatchError(f"test 失败: {operation['path']}")
+        else:
+            raise JsonPatchError(f"不支持的操作: {op!r}")
+    return doc
+
+
+def make_patch(source: Any, target: Any, path: str = "") -> list[dict]:
+    """
+    生成把 source 变为 target 的补丁
+    对象逐键比较; 数组逐下标比较公共部分, 多出的元素追加, 缺少的从尾部删除
+    """
+    if source == target:
+        return []
+    if isinstance(source, dict) and isinstance(target, dict):
+        patch = []
+        for key in source.keys() - target.keys():
+            patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in source:
+                patch.append({"op": "add", "path": child, "value": value})
+            else:
+                patch.extend(make_patch(source[key], value, child))
+        return patch
+    if isinstance(source, list) and isinstance(target, list):
+        patch = []
+        common = min(len(source), len(target))
+        for index in range(common):
+            patch.extend(make_patch(source[index], target[index], f"{path}/{index}"))
+        for index in range(len(source) - 1, common - 1, -1):
+            patch.append({"op": "remove", "path": f"{path}/{index}"})
+        for value in target[common:]:
+            patch.append({"op": "add", "path": f"{path}/-", "value": value})
+        return patch
+    return [{"op": "replace", "path": path, "value": target}]
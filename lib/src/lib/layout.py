@@ -0,0 +1,115 @@
+"""
+画布元素的行布局索引
+
+媒体元素按 (y, x) 排序后依次归入第一个与其垂直方向重叠的行, 否则新建一行;
+平均 y 最大的行为最后一行, 新元素追加到最后一行右侧, 满行时在其下方新建一行.
+每行只维护 顶部/底部/最右元素/平均 y, 构建 O(n log n), 每次放置 O(log n).
+"""
+
+import heapq
+from typing import Iterable
+from dataclasses import dataclass
+
+MEDIA_TYPES = ("image", "embeddable", "video")
+
+
+@dataclass
+class Row:
+    top: float
+    bottom: float
+    # 最右元素(x 最大, 相同时取后加入的)
+    right_x: float
+    right_width: float
+    count: int = 1
+    sum_y: float = 0
+
+    @classmethod
+    def of(cls, x: float, y: float, width: float, height: float) -> "Row":
+        return cls(top=y, bottom=y + height, right_x=x, right_width=width, sum_y=y)
+
+    @property
+    def average_y(self) -> float:
+        return self.sum_y / self.count
+
+    def add(self, x: float, y: float, width: float, height: float):
+        self.top = min(self.top, y)
+        self.bottom = max(self.bottom, y + height)
+        if x >= self.right_x:
+            self.right_x, self.right_width = x, width
+        self.count += 1
+        self.sum_y += y
+
+
+def _box(element: dict) -> tuple[float, float, float, float]:
+    return (
+        element.get("x") or 0,
+        element.get("y") or 0,
+        element.get("width") or 0,
+        element.get("height") or 0,
+    )
+
+
+class RowLayout:
+    def __init__(self, max_num_per_row: int = 4, spacing: float = 20):
+        self.max_num_per_row = max_num_per_row
+        self.spacing = spacing
+        self.rows: list[Row] = []
+        # (-平均 y, -行号, 入堆时的元素数), 行被修改后旧条目失效, 取堆顶时惰性丢弃
+        self._last: list[tuple[float, int, int]] = []
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[dict], max_num_per_row: int = 4, spacing: float = 20) -> "RowLayout":
+        layout = cls(max_num_per_row, spacing)
+        boxes = sorted(
+            (_box(e) for e in elements if e.get("type") in MEDIA_TYPES and not e.get("isDeleted")),
+            key=lambda box: (box[1], box[0]),
+        )
+        # 按行号排序的候选行; 元素按 y 递增处理, 底部 <= 当前 y 的行之后不会再与元素重叠, 直接丢弃
+        open_rows: list[int] = []
+        for x, y, width, height in boxes:
+            while open_rows and layout.rows[open_rows[0]].bottom <= y:
+                heapq.heappop(open_rows)
+            if height > 0 and open_rows:
+                layout.rows[open_rows[0]].add(x, y, width, height)
+            else:
+                layout.rows.append(Row.of(x, y, width, height))
+                heapq.heappush(open_rows, len(layout.rows) - 1)
+        for index in range(len(layout.rows)):
+            layout._push(index)
+        return layout
+
+    def _push(self, index: int):
+        row = self.rows[index]
+        heapq.heappush(self._last, (-row.average_y, -index, row.count))
+
+    def _last_index(self) -> int | None:
+        while self._last:
+            _, index, count = self._last[0]
+            if self.rows[-index].count == count:
+                return -index
+            heapq.heappop(self._last)
+        return None
+
+    def next_position(self) -> tuple[float, float]:
+        index = self._last_index()
+        if index is None:
+            return 0, 0
+        row = self.rows[index]
+        if row.count < self.max_num_per_row:
+            return row.right_x + row.right_width + self.spacing, row.top
+        return 0, row.bottom + self.spacing
+
+    def place(self, width: float, height: float) -> tuple[float, float]:
+        """计算新元素的位置并加入索引: 追加到最后一行时留在该行, 否则新建一行"""
+        x, y = self.next_position()
+        index = self._last_index()
+        if index is not None and self.rows[index].count < self.max_num_per_row:
+            self.rows[index].add(x, y, width, height)
+        else:
+            self.rows.append(Row.of(x, y, width, height))
+            index = len(self.rows) - 1
+        self._push(index)
+        return x, y
+
+    def place_many(self, sizes: Iterable[tuple[float, float]]) -> list[tuple[float, float]]:
+        return [self.place(width, height) for width, height in sizes]
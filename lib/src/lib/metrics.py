@@ -0,0 +1,55 @@
+"""进程内指标: 计数器与瞬时值, 通过 /api/metrics 暴露"""
+
+import time
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = defaultdict(float)
+_gauges: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+
+started_at = time.time()
+
+
+def _key(name: str, labels: dict) -> tuple[str, tuple[tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """计数器累加"""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """设置瞬时值"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> dict:
+    """当前所有指标, 计数器附带按进程运行时长计算的平均速率"""
+    uptime = time.time() - started_at
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value, "rate": value / uptime if uptime else 0}
+            for (name, labels), value in _counters.items()
+        ]
+        gauges = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _gauges.items()]
+    return {"uptime": uptime, "counters": counters, "gauges": gauges}
+
+
+def render_prometheus() -> str:
+    """Prometheus 文本格式"""
+    lines = []
+    with _lock:
+        items = sorted([*_counters.items(), *_gauges.items()])
+    for (name, labels), value in items:
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,156 @@
+"""
+确定性工具调用的结果缓存
+
+键为 (工具, 模型, 规范化后的参数) 的 sha256, 值为可 JSON 序列化的结果.
+进程内 LRU(L1) + 可选的共享存储(redis 或 postgres, 由 api 在启动时注册), 条目按 TTL 过期.
+同一个键的并发调用只执行一次.
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Awaitable
+from collections import OrderedDict
+
+from lib import metrics, settings
+
+
+def cache_key(tool: str, **parts: Any) -> str:
+    """规范化(键排序, 紧凑分隔符)后的 JSON 的 sha256"""
+    canonical = json.dumps({"tool": tool, **parts}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ToolCacheStore(ABC):
+    """共享存储接口"""
+
+    @abstractmethod
+    async def get(self, key: str) -> dict | None: ...
+
+    @abstractmethod
+    async def put(self, key: str, tool: str, value: dict, ttl: float): ...
+
+    @abstractmethod
+    async def delete(self, key: str): ...
+
+
+class RedisToolCacheStore(ToolCacheStore):
+    """条目数量由 redis 的 maxmemory 策略约束, 过期由 EX 控制"""
+
+    def __init__(self, url: str, prefix: str = "aicanvas"):
+        import redis.asyncio as redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = f"{prefix}:tool_cache"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> dict | None:
+        raw = await self.redis.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    async def put(self, key: str, tool: str, value: dict, ttl: float):
+        await self.redis.set(self._key(key), json.dumps(value, ensure_ascii=False), ex=max(int(ttl), 1))
+
+    async def delete(self, key: str):
+        await self.redis.delete(self._key(key))
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class ToolResultCache:
+    def __init__(self, maxsize: int = 512, ttl: float = 7 * 24 * 3600, store: ToolCacheStore | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        # key -> (过期时间, 值)
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._cache[key] = (expires_at, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def get(self, tool: str, key: str) -> dict | None:
+        if entry := self._cache.get(key):
+            if entry[0] > time.time():
+                self._cache.move_to_end(key)
+                metrics.inc("tool_cache_total", tool=tool, result="memory_hit")
+                return entry[1]
+            del self._cache[key]
+        if self.store:
+            try:
+                value = await self.store.get(key)
+            except Exception as e:
+                # 共享存储不可用时退化为只用 L1
+                print(f"Error reading tool cache {key}: {e}")
+                value = None
+            if value is not None:
+                # 共享存储中的剩余有效期未知, L1 中最多保留一个 ttl
+                self._remember(key, value, time.time() + self.ttl)
+                metrics.inc("tool_cache_total", tool=tool, result="store_hit")
+                return value
+        metrics.inc("tool_cache_total", tool=tool, result="miss")
+        return None
+
+    async def put(self, tool: str, key: str, value: dict):
+        self._remember(key, value, time.time() + self.ttl)
+        if self.store:
+            try:
+                await self.store.put(key, tool, value, self.ttl)
+            except Exception as e:
+                print(f"Error writing tool cache {key}: {e}")
+
+    async def invalidate(self, key: str):
+        self._cache.pop(key, None)
+        if self.store:
+            await self.store.delete(key)
+
+    async def get_or_call(
+        self,
+        tool: str,
+        key: str,
+        call: Callable[[], Awaitable[dict | None]],
+        *,
+        force: bool = False,
+    ) -> dict | None:
+        """
+        命中时返回缓存的结果, 否则执行 call 并缓存其返回值(None 表示结果不可缓存, 如失败)
+        force=True 时跳过读取, 结果覆盖旧的缓存
+        """
+        if force:
+            metrics.inc("tool_cache_total", tool=tool, result="bypass")
+        elif key in self._inflight:
+            metrics.inc("tool_cache_total", tool=tool, result="inflight_hit")
+            return await asyncio.shield(self._inflight[key])
+        elif (value := await self.get(tool, key)) is not None:
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        if not force:
+            self._inflight[key] = future
+        try:
+            value = await call()
+            if value is not None:
+                await self.put(tool, key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+tool_cache = ToolResultCache(maxsize=settings.tool_cache.memory_size, ttl=settings.tool_cache.ttl_seconds)
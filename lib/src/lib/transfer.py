@@ -0,0 +1,175 @@
+"""
+URL 到对象存储的流式转存
+
+下载的分块直接写入存储(OSS chunked 上传), 同时计算 sha256 并从文件头识别尺寸与格式,
+每次转存占用的内存约为 文件头缓冲 + 队列中的分块, 与图片大小无关.
+"""
+
+import asyncio
+import hashlib
+import contextlib
+from typing import Iterator
+
+import httpx
+import uuid_utils as uuid
+
+from lib.dedup import ImageRecord, image_index
+from lib.image import ImageProbe, get_storage, probe_image, probe_image_header, run_in_upload_executor
+
+CHUNK_SIZE = 256 * 1024
+# 队列中最多缓存的分块数, 上传慢于下载时对下载形成背压
+QUEUE_CHUNKS = 8
+# 识别文件头最多缓冲的字节数(JPEG 的 EXIF/ICC 段可能较大)
+HEADER_LIMIT = 1024 * 1024
+
+_END = object()
+
+
+class ImageStream:
+    """包装分块迭代器: 缓冲文件头直到识别出尺寸与格式, 迭代时计算 sha256 与大小"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._head: list[bytes] = []
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read_header(self) -> ImageProbe:
+        head = b""
+        for chunk in self._chunks:
+            self._head.append(chunk)
+            head += chunk
+            if probed := probe_image_header(head):
+                return probed
+            if len(head) >= HEADER_LIMIT:
+                break
+        # 不支持的格式交给 PIL 识别, 仍然只读取已缓冲的文件头
+        return probe_image(head)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while self._head:
+            yield self._consume(self._head.pop(0))
+        for chunk in self._chunks:
+            yield self._consume(chunk)
+
+    def _consume(self, chunk: bytes) -> bytes:
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+def store_stream(chunks: Iterator[bytes], *, domain: str | None = None) -> tuple[str, ImageRecord]:
+    """
+    将分块写入临时对象, 返回临时对象的 key 与记录(url 为空)
+    最终以 sha256 命名(与 ImageIndex.get_or_upload 一致), sha256 要在传输结束后才能得到, 确认内容后再由 publish 移动
+    """
+    stream = ImageStream(chunks)
+    probe = stream.read_header()
+    staging = f"tmp/transfer/{uuid.uuid7()}.{probe.extension}"
+    if not get_storage().put_stream(staging, stream, domain=domain):
+        raise RuntimeError(f"图片上传失败: {staging}")
+    return staging, ImageRecord(stream.sha256, "", probe.width, probe.height, probe.mime_type, stream.size)
+
+
+def publish(staging: str, record: ImageRecord, *, prefix: str, domain: str | None = None) -> ImageRecord:
+    """把 store_stream 写入的临时对象移动到 {prefix}/{sha256}.{扩展名}, 相同内容移动到同一位置"""
+    key = f"{prefix}/{record.sha256}.{record.extension}"
+    url = get_storage().move(staging, key, domain=domain)
+    if not url:
+        raise RuntimeError(f"图片上传失败: {key}")
+    record.url = url
+    return record
+
+
+def transfer_url_sync(
+    url: str, *, prefix: str, client: httpx.Client, domain: str | None = None, chunk_size: int = CHUNK_SIZE
+) -> ImageRecord:
+    """同步版本, 用于脚本等非异步场景(不查询去重索引, 相同内容仍写入同一位置)"""
+    with client.stream("GET", url) as response:
+        response.raise_for_status()
+        staging, record = store_stream(response.iter_bytes(chunk_size), domain=domain)
+    try:
+        return publish(staging, record, prefix=prefix, domain=domain)
+    except BaseException:
+        with contextlib.suppress(Exception):
+            get_storage().delete(staging)
+        raise
+
+
+async def transfer_url(
+    url: str,
+    *,
+    prefix: str,
+    client: httpx.AsyncClient | None = None,
+    domain: str | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> ImageRecord:
+    """
+    流式下载 url 并转存, 已有相同内容(sha256)时返回已有的记录, 否则以 sha256 命名并加入去重索引
+    下载在事件循环中进行, 上传在上传线程池中进行, 两者通过有界队列连接
+    """
+    if client is None:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(180, connect=10), follow_redirects=True) as client:
+            return await transfer_url(url, prefix=prefix, client=client, domain=domain, chunk_size=chunk_size)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_CHUNKS)
+
+    def chunks() -> Iterator[bytes]:
+        while True:
+            item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    async def put(item):
+        # 上传线程提前结束(失败)时不再等待队列空位
+        putter = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait({putter, upload}, return_when=asyncio.FIRST_COMPLETED)
+        if not putter.done():
+            putter.cancel()
+            # 上传失败时抛出原始异常(如无法识别的图片), 由调用方区分处理
+            if error := upload.exception():
+                raise error
+            raise RuntimeError("上传已提前结束")
+
+    upload = asyncio.ensure_future(run_in_upload_executor(store_stream, chunks(), domain=domain))
+    try:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                await put(chunk)
+        await put(_END)
+    except BaseException as e:
+        # 通知上传线程中止, 避免留下不完整的对象
+        if not upload.done():
+            with contextlib.suppress(Exception):
+                await put(RuntimeError(f"下载中断: {e!r}"))
+        await asyncio.gather(upload, return_exceptions=True)
+        raise
+
+    staging, record = await upload
+    try:
+        # 已有相同内容时删除本次的临时对象, 返回已有的记录
+        if existing := await image_index.lookup(record.sha256):
+            await run_in_upload_executor(get_storage().delete, staging)
+            return existing
+        record = await run_in_upload_executor(publish, staging, record, prefix=prefix, domain=domain)
+        await image_index.add(record)
+    except BaseException:
+        # 查询索引/移动失败时临时对象不会再被使用, 删除后抛出原始异常(已移动时删除不存在的 key 无影响)
+        with contextlib.suppress(Exception):
+            await run_in_upload_executor(get_storage().delete, staging)
+        raise
+    return record
+
+
+async def transfer_urls(urls: list[str], *, prefix: str, client: httpx.AsyncClient | None = None) -> list[ImageRecord]:
+    """并发转存多个 url, 保持原顺序"""
+    return list(await asyncio.gather(*(transfer_url(url, prefix=prefix, client=client) for url in urls)))
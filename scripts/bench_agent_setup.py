@@ -0,0 +1,53 @@
+"""
+创意助手每轮对话的构建耗时: 每次重新构建 vs 已编译智能体缓存
+
+不发起模型请求, 只统计 langgraph_supervisor_agent 中进入 astream 之前的准备开销.
+
+    uv run python scripts/bench_agent_setup.py [provider]
+"""
+
+import sys
+import time
+import statistics
+
+from api.core.memory import memory_checkpointer
+from api.domain.tool import ToolInfo
+from api.domain.model import ModelInfo
+from agents.creative_assitant import get_creative_assistant, build_creative_assistant, creative_assistant_cache
+
+TURNS = 50
+
+provider = sys.argv[1] if len(sys.argv) > 1 else "openai"
+text_model = ModelInfo(provider=provider, model=provider, url=None, type="text", display_name=provider)
+tool_list = [
+    ToolInfo(id="image_create_with_seedream", display_name="Seedream", type="image", provider="ark"),
+    ToolInfo(id="image_create_with_gemini", display_name="Gemini", type="image", provider="gemini"),
+    ToolInfo(id="image_create_with_seedream4_5", display_name="Seedream 4.5", type="image", provider="ark"),
+]
+
+
+def measure(fn) -> list[float]:
+    samples = []
+    for i in range(TURNS):
+        # 前端每次传入的工具顺序可能不同
+        tools = tool_list[i % len(tool_list) :] + tool_list[: i % len(tool_list)]
+        start = time.perf_counter()
+        fn(text_model, tools=tools, checkpointer=memory_checkpointer)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples: list[float]):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{name:>10} | mean {statistics.mean(samples):8.3f} ms | p50 {statistics.median(samples):8.3f} ms"
+        f" | p95 {p95:8.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    report("rebuild", measure(build_creative_assistant))
+    creative_assistant_cache.clear()
+    report("cached", measure(get_creative_assistant))
+    print(f"缓存条目: {len(creative_assistant_cache)}")
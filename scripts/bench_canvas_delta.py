@@ -0,0 +1,104 @@
+"""
+画布保存写入量基准: 完整保存 vs JSON Patch 增量保存
+
+模拟一个含 N 个元素的画布连续自动保存(每次移动/修改一个元素, 偶尔新增元素),
+统计每次保存写入数据库的字节数. 增量模式按 canvas.compact_every 定期合并为快照, 合并的写入量计入平均值.
+
+    uv run python scripts/bench_canvas_delta.py
+"""
+
+import copy
+import json
+import time
+import random
+
+from lib import settings
+from lib.json_patch import make_patch, apply_patch
+
+ELEMENT_COUNTS = [100, 500, 2000]
+SAVES = 200
+
+
+def dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def new_element(index: int) -> dict:
+    return {
+        "id": f"element-{index}",
+        "type": random.choice(["image", "rectangle", "text", "arrow"]),
+        "x": random.uniform(0, 5000),
+        "y": random.uniform(0, 5000),
+        "width": random.uniform(50, 800),
+        "height": random.uniform(50, 800),
+        "angle": 0,
+        "strokeColor": "#1e1e1e",
+        "backgroundColor": "transparent",
+        "fillStyle": "solid",
+        "strokeWidth": 2,
+        "roughness": 1,
+        "opacity": 100,
+        "seed": random.randint(0, 2**31),
+        "version": 1,
+        "versionNonce": random.randint(0, 2**31),
+        "isDeleted": False,
+        "boundElements": None,
+        "updated": int(time.time() * 1000),
+        "fileId": f"file-{index}",
+        "status": "saved",
+    }
+
+
+def edit(doc: dict):
+    """模拟一次用户操作"""
+    elements = doc["elements"]
+    if random.random() < 0.1:
+        elements.append(new_element(len(elements)))
+        return
+    element = random.choice(elements)
+    element["x"] += random.uniform(-50, 50)
+    element["y"] += random.uniform(-50, 50)
+    element["version"] += 1
+    element["versionNonce"] = random.randint(0, 2**31)
+    element["updated"] = int(time.time() * 1000)
+
+
+def bench(count: int):
+    random.seed(count)
+    doc = {"elements": [new_element(i) for i in range(count)], "appState": {"zoom": {"value": 1}}, "files": {}}
+    server = copy.deepcopy(doc)
+    full_bytes = delta_bytes = 0
+    since_snapshot = 0
+    apply_seconds = 0.0
+
+    for _ in range(SAVES):
+        previous = copy.deepcopy(doc)
+        edit(doc)
+        full_bytes += len(dumps(doc))
+
+        patch = make_patch(previous, doc)
+        start = time.perf_counter()
+        server = apply_patch(server, json.loads(dumps(patch)))
+        apply_seconds += time.perf_counter() - start
+
+        since_snapshot += 1
+        if since_snapshot >= settings.canvas.compact_every:
+            delta_bytes += len(dumps(server))
+            since_snapshot = 0
+        else:
+            delta_bytes += len(dumps(patch))
+
+    assert server == doc
+    return full_bytes / SAVES, delta_bytes / SAVES, apply_seconds / SAVES * 1e6
+
+
+def main():
+    print(f"compact_every={settings.canvas.compact_every}, saves={SAVES}")
+    print(f"{'elements':>10}{'full(B/save)':>16}{'delta(B/save)':>16}{'ratio':>10}{'apply(us)':>12}")
+    for count in ELEMENT_COUNTS:
+        full, delta, apply_us = bench(count)
+        print(f"{count:>10}{full:>16.0f}{delta:>16.0f}{full / delta:>9.1f}x{apply_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
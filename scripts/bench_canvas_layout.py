@@ -0,0 +1,124 @@
+"""
+画布元素放置基准: 原有的逐行 any(...) 重叠检查 vs lib.layout.RowLayout
+
+在含 N 个元素的画布上一次放置 K 张新图片:
+- 原实现: 每放置一张都对全部元素重新分组(O(n²)), 放置后把元素加入画布
+- RowLayout: 构建一次索引后批量放置; 复用缓存的索引时只有放置开销
+
+    uv run python scripts/bench_canvas_layout.py
+"""
+
+import time
+import random
+
+from lib.layout import RowLayout
+
+ELEMENT_COUNTS = [1000, 10000]
+BATCH = 5
+MAX_NUM_PER_ROW = 4
+SPACING = 20
+
+
+def reference_position(canvas_data, max_num_per_row=MAX_NUM_PER_ROW, spacing=SPACING):
+    """重构前的 find_next_best_element_position"""
+    media_elements = [
+        e
+        for e in canvas_data.get("elements", [])
+        if e.get("type") in ["image", "embeddable", "video"] and not e.get("isDeleted")
+    ]
+    if not media_elements:
+        return 0, 0
+    media_elements.sort(key=lambda e: (e.get("y", 0), e.get("x", 0)))
+    rows = []
+    for element in media_elements:
+        y, height = element.get("y", 0), element.get("height", 0)
+        placed = False
+        for row in rows:
+            if any(max(y, r.get("y", 0)) < min(y + height, r.get("y", 0) + r.get("height", 0)) for r in row):
+                row.append(element)
+                placed = True
+                break
+        if not placed:
+            rows.append([element])
+    rows.sort(key=lambda row: sum(e.get("y", 0) for e in row) / len(row))
+    last_row = rows[-1]
+    last_row.sort(key=lambda e: e.get("x", 0))
+    if len(last_row) < max_num_per_row:
+        rightmost_element = last_row[-1]
+        return rightmost_element.get("x", 0) + rightmost_element.get("width", 0) + spacing, min(
+            e.get("y", 0) for e in last_row
+        )
+    return 0, max(e.get("y", 0) + e.get("height", 0) for e in last_row) + spacing
+
+
+def random_size() -> tuple[int, int]:
+    return random.choice([(1024, 1024), (1024, 768), (768, 1024), (1280, 720)])
+
+
+def element(x, y, width, height) -> dict:
+    return {"type": "image", "x": x, "y": y, "width": width, "height": height, "isDeleted": False}
+
+
+def build_canvas(count: int) -> dict:
+    """用放置规则生成的画布, 混入少量其他类型与已删除的元素"""
+    layout = RowLayout(MAX_NUM_PER_ROW, SPACING)
+    elements = []
+    for width, height in (random_size() for _ in range(count)):
+        x, y = layout.place(width, height)
+        elements.append(element(x, y, width, height))
+    for e in random.sample(elements, count // 20):
+        e["isDeleted"] = True
+    elements.extend({"type": "text", "x": random.uniform(0, 5000), "y": random.uniform(0, 5000)} for _ in range(50))
+    return {"elements": elements}
+
+
+def random_canvas(count: int) -> dict:
+    """随意摆放的画布, 用于校验分组规则与原实现一致"""
+    return {
+        "elements": [element(random.uniform(0, 8000), random.uniform(0, 8000), *random_size()) for _ in range(count)]
+    }
+
+
+def reference_batch(canvas_data, sizes) -> list:
+    elements = list(canvas_data["elements"])
+    positions = []
+    for width, height in sizes:
+        x, y = reference_position({"elements": elements})
+        elements.append(element(x, y, width, height))
+        positions.append((x, y))
+    return positions
+
+
+def main():
+    random.seed(0)
+    for _ in range(200):
+        canvas = random_canvas(random.randint(0, 60))
+        assert RowLayout.from_elements(canvas["elements"]).next_position() == reference_position(canvas)
+
+    print(f"max_num_per_row={MAX_NUM_PER_ROW}, batch={BATCH}")
+    print(f"{'elements':>10}{'reference(ms)':>16}{'build+place(ms)':>18}{'cached(us)':>12}{'speedup':>10}")
+    for count in ELEMENT_COUNTS:
+        canvas = build_canvas(count)
+        sizes = [random_size() for _ in range(BATCH)]
+
+        start = time.perf_counter()
+        expected = reference_batch(canvas, sizes)
+        reference_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        layout = RowLayout.from_elements(canvas["elements"], MAX_NUM_PER_ROW, SPACING)
+        positions = layout.place_many(sizes)
+        indexed_ms = (time.perf_counter() - start) * 1e3
+        assert positions == expected, (positions, expected)
+
+        start = time.perf_counter()
+        layout.place_many(sizes)
+        cached_us = (time.perf_counter() - start) * 1e6
+
+        print(
+            f"{count:>10}{reference_ms:>16.1f}{indexed_ms:>18.2f}{cached_us:>12.1f}{reference_ms / indexed_ms:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
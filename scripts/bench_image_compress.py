@@ -0,0 +1,93 @@
+"""
+上传图片压缩基准: 原有的 routes.file.compress_image(逐档降质量再逐档缩小) vs lib.compress.compress_image
+
+生成照片类与截图类的大图, 压缩到不同的体积上限, 对比耗时, 完整编码次数, 输出体积与质量.
+
+    uv run python scripts/bench_image_compress.py
+"""
+
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from lib.compress import compress_image, available_formats
+
+LIMITS_MB = [3.0, 1.0, 0.3]
+
+
+def build_corpus() -> dict[str, Image.Image]:
+    size = (4000, 3000)
+    # 渐变 + 噪声, 接近照片
+    gradient = Image.linear_gradient("L").resize(size)
+    photo = Image.merge("RGB", (gradient, Image.effect_noise(size, 48), gradient.rotate(90).resize(size)))
+    # 大面积纯色与文字, 接近截图/设计稿
+    screenshot = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(screenshot)
+    for y in range(0, size[1], 40):
+        draw.text((40, y), "lorem ipsum dolor sit amet " * 12, fill=(30, 30, 30))
+    return {"photo": photo, "screenshot": screenshot}
+
+
+def reference_compress(img: Image.Image, max_size_mb: float) -> tuple[bytes, int]:
+    """重构前的 compress_image, 额外返回编码次数"""
+    encodes = 0
+    quality = 95
+    while quality > 10:
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        encodes += 1
+        if len(buffer.getvalue()) / (1024 * 1024) <= max_size_mb:
+            return buffer.getvalue(), encodes
+        quality -= 10
+
+    original_width, original_height = img.size
+    scale_factor = 0.8
+    while scale_factor > 0.3:
+        resized_img = img.resize(
+            (int(original_width * scale_factor), int(original_height * scale_factor)), Image.Resampling.LANCZOS
+        )
+        buffer = BytesIO()
+        resized_img.save(buffer, format="JPEG", quality=70, optimize=True)
+        encodes += 1
+        if len(buffer.getvalue()) / (1024 * 1024) <= max_size_mb:
+            return buffer.getvalue(), encodes
+        scale_factor -= 0.1
+
+    buffer = BytesIO()
+    resized_img.save(buffer, format="JPEG", quality=30, optimize=True)
+    return buffer.getvalue(), encodes + 1
+
+
+def main():
+    corpus = build_corpus()
+    formats = available_formats(["JPEG", "WEBP", "AVIF"])
+    print(f"{'image':<12}{'limit':>7}{'method':>12}{'time(ms)':>10}{'encodes':>9}{'size(KB)':>10}  result")
+    for name, image in corpus.items():
+        for limit in LIMITS_MB:
+            max_bytes = int(limit * 1024 * 1024)
+
+            start = time.perf_counter()
+            data, encodes = reference_compress(image, limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            with Image.open(BytesIO(data)) as result:
+                detail = f"JPEG {result.width}x{result.height}"
+            print(
+                f"{name:<12}{limit:>6}M{'reference':>12}{elapsed:>10.0f}{encodes:>9}{len(data) // 1024:>10}  {detail}"
+            )
+
+            for candidates in (["JPEG"], formats):
+                start = time.perf_counter()
+                result = compress_image(image, max_bytes, candidates)
+                elapsed = (time.perf_counter() - start) * 1000
+                assert len(result.data) <= max_bytes
+                method = "adaptive" if candidates == ["JPEG"] else "adaptive+"
+                detail = f"{result.format} {result.width}x{result.height} q{result.quality}"
+                print(
+                    f"{name:<12}{limit:>6}M{method:>12}{elapsed:>10.0f}{result.encodes:>9}"
+                    f"{len(result.data) // 1024:>10}  {detail}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+图片尺寸/格式探测基准: lib.image.probe_image vs PIL Image.open
+
+生成一组 4K(3840x2160) 的 PNG/JPEG/WebP/GIF 图片, 分别统计每张图片的探测耗时.
+
+    uv run python scripts/bench_image_probe.py
+"""
+
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from lib.image import probe_image
+
+SIZE = (3840, 2160)
+ROUNDS = 200
+
+
+def build_corpus() -> dict[str, bytes]:
+    # 渐变 + 噪声, 避免纯色图片被压缩得过小
+    gradient = Image.linear_gradient("L").resize(SIZE)
+    noise = Image.effect_noise(SIZE, 64)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+    corpus = {}
+    for name, fmt, kwargs in [
+        ("png", "PNG", {}),
+        ("jpeg", "JPEG", {"quality": 90}),
+        ("jpeg-progressive", "JPEG", {"quality": 90, "progressive": True}),
+        ("webp", "WEBP", {"quality": 80}),
+        ("gif", "GIF", {}),
+    ]:
+        buffer = BytesIO()
+        image.save(buffer, fmt, **kwargs)
+        corpus[name] = buffer.getvalue()
+    return corpus
+
+
+def pil_probe(data: bytes) -> tuple[int, int, str]:
+    with Image.open(BytesIO(data)) as pil:
+        return *pil.size, Image.MIME.get(pil.format)
+
+
+def bench(fn, data: bytes) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(data)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+def main():
+    corpus = build_corpus()
+    print(f"{'format':<18}{'size':>10}{'PIL(us)':>12}{'probe(us)':>12}{'speedup':>10}")
+    for name, data in corpus.items():
+        assert tuple(probe_image(data)[:3]) == pil_probe(data), name
+        pil_us = bench(pil_probe, data)
+        probe_us = bench(probe_image, data)
+        print(f"{name:<18}{len(data) // 1024:>8}KB{pil_us:>12.1f}{probe_us:>12.2f}{pil_us / probe_us:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
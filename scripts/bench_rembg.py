@@ -0,0 +1,78 @@
+"""
+本地抠图基准(仅 CPU): 原有的 rembg_with_url 处理方式 vs BackgroundRemover 会话池
+
+- 原实现: 写临时文件再读回, rembg.remove 不传会话, 每次调用都新建会话(加载模型)
+- 单会话: 复用一个会话逐张处理
+- 会话池: remove_batch 在 pool_size 个会话/线程上并行处理
+
+    uv run python scripts/bench_rembg.py [图片数量] [pool_size]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+from rembg import remove
+
+from lib.config import RembgConfig
+from tools.images.remove_background import BackgroundRemover
+
+SIZE = (1024, 1024)
+
+
+def build_corpus(count: int) -> list[bytes]:
+    # 噪声背景上的一个色块, 接近商品图
+    corpus = []
+    for i in range(count):
+        image = Image.merge("RGB", [Image.effect_noise(SIZE, 32 + i % 16)] * 3)
+        ImageDraw.Draw(image).ellipse((256, 200, 768, 824), fill=(200, 40 + i * 7 % 200, 60))
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        corpus.append(buffer.getvalue())
+    return corpus
+
+
+def reference_remove(content: bytes) -> bytes:
+    """重构前的 rembg_with_url(不含下载与上传)"""
+    with tempfile.NamedTemporaryFile(mode="w+b", suffix=".jpeg", delete=False) as tmp:
+        tmp.write(content)
+        tmp.flush()
+        image_path = tmp.name
+    try:
+        with open(image_path, "rb") as i:
+            return remove(i.read(), force_return_bytes=True)
+    finally:
+        os.unlink(image_path)
+
+
+def bench(name: str, fn, count: int):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24}{elapsed:>10.2f}s{elapsed / count * 1000:>12.0f}ms{count / elapsed:>12.2f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    pool_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    corpus = build_corpus(count)
+    print(f"{count} 张 {SIZE[0]}x{SIZE[1]} JPEG, CPU 核数 {os.cpu_count()}, pool_size {pool_size}")
+    print(f"{'':<24}{'total':>11}{'per image':>12}{'images/s':>12}")
+
+    bench("reference", lambda: [reference_remove(content) for content in corpus], count)
+
+    single = BackgroundRemover(RembgConfig(pool_size=1))
+    single.warmup()
+    bench("single session", lambda: [single.remove(content) for content in corpus], count)
+
+    pool = BackgroundRemover(RembgConfig(pool_size=pool_size))
+    pool.warmup()
+    bench(f"pool x{pool_size} batch", lambda: pool.remove_batch(corpus), count)
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Socket.IO 推送基准: 每个 token 的 emit 耗时 vs 空闲连接数
+
+对比旧实现(遍历所有连接逐个 emit)与按会话房间单次 emit, 网络发送替换为空操作, 只统计服务端开销.
+
+    uv run python scripts/bench_socketio_rooms.py
+"""
+
+import time
+import asyncio
+
+from api.states import sio, session_room
+from api.services.websocket import broadcast_session_update
+
+TOKENS = 200
+IDLE_CONNECTIONS = [10, 100, 1000, 5000]
+
+sent_packets = 0
+
+
+async def _send_eio_packet(eio_sid, eio_pkt):
+    global sent_packets
+    sent_packets += 1
+
+
+async def legacy_broadcast(session_id: str, canvas_id: str | None, event: dict, socket_ids: list[str]):
+    for socket_id in socket_ids:
+        await sio.emit("session_update", {"canvas_id": canvas_id, "session_id": session_id, **event}, room=socket_id)
+
+
+async def main():
+    global sent_packets
+    sio._send_eio_packet = _send_eio_packet
+
+    session_id = "bench-session"
+    subscriber = await sio.manager.connect("eio-subscriber", "/")
+    await sio.enter_room(subscriber, session_room(session_id))
+
+    print(f"{'idle':>6} | {'legacy us/token':>16} | {'room us/token':>14} | {'packets/token':>13}")
+    connected = 0
+    socket_ids = [subscriber]
+    for idle in IDLE_CONNECTIONS:
+        while connected < idle:
+            socket_ids.append(await sio.manager.connect(f"eio-idle-{connected}", "/"))
+            connected += 1
+
+        start = time.perf_counter()
+        for i in range(TOKENS):
+            await legacy_broadcast(session_id, None, {"type": "delta", "text": f"t{i}"}, socket_ids)
+        legacy = (time.perf_counter() - start) / TOKENS * 1e6
+
+        sent_packets = 0
+        start = time.perf_counter()
+        for i in range(TOKENS):
+            await broadcast_session_update(session_id, None, {"type": "delta", "text": f"t{i}"})
+        rooms = (time.perf_counter() - start) / TOKENS * 1e6
+
+        print(f"{idle:>6} | {legacy:>16.1f} | {rooms:>14.1f} | {sent_packets / TOKENS:>13.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
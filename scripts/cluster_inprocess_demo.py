@@ -0,0 +1,80 @@
+"""
+两个 app 实例通过进程内后端协作的演示/自检
+
+节点 A 发起的 emit 能送达连接在节点 B 上的客户端, 节点 A 收到的取消请求能取消节点 B 上运行的任务.
+换成 RedisClusterBackend 即为多 worker 部署时的行为.
+
+    uv run python scripts/cluster_inprocess_demo.py
+"""
+
+import asyncio
+
+import socketio
+
+from api.states import session_room
+from api.core.cluster import InProcessBroker, InProcessClusterBackend
+
+
+def create_node(broker: InProcessBroker, node_id: str, received: list):
+    backend = InProcessClusterBackend(broker, node_id=node_id)
+    sio = socketio.AsyncServer(async_mode="asgi", client_manager=backend.client_manager())
+
+    async def _send_eio_packet(eio_sid, eio_pkt):
+        received.append((node_id, eio_sid, eio_pkt.data))
+
+    sio._send_eio_packet = _send_eio_packet
+    # 正常运行时在第一个连接建立时初始化, 这里手动启动 pubsub 监听
+    sio.manager_initialized = True
+    sio.manager.initialize()
+    return backend, sio
+
+
+async def main():
+    broker = InProcessBroker()
+    received = []
+    node_a, sio_a = create_node(broker, "node-a", received)
+    node_b, sio_b = create_node(broker, "node-b", received)
+
+    # 客户端连接在 B 上并订阅会话
+    session_id = "demo-session"
+    sid = await sio_b.manager.connect("eio-b-1", "/")
+    await sio_b.enter_room(sid, session_room(session_id))
+    await node_b.add_connection(sid, {"user": "demo"})
+
+    # 推送从 A 发出
+    await sio_a.emit(
+        "session_update", {"session_id": session_id, "type": "delta", "text": "hi"}, to=session_room(session_id)
+    )
+    await asyncio.sleep(0.05)
+    assert [r[:2] for r in received] == [("node-b", "eio-b-1")], received
+    print("跨节点推送:", received[0][2])
+
+    connections = await node_a.list_connections()
+    assert connections[sid]["node"] == "node-b"
+    print("集群连接:", connections)
+
+    # 任务运行在 B 上, 取消请求落在 A 上
+    tasks = {}
+
+    async def cancel_on(session_id: str):
+        tasks[session_id].cancel()
+
+    await node_a.start(cancel_on)
+    await node_b.start(cancel_on)
+    tasks[session_id] = asyncio.create_task(asyncio.sleep(60))
+    await node_b.register_stream(session_id)
+
+    assert await node_a.find_stream(session_id) == "node-b"
+    await node_a.publish_cancel(session_id)
+    try:
+        await asyncio.wait_for(tasks[session_id], 1)
+    except asyncio.CancelledError:
+        print("跨节点取消: ok")
+
+    await node_a.stop()
+    await node_b.stop()
+    assert await node_a.list_connections() == {}
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
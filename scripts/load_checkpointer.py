@@ -0,0 +1,96 @@
+"""
+checkpointer 压测: 每轮新建连接(旧实现) vs 共享连接池
+
+模拟 N 个并发会话, 每轮对话读取一次最新 checkpoint 并写入若干步 checkpoint,
+同时采样 pg_stat_activity 中本脚本持有的连接数, 输出每轮耗时 p50/p99 与峰值连接数.
+
+    uv run python scripts/load_checkpointer.py [并发数] [每个会话的轮数]
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import statistics
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+from lib import settings
+from api.core.checkpointer import postgres_conninfo
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+TURNS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+STEPS_PER_TURN = 4  # 一轮对话中 agent/tools 节点写入的 checkpoint 数
+APP_NAME = "checkpointer-load-test"
+conninfo = f"{postgres_conninfo()}?application_name={APP_NAME}"
+
+
+async def run_turn(checkpointer: AsyncPostgresSaver, thread_id: str):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    await checkpointer.aget_tuple(config)
+    for step in range(STEPS_PER_TURN):
+        checkpoint = empty_checkpoint()
+        config = await checkpointer.aput(config, checkpoint, {"source": "loop", "step": step}, {})
+
+
+async def per_turn_connection(thread_id: str):
+    async with AsyncPostgresSaver.from_conn_string(conninfo) as checkpointer:
+        await run_turn(checkpointer, thread_id)
+
+
+async def sample_connections(stop: asyncio.Event, samples: list[int]):
+    async with await psycopg.AsyncConnection.connect(postgres_conninfo(), autocommit=True) as conn:
+        while not stop.is_set():
+            cur = await conn.execute("select count(*) from pg_stat_activity where application_name = %s", (APP_NAME,))
+            samples.append((await cur.fetchone())[0])
+            await asyncio.sleep(0.05)
+
+
+async def run(name: str, turn):
+    latencies: list[float] = []
+    connections: list[int] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_connections(stop, connections))
+
+    async def session():
+        thread_id = f"load-{uuid.uuid4().hex}"
+        for _ in range(TURNS):
+            start = time.perf_counter()
+            await turn(thread_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(
+        f"{name:>9} | turns/s {len(latencies) / elapsed:8.1f} | p50 {statistics.median(latencies):8.1f} ms "
+        f"| p99 {p99:8.1f} ms | peak connections {max(connections, default=0):4d}"
+    )
+
+
+async def main():
+    print(f"并发会话 {CONCURRENCY}, 每会话 {TURNS} 轮, 每轮写入 {STEPS_PER_TURN} 个 checkpoint")
+    await run("per-turn", per_turn_connection)
+
+    async with AsyncConnectionPool(
+        conninfo=conninfo,
+        min_size=settings.postgres.checkpointer_pool_min,
+        max_size=settings.postgres.checkpointer_pool_max,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+    ) as pool:
+        checkpointer = AsyncPostgresSaver(pool)
+        await checkpointer.setup()
+        await run("pooled", lambda thread_id: run_turn(checkpointer, thread_id))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,7 +6,8 @@ from api.core.db import SessionLocal
 from api.models import Prompt
 from sqlalchemy.dialects.postgresql import insert
 
-from lib import settings, upload_image
+from lib import settings
+from lib.transfer import transfer_url_sync
 
 
 def load_prompts_from_file() -> list[dict]:
@@ -22,17 +23,10 @@ def load_prompts_from_file() -> list[dict]:
         image: str | None = item.get("images", [])[0] if item.get("images") else None
         uploaded_image = None
         if image:
-            filename = id + "." + image.split(".")[-1]
             try:
+                # 流式转存, 不在内存中保留完整图片
                 with httpx.Client(proxy=settings.proxy_url, timeout=60) as client:
-                    image_bytes = client.get(image).content
-                    uploaded_image = upload_image(
-                        filename,
-                        image_bytes,
-                        prefix="agent/image_prompt_url",
-                        rename=False,
-                        domain=None,
-                    )
+                    uploaded_image = transfer_url_sync(image, prefix="agent/image_prompt_url", client=client).url
             except:
                 print(f"Failed to upload image from URL: {image}")
                 uploaded_image = None
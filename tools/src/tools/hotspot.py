@@ -1,10 +1,25 @@
-import asyncio
+"""
+TopHub 热点数据
+
+HotspotService: 共享 httpx.AsyncClient 与全局并发上限, 进程内 TTL 缓存
+(过期后在 stale_seconds 内先返回旧数据并在后台刷新, 同一个键只有一个请求在途),
+可选的后台任务定期刷新各平台热榜, 工具调用直接命中缓存. 配置见 settings.hotspot.
+"""
+
 import os
+import time
+import asyncio
 from enum import Enum
+from typing import Any, Callable, Iterable, AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
 import httpx
 from dotenv import find_dotenv, load_dotenv
 
+from lib import metrics, settings
+from lib.config import HotspotConfig
+
 
 class Industry(Enum):
     """行业"""
@@ -81,114 +96,234 @@ system_prompt = """
 """
 base_tophub_url = "https://api.tophubdata.com"
 tophub_node_url = f"{base_tophub_url}/nodes"
-tophub_access_key = os.getenv("TOPHUB_ACCESS_KEY")
+tophub_search_url = f"{base_tophub_url}/search"
+calendar_api_url = f"{base_tophub_url}/calendar/events"
 
 load_dotenv(find_dotenv())
 
-
-def fetch_hotspot(self, tool_parameters: dict) -> str:
+# 品牌相关热点的搜索关键词
+brand_tags = ["AIGC", "人工智能", "科技", "互联网", "设计", "AI", "品牌营销"]
+
+# 进程内缓存的最大条目数(榜单/搜索词/日历)
+MAX_ENTRIES = 512
+
+# HotspotService.scoped() 期间使用的客户端与信号量
+_scoped_resources: ContextVar[tuple[httpx.AsyncClient, asyncio.Semaphore] | None] = ContextVar(
+    "hotspot_scoped_resources", default=None
+)
+
+
+def board_items(data: dict) -> dict[str, list[dict]]:
+    """榜单/搜索结果 -> {榜单名: [{rank, title, temprature}]}"""
+    data = data.get("data") or {}
+    items = [
+        dict(
+            rank=item.get("rank", ""),
+            title=item.get("title", ""),
+            # description=item.get("description", ""),
+            temprature=item.get("extra", ""),
+        )
+        for item in data.get("items") or []
+    ]
+    return {data.get("name", ""): items}
+
+
+class HotspotService:
+    def __init__(self, config: HotspotConfig):
+        self.config = config
+        # key -> (获取时间, 值)
+        self._cache: dict[str, tuple[float, Any]] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._refresher: asyncio.Task | None = None
+
+    def _resources(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        if (scoped := _scoped_resources.get()) is not None:
+            return scoped
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 共享客户端属于长期运行的事件循环(API 进程), 临时事件循环应通过 scoped() 使用自己的客户端
+            self._loop = loop
+            self._client = httpx.AsyncClient(timeout=self.config.timeout)
+            self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        return self._client, self._semaphore
+
+    @asynccontextmanager
+    async def scoped(self) -> AsyncIterator[None]:
+        """在临时事件循环(如 asyncio.run)中使用, 期间的请求使用独立的客户端, 退出时关闭"""
+        async with httpx.AsyncClient(timeout=self.config.timeout) as client:
+            token = _scoped_resources.set((client, asyncio.Semaphore(self.config.concurrency)))
+            try:
+                yield
+            finally:
+                _scoped_resources.reset(token)
+
+    async def _request(self, url: str, params: dict | None = None) -> dict:
+        client, semaphore = self._resources()
+        async with semaphore:
+            started = time.perf_counter()
+            # 每次读取, 兼容在导入后才加载的 .env
+            resp = await client.get(url, params=params, headers={"Authorization": os.getenv("TOPHUB_ACCESS_KEY", "")})
+            metrics.inc("hotspot_fetch_seconds_total", time.perf_counter() - started)
+            metrics.inc("hotspot_fetches_total", status=resp.status_code)
+            resp.raise_for_status()
+            return resp.json()
+
+    def _refresh(self, key: str, load: Callable[[], Any]) -> asyncio.Task:
+        """同一个键只启动一个刷新任务"""
+        task = self._inflight.get(key)
+        # 其他事件循环中的任务不能在当前事件循环中等待
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+
+        async def refresh():
+            value = await load()
+            self._cache[key] = (time.monotonic(), value)
+            if len(self._cache) > MAX_ENTRIES:
+                del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+            return value
+
+        def done(task: asyncio.Task):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Error refreshing hotspot {key}: {task.exception()}")
+
+        task = asyncio.create_task(refresh())
+        task.add_done_callback(done)
+        self._inflight[key] = task
+        return task
+
+    async def get(self, key: str, load: Callable[[], Any]) -> Any:
+        entry = self._cache.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.config.ttl_seconds:
+                metrics.inc("hotspot_cache_total", result="fresh")
+                return entry[1]
+            if age < self.config.ttl_seconds + self.config.stale_seconds:
+                metrics.inc("hotspot_cache_total", result="stale")
+                self._refresh(key, load)
+                return entry[1]
+        metrics.inc("hotspot_cache_total", result="miss")
+        try:
+            return await asyncio.shield(self._refresh(key, load))
+        except Exception:
+            # 获取失败时退回更旧的数据
+            if entry is not None:
+                return entry[1]
+            raise
+
+    def _loader(self, url: str, params: dict | None = None, transform: Callable[[dict], Any] = None):
+        async def load():
+            data = await self._request(url, params)
+            return transform(data) if transform else data
+
+        return load
+
+    async def fetch(self, key: str, url: str, params: dict | None = None, transform: Callable[[dict], Any] = None):
+        return await self.get(key, self._loader(url, params, transform))
+
+    async def board(self, platform: str) -> dict[str, list[dict]]:
+        node = hashid_map[platform]
+        return await self.fetch(f"board:{node}", f"{tophub_node_url}/{node}", transform=board_items)
+
+    async def search(self, keyword: str) -> dict[str, list[dict]]:
+        return await self.fetch(f"search:{keyword}", tophub_search_url, {"q": keyword}, transform=board_items)
+
+    @staticmethod
+    async def _merge(calls: Iterable) -> dict[str, list[dict]]:
+        context = {}
+        for result in await asyncio.gather(*calls, return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"Error fetching data: {result}")
+            else:
+                context.update(result)
+        return context
+
+    async def boards(self, platforms: Iterable[str] | None = None) -> dict[str, list[dict]]:
+        """主要平台的热榜, 单个平台失败时跳过"""
+        platforms = platforms or [source.name for source in SourceType]
+        return await self._merge(self.board(platform) for platform in platforms)
+
+    async def searches(self, keywords: Iterable[str]) -> dict[str, list[dict]]:
+        return await self._merge(self.search(keyword) for keyword in keywords)
+
+    async def calendar(self, mode: str = "day", categories: str = "all") -> list[dict]:
+        """热点日历中的事件"""
+
+        def events(data: dict) -> list[dict]:
+            data = data.get("data") or []
+            return data.get("items") or [] if isinstance(data, dict) else data
+
+        return await self.fetch(
+            f"calendar:{mode}:{categories}",
+            calendar_api_url,
+            {"mode": mode, "categories": categories},
+            transform=events,
+        )
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            for source in SourceType:
+                node = hashid_map[source.name]
+                self._refresh(f"board:{node}", self._loader(f"{tophub_node_url}/{node}", transform=board_items))
+            await asyncio.sleep(interval)
+
+    def start_refresher(self, interval: float | None = None):
+        """定期刷新各平台热榜, 间隔应小于 ttl_seconds"""
+        interval = interval or self.config.refresh_interval
+        if self._refresher is None and interval:
+            self._refresher = asyncio.create_task(self._refresh_loop(interval))
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = self._loop = None
+
+
+hotspot_service = HotspotService(settings.hotspot)
+
+
+async def fetch_hotspot_async(tool_parameters: dict | None = None, calendar: bool = False) -> tuple[str, dict]:
     # prompt = tool_parameters.get("prompt", "")
     # industry = tool_parameters.get("industry", "")  # 行业
     # category = tool_parameters.get("category", "")  # 品类
     # platform = tool_parameters.get("platform", "小红书")  # 平台
 
-    # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    # base_prompt = f"""帮在{platform}的热点营销策划, 行业: {industry}, 品类: {category}。请给出详细的营销方案, 包括目标设定、受众分析、策略选择、创意设计、执行计划和效果评估。"""
-    # 按平台获取热点
-
-    # TODO: 通过缓存来减少API访
-
-    # 获取主要平台的热搜
-    nodes = [hashid_map[i.name] for i in SourceType]
-    hotspot_context = {}
-
-    async def fetch_hotspot(client: httpx.AsyncClient, node: str):
-        async with asyncio.Semaphore(7):
-            resp = await client.get(
-                f"{tophub_node_url}/{node}",
-                headers={"Authorization": tophub_access_key},
-            )
-            data = resp.json()
-            name = data.get("data", {}).get("name", "")
-            items = [
-                dict(
-                    rank=item.get("rank", ""),
-                    title=item.get("title", ""),
-                    # description=item.get("description", ""),
-                    temprature=item.get("extra", ""),
-                )
-                for item in data.get("data", {}).get("items", [])
-            ]
-            return {name: items}
-
-    async def start():
-        async with httpx.AsyncClient(timeout=180) as client:
-            tasks = [fetch_hotspot(client, node) for node in nodes]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for result in results:
-                if isinstance(result, Exception):
-                    print(f"Error fetching data: {result}")
-                else:
-                    hotspot_context.update(result)
-            return hotspot_context
-
-    asyncio.run(start())
-
-    # 搜索热点
-    brand_tags = ["AIGC", "人工智能", "科技", "互联网", "设计", "AI", "品牌营销"]
-
-    # Step 1. Instantiating your TavilyClient
-    # tavily_api_key = os.getenv("TAVILY_API_KEY")
-    # tavily_client = TavilyClient(api_key=tavily_api_key)
-    #
-    # brand_tags = ["AIGC", "人工智能", "科技", "互联网", "设计", "AI", "品牌营销"]
-    #
-    # # Step 2. Executing a simple search query
-    # response = tavily_client.search(
-    #     "帮我获取品牌相关的热点, 关键词: " + ",".join(brand_tags),
-    #     country="china",
-    #     time_range="month",
-    # )
-    # brand_hotspot = response
-
-    # 热点搜索
-    hot_search_context = {}
-    hot_api_url = "https://api.tophubdata.com/search"
-
-    async def fetch_hotspot_search(client: httpx.AsyncClient, node: str):
-        async with asyncio.Semaphore(7):
-            resp = await client.get(
-                hot_api_url,
-                params={"q": node},
-                headers={"Authorization": tophub_access_key},
-            )
-            data = resp.json()
-            name = data.get("data", {}).get("name", "")
-            items = [
-                dict(
-                    rank=item.get("rank", ""),
-                    title=item.get("title", ""),
-                    # description=item.get("description", ""),
-                    temprature=item.get("extra", ""),
-                )
-                for item in data.get("data", {}).get("items", [])
-            ]
-            return {name: items}
-
-    async def start2():
-        async with httpx.AsyncClient(timeout=180) as client:
-            tasks = [fetch_hotspot_search(client, node) for node in brand_tags]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for result in results:
-                if isinstance(result, Exception):
-                    print(f"Error fetching data: {result}")
-                else:
-                    hot_search_context.update(result)
-            return hot_search_context
-
-    asyncio.run(start2())
-
-    result = f"当前主要平台的热点信息:\n{hotspot_context}\n\n品牌相关的热点信息:\n{hot_search_context}"
+    # 主要平台的热搜与品牌相关的热点搜索, calendar 为 True 时附带当天的热点日历
+    hotspot_context, hot_search_context, calendar_events = await asyncio.gather(
+        hotspot_service.boards(),
+        hotspot_service.searches(brand_tags),
+        hotspot_service.calendar() if calendar else asyncio.sleep(0, []),
+        return_exceptions=True,
+    )
     result = f"当前主要平台的热点信息:\n{hotspot_context}\n\n品牌相关的热点信息:\n{hot_search_context}"
-
+    if calendar:
+        if isinstance(calendar_events, Exception):
+            print(f"Error fetching calendar events: {calendar_events}")
+            calendar_events = []
+        result += f"\n\n热点日历:\n{calendar_events}"
     return result, hotspot_context
+
+
+def fetch_hotspot(self, tool_parameters: dict, calendar: bool = False) -> tuple[str, dict]:
+    """同步入口, 只能在没有运行中事件循环的线程中调用, 在事件循环中请使用 fetch_hotspot_async"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("fetch_hotspot 不能在运行中的事件循环里调用, 请使用 await fetch_hotspot_async(...)")
+
+    async def run():
+        # 临时事件循环使用独立的客户端, 结束时关闭
+        async with hotspot_service.scoped():
+            return await fetch_hotspot_async(tool_parameters, calendar)
+
+    return asyncio.run(run())
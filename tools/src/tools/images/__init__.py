@@ -1,7 +1,13 @@
-from .qwen import image_edit_with_qwen, image_generate_with_qwen
-from .gemini import image_create_with_gemini
-from .seedream import image_create_with_seedream
-from .seedream4_5 import image_create_with_seedream4_5
+from .qwen import (
+    image_edit_with_qwen,
+    image_generate_with_qwen,
+    image_edit_with_qwen_async,
+    image_generate_with_qwen_async,
+)
+from .gemini import image_create_with_gemini, image_create_with_gemini_async
+from .seedream import image_create_with_seedream, image_create_with_seedream_async
+from .seedream4_5 import image_create_with_seedream4_5, image_create_with_seedream4_5_async
+from .layer_splitter import image_split_layers_async
 
 __all__ = [
     "image_create_with_seedream",
@@ -9,4 +15,10 @@ __all__ = [
     "image_create_with_gemini",
     "image_edit_with_qwen",
     "image_generate_with_qwen",
+    "image_create_with_seedream_async",
+    "image_create_with_seedream4_5_async",
+    "image_create_with_gemini_async",
+    "image_edit_with_qwen_async",
+    "image_generate_with_qwen_async",
+    "image_split_layers_async",
 ]
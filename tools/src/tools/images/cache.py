@@ -0,0 +1,105 @@
+"""
+生图工具的结果缓存(见 lib.tool_cache 与 settings.tool_cache)
+
+键由工具名、模型、去除首尾空白的提示词、按顺序排列的输入图片内容 sha256 与其余参数(尺寸/比例等)组成.
+输入图片按内容计算, 同一张图片换了地址(本地文件名/转存后的 url)仍能命中. 只缓存成功且有图片的结果,
+调用时传入 force_regenerate=True 跳过缓存重新生成, 新结果覆盖旧的缓存.
+"""
+
+import re
+import asyncio
+import inspect
+import functools
+from typing import Any, Callable, Awaitable
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from lib import settings
+from lib.dedup import sha256_hex
+from tools.types import ImageToolResponse
+from lib.tool_cache import cache_key, tool_cache
+from tools.images.common import download_image, run_in_executor, split_image_urls
+
+# 去重存储的文件以内容 sha256 命名, 这类地址无需下载
+SHA256_FILENAME = re.compile(r"^([0-9a-f]{64})\.\w+$")
+
+# 其他网络图片 url -> 内容 sha256
+_url_hashes: OrderedDict[str, str] = OrderedDict()
+URL_HASHES_SIZE = 4096
+
+ImageTool = Callable[..., Awaitable[ImageToolResponse]]
+
+
+async def image_content_hash(item: str) -> str | None:
+    """输入图片的内容 sha256, 工具会忽略的输入(data url/绝对路径)返回 None"""
+    if item.startswith("data:") or item.startswith("/"):
+        return None
+    if item.startswith("http"):
+        if match := SHA256_FILENAME.match(urlsplit(item).path.rsplit("/", 1)[-1]):
+            return match.group(1)
+        if digest := _url_hashes.get(item):
+            _url_hashes.move_to_end(item)
+            return digest
+        digest = await asyncio.to_thread(sha256_hex, await download_image(item))
+        _url_hashes[item] = digest
+        while len(_url_hashes) > URL_HASHES_SIZE:
+            _url_hashes.popitem(last=False)
+        return digest
+    content = await run_in_executor((settings.data_dir / "files" / item).read_bytes)
+    return await asyncio.to_thread(sha256_hex, content)
+
+
+def _normalize(name: str, value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        return value.upper() if name == "image_size" else value
+    return value
+
+
+def cached_image_tool(name: str, model: str) -> Callable[[ImageTool], ImageTool]:
+    """为异步生图函数增加结果缓存与 force_regenerate 参数, 未开启 settings.tool_cache 时直接调用"""
+
+    def decorator(fn: ImageTool) -> ImageTool:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, force_regenerate: bool = False, **kwargs) -> ImageToolResponse:
+            if not settings.tool_cache.enabled:
+                return await fn(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {key: _normalize(key, value) for key, value in bound.arguments.items()}
+            prompt = params.pop("prompt", None) or ""
+            try:
+                images = await asyncio.gather(
+                    *map(image_content_hash, split_image_urls(params.pop("image_urls", None)))
+                )
+            except Exception as e:
+                # 输入图片无法读取时不使用缓存, 由工具自身处理
+                print(f"Error hashing input images of {name}: {e}")
+                return await fn(*args, **kwargs)
+            key = cache_key(
+                name, model=model, prompt=prompt, images=[image for image in images if image], params=params
+            )
+
+            responses: list[ImageToolResponse] = []
+
+            async def call() -> dict | None:
+                response = await fn(*args, **kwargs)
+                responses.append(response)
+                if response.success and response.images:
+                    return response.model_dump(mode="json")
+                return None
+
+            value = await tool_cache.get_or_call(name, key, call, force=force_regenerate)
+            if responses:
+                return responses[0]
+            if value is None:
+                # 等待的同键调用失败了, 自己再执行一次
+                return await fn(*args, **kwargs)
+            return ImageToolResponse.model_validate(value)
+
+        return wrapper
+
+    return decorator
@@ -1 +1,345 @@
+"""
+图像工具公共部分
 
+- 进程内共享的 httpx.AsyncClient, 复用连接
+- 线程池, 用于 PIL 解码/SDK 调用等阻塞或 CPU 密集的操作, 避免阻塞事件循环(上传使用 lib.image 的上传线程池)
+- 并发流式转存生成结果, 按内容去重
+- 按服务商调度请求: 并发上限、令牌桶限速、临时错误抖动退避重试、熔断快速失败(见 settings.image_providers)
+"""
+
+import time
+import random
+import asyncio
+import functools
+from typing import Any, TypeVar, Callable, Awaitable
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import uuid_utils as uuid
+
+from lib import metrics, settings
+from lib.dedup import ImageRecord, image_index
+from lib.config import ProviderLimitConfig
+from tools.types import ImageInfo, ImageToolResponse
+from lib.transfer import transfer_urls, transfer_url_sync
+
+T = TypeVar("T")
+
+executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="image-tools")
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """共享的异步 HTTP 客户端, 关闭后再次获取会重新创建"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(360, connect=10),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_async_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def run_in_executor(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在图像工具线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+def split_image_urls(image_urls: list[str] | str | None) -> list[str]:
+    """工具参数中的图片, 支持逗号分隔的字符串或列表"""
+    if isinstance(image_urls, str):
+        return [i.strip() for i in image_urls.replace("，", ",").split(",") if i.strip()]
+    if image_urls is None:
+        return []
+    return list(image_urls)
+
+
+async def download_image(url: str, timeout: float = 180) -> bytes:
+    response = await get_async_client().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+async def resolve_remote_urls(image_list: list[str]) -> list[str]:
+    """将本地文件名上传为网络地址, 网络地址原样保留, 其他格式忽略"""
+
+    async def resolve(item: str) -> str | None:
+        # 处理本地文件
+        if item.startswith("data:") and "base64;" in item:
+            return None
+        elif item.startswith("http"):
+            return item
+        # 绝对路径
+        elif item.startswith("/"):
+            return None
+        local_file_path = settings.data_dir / "files" / item
+        content = await run_in_executor(local_file_path.read_bytes)
+        record = await image_index.get_or_upload(content, prefix="files")
+        return record.url
+
+    urls = await asyncio.gather(*(resolve(item) for item in image_list))
+    return [url for url in urls if url]
+
+
+async def store_image(content: bytes, prefix: str) -> ImageInfo:
+    """识别图片格式与尺寸并转存到 OSS, 相同内容只上传一次"""
+    return image_info(await image_index.get_or_upload(content, prefix=prefix))
+
+
+def image_info(record: ImageRecord) -> ImageInfo:
+    return ImageInfo(
+        url=record.url,
+        width=record.width,
+        height=record.height,
+        id=str(uuid.uuid7()),
+        filename=record.filename,
+        mime_type=record.mime_type,  # noqa
+        content=record.url,
+        sha256=record.sha256,
+    )
+
+
+async def store_images(contents: list[bytes], prefix: str) -> list[ImageInfo]:
+    """并发转存多张图片, 保持原顺序"""
+    return list(await asyncio.gather(*(store_image(content, prefix) for content in contents)))
+
+
+async def store_images_from_urls(urls: list[str], prefix: str) -> list[ImageInfo]:
+    """并发流式转存多张图片(生成结果的临时地址), 不在内存中保留完整图片, 保持原顺序"""
+    records = await transfer_urls(urls, prefix=prefix, client=get_async_client())
+    return [image_info(record) for record in records]
+
+
+def store_images_from_urls_sync(urls: list[str], prefix: str) -> list[ImageInfo]:
+    """同步版本, 供同步工具逐个流式转存生成结果, 不在内存中保留完整图片"""
+    with httpx.Client(timeout=httpx.Timeout(180, connect=10), follow_redirects=True) as client:
+        return [image_info(transfer_url_sync(url, prefix=prefix, client=client)) for url in urls]
+
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """服务商返回的错误, status_code 属于 RETRYABLE_STATUS 时会重试并计入熔断"""
+
+    def __init__(self, provider: str, status_code: int, message: str = "", retry_after: float | None = None):
+        super().__init__(f"{provider} 请求失败, status_code: {status_code}, {message}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ProviderUnavailable(Exception):
+    """服务商熔断中, 请求未发出"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} 暂时不可用, 请 {retry_in:.0f} 秒后重试")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """超时/连接错误与 429/5xx 视为临时错误, SDK 异常按 status_code/code 属性判断"""
+    if isinstance(exc, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS
+
+
+def error_code(exc: BaseException) -> str:
+    """ImageToolResponse.error 中的错误类型"""
+    if isinstance(exc, ProviderUnavailable):
+        return "provider_unavailable"
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return "rate_limited"
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    return "provider_error" if is_retryable(exc) else "tool_error"
+
+
+def failure(content: str, exc: BaseException) -> ImageToolResponse:
+    return ImageToolResponse(content=content, success=False, error=error_code(exc))
+
+
+def raise_for_retryable(provider: str, status_code: int, message: str = "", headers: Any = None):
+    """临时错误抛出 ProviderError 交给调度重试, 其他状态码由调用方按原逻辑处理"""
+    if status_code in RETRYABLE_STATUS:
+        retry_after = (headers or {}).get("retry-after")
+        raise ProviderError(
+            provider,
+            status_code,
+            message,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开, 经过 recovery_seconds 放行一个探测请求, 成功则关闭, 失败则重新计时"""
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.recovery_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.probing and self.retry_in() == 0:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """探测请求被取消或遇到参数错误等不可重试的异常时既不算成功也不算失败, 放行下一个探测请求"""
+        self.probing = False
+
+
+class Provider:
+    """单个服务商的调度: 并发上限 + 令牌桶 + 重试 + 熔断"""
+
+    def __init__(self, name: str, limit: ProviderLimitConfig):
+        self.name = name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit.concurrency)
+        self.bucket = TokenBucket(limit.rate, limit.burst) if limit.rate else None
+        self.breaker = CircuitBreaker(limit.failure_threshold, limit.recovery_seconds)
+        self.waiting = 0
+        self.in_flight = 0
+
+    def _gauges(self):
+        metrics.set_gauge("image_provider_queue_depth", self.waiting, provider=self.name)
+        metrics.set_gauge("image_provider_in_flight", self.in_flight, provider=self.name)
+        metrics.set_gauge("image_provider_circuit_open", int(self.breaker.opened_at is not None), provider=self.name)
+
+    @asynccontextmanager
+    async def slot(self):
+        """等待并发名额与令牌"""
+        start = time.monotonic()
+        self.waiting += 1
+        self._gauges()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            metrics.inc("image_provider_wait_seconds_total", time.monotonic() - start, provider=self.name)
+            metrics.inc("image_provider_waits_total", provider=self.name)
+            self.in_flight += 1
+            self._gauges()
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            self.semaphore.release()
+            self._gauges()
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        if retry_after := getattr(exc, "retry_after", None):
+            return min(retry_after, self.limit.max_backoff)
+        return random.uniform(0, min(self.limit.max_backoff, self.limit.backoff * 2**attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        调度执行 fn, 临时错误(is_retryable)按抖动退避重试并计入熔断, 其他异常直接抛出
+        熔断打开时抛出 ProviderUnavailable
+        """
+        for attempt in range(self.limit.max_retries + 1):
+            if not self.breaker.allow():
+                metrics.inc("image_provider_requests_total", provider=self.name, result="rejected")
+                raise ProviderUnavailable(self.name, self.breaker.retry_in())
+            # 熔断打开时 allow() 只会放行探测请求
+            probe = self.breaker.opened_at is not None
+            try:
+                async with self.slot():
+                    result = await fn()
+            except Exception as exc:
+                if not is_retryable(exc):
+                    # 参数错误等不能说明服务是否恢复, 既不计入熔断也不重置失败计数, 只释放探测名额
+                    if probe:
+                        self.breaker.release_probe()
+                    metrics.inc("image_provider_requests_total", provider=self.name, result="error")
+                    raise
+                self.breaker.record_failure()
+                self._gauges()
+                if attempt >= self.limit.max_retries:
+                    metrics.inc("image_provider_requests_total", provider=self.name, result="failed")
+                    raise
+                metrics.inc("image_provider_requests_total", provider=self.name, result="retry")
+                await asyncio.sleep(self._backoff(attempt, exc))
+                continue
+            except BaseException:
+                # CancelledError 等: 不释放探测名额的话熔断会一直保持打开
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            metrics.inc("image_provider_requests_total", provider=self.name, result="success")
+            return result
+        raise AssertionError("unreachable")
+
+
+_providers: dict[str, Provider] = {}
+
+
+def get_provider(name: str) -> Provider:
+    """按名称获取服务商调度器(ark/gemini/dashscope), 进程内共享"""
+    if name not in _providers:
+        _providers[name] = Provider(name, settings.image_providers.get(name) or ProviderLimitConfig())
+    return _providers[name]
@@ -1,4 +1,4 @@
-import io
+import asyncio
 from io import BytesIO
 from typing import Literal
 
@@ -9,8 +9,17 @@ from google import genai
 from google.genai import types
 
 from lib import settings, upload_image
-from lib.image import parse_data_url_to_bytes
+from lib.image import probe_image, parse_data_url_to_bytes
 from tools.types import ImageInfo, ImageToolResponse
+from tools.images.cache import cached_image_tool
+from tools.images.common import (
+    failure,
+    get_provider,
+    store_images,
+    download_image,
+    run_in_executor,
+    split_image_urls,
+)
 
 api_key = settings.providers.gemini.api_key
 
@@ -88,8 +97,7 @@ def image_create_with_gemini(
             id = str(uuid.uuid7())
             filename = f"{id}.{extension}"
             image_url = upload_image(filename, image_bytes, prefix="creative/gemini", rename=False)
-            pil_image = Image.open(io.BytesIO(image_bytes))
-            width, height = pil_image.size
+            width, height, *_ = probe_image(image_bytes)
             images.append(
                 ImageInfo(
                     id=id,
@@ -110,6 +118,56 @@ def image_create_with_gemini(
         return ImageToolResponse(content=f"工具调用失败, 错误提示: {e}", success=False)
 
 
+async def _load_input_image(item: str) -> Image.Image | None:
+    """工具入参图片 -> PIL, 网络图片使用共享客户端下载, 解码放到线程池"""
+    if item.startswith("data:") and "base64;" in item:
+        content = parse_data_url_to_bytes(item)
+    elif item.startswith("http"):
+        content = await download_image(item)
+    # 绝对路径
+    elif item.startswith("/"):
+        return None
+    else:
+        content = await run_in_executor((settings.data_dir / "files" / item).read_bytes)
+    return await run_in_executor(lambda: Image.open(BytesIO(content)))
+
+
+@cached_image_tool("image_create_with_gemini", model="gemini-3-pro-image-preview")
+async def image_create_with_gemini_async(
+    prompt: str,
+    *,
+    image_urls: str | list | None = None,
+    aspect_ratio: Literal["1:1", "2:3", "3:2", "3:4", "4:3", "9:16", "16:9", "21:9"] | None = None,
+    image_size: Literal["1K", "2K", "4K"] | None = "2K",
+) -> ImageToolResponse:
+    """image_create_with_gemini 的异步版本: 并发下载参考图, 使用 genai 异步客户端, 并发转存生成结果"""
+    try:
+        image_pils = await asyncio.gather(*(_load_input_image(item) for item in split_image_urls(image_urls)))
+        response = await get_provider("gemini").call(
+            lambda: client.aio.models.generate_content(
+                model="gemini-3-pro-image-preview",
+                contents=[prompt, *[image for image in image_pils if image is not None]],
+                config=types.GenerateContentConfig(
+                    response_modalities=["Text", "Image"],
+                    image_config=types.ImageConfig(
+                        aspect_ratio=aspect_ratio,
+                        image_size=image_size,
+                    ),
+                ),
+            )
+        )
+        image_parts = [part for part in response.parts or [] if part.inline_data]
+        stored = await store_images([part.inline_data.data for part in image_parts], prefix="creative/gemini")
+        images = [image.model_dump(exclude_unset=True, exclude_none=True) for image in stored]
+        return ImageToolResponse(
+            content=f"图像生成完成, 共生成{len(images)}张图像, 图像信息:{images}",
+            success=True,
+            images=stored,
+        )
+    except Exception as e:
+        return failure(f"工具调用失败, 错误提示: {e}", e)
+
+
 def magic_generate_with_gemini(*, prompt: str | None = None, image_url: str) -> list[dict]:
     if not prompt:
         prompt = "理解图片上的视觉指令并生图"
@@ -137,8 +195,7 @@ def magic_generate_with_gemini(*, prompt: str | None = None, image_url: str) ->
             filename = f"{str(uuid.uuid4())}.{ext}"
             url = upload_image(filename, data=image_bytes, prefix="creative/gemini", rename=False)
 
-            image = Image.open(BytesIO(part.inline_data.data))
-            width, height = image.size
+            width, height, *_ = probe_image(part.inline_data.data)
             image_urls.append(
                 dict(
                     image_url=url,
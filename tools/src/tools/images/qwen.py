@@ -1,17 +1,23 @@
 import http
 import json
-from io import BytesIO
 from http import HTTPStatus
 from typing import Literal
 
-import httpx
-import requests
-import uuid_utils as uuid
-from PIL import Image
 from dashscope import ImageSynthesis, MultiModalConversation
 
 from lib import settings, upload_image
 from tools.types import ImageInfo, ImageToolResponse
+from tools.images.cache import cached_image_tool
+from tools.images.common import (
+    failure,
+    get_provider,
+    run_in_executor,
+    split_image_urls,
+    raise_for_retryable,
+    resolve_remote_urls,
+    store_images_from_urls,
+    store_images_from_urls_sync,
+)
 
 api_key = settings.providers.dashscope.api_key
 
@@ -73,27 +79,12 @@ def image_edit_with_qwen(
             contents: dict = resp.output.choices[0].message.get("content", [])
 
             temp_image_url = contents[0].get("image", "")
-            image_bytes = httpx.get(temp_image_url, timeout=60).content
-            pil = Image.open(BytesIO(image_bytes))
-            width, height = pil.size
-            img_format = pil.format.lower() or "png"
-            image_id = uuid.uuid7()
-            filename = f"{image_id}.{img_format.replace('jpeg', 'jpg')}"
-            image_url = upload_image(filename, data=image_bytes, prefix="creative/qwen")
-            image_info = dict(url=image_url, mime_type=f"image/{img_format}")
+            images = store_images_from_urls_sync([temp_image_url], prefix="creative/qwen")
+            image_info = dict(url=images[0].url, mime_type=images[0].mime_type)
             return ImageToolResponse(
                 content=json.dumps(image_info, ensure_ascii=False),
                 success=True,
-                images=[
-                    ImageInfo(
-                        url=image_url,
-                        filename=filename,
-                        id=str(image_id),
-                        mime_type=f"image/{img_format}",  # noqa
-                        width=width,
-                        height=height,
-                    )
-                ],
+                images=images,
             )
         else:
             return ImageToolResponse(
@@ -105,9 +96,8 @@ def image_edit_with_qwen(
         return ImageToolResponse(content=f"工具调用失败, 错误提示: {e}", success=False)
 
 
-def image_generate_with_qwen(
-    *, prompt: str, negative_prompt: str | None = None, aspect_ratio: Literal["1:1", "4:3", "3:4", "16:9"] = None
-) -> ImageToolResponse:
+def get_generate_size(aspect_ratio: str | None) -> tuple[int, int]:
+    """qwen-image 支持的分辨率"""
     aspect_ratio = aspect_ratio.replace("×", ":") if aspect_ratio else None
     if aspect_ratio == "1:1":
         width = 1328
@@ -127,6 +117,13 @@ def image_generate_with_qwen(
     else:
         width = 1328
         height = 1328
+    return width, height
+
+
+def image_generate_with_qwen(
+    *, prompt: str, negative_prompt: str | None = None, aspect_ratio: Literal["1:1", "4:3", "3:4", "16:9"] = None
+) -> ImageToolResponse:
+    width, height = get_generate_size(aspect_ratio)
 
     resp = ImageSynthesis.call(
         api_key=api_key,
@@ -139,26 +136,9 @@ def image_generate_with_qwen(
     urls = []
     images = []
     if resp.status_code == HTTPStatus.OK:
-        # 在当前目录下保存图片
-        for result in resp.output.results:
-            content = requests.get(result.url).content
-            pil = Image.open(BytesIO(content))
-            img_format = pil.format.lower()
-            width, height = pil.size
-            id = uuid.uuid7()
-            filename = f"{id}.{img_format.replace('jpeg', 'jpg')}"
-            url = upload_image(filename, content, prefix="creative/qwen", rename=False)
-            urls.append(url)
-            images.append(
-                ImageInfo(
-                    url=url,
-                    id=str(id),
-                    filename=filename,
-                    width=width,
-                    height=height,
-                    mime_type=f"image/{img_format}",  # noqa
-                )
-            )
+        # 流式转存生成结果
+        images = store_images_from_urls_sync([result.url for result in resp.output.results], prefix="creative/qwen")
+        urls = [image.url for image in images]
 
     else:
         return ImageToolResponse(
@@ -176,6 +156,89 @@ def image_generate_with_qwen(
     )
 
 
+@cached_image_tool("image_edit_with_qwen", model="qwen-image-edit")
+async def image_edit_with_qwen_async(
+    *,
+    prompt: str,
+    image_urls: list[str] | str | None = None,
+    negative_prompt: str | None = None,
+) -> ImageToolResponse:
+    """image_edit_with_qwen 的异步版本, dashscope SDK 为同步调用, 放到线程池执行"""
+    try:
+        image_list = await resolve_remote_urls(split_image_urls(image_urls))
+        content = [{"text": prompt}, *[{"image": image_url} for image_url in image_list]]
+
+        async def edit():
+            resp = await run_in_executor(
+                MultiModalConversation.call,
+                api_key=api_key,
+                model="qwen-image-edit",
+                messages=[{"role": "user", "content": content}],
+                result_format="message",
+                stream=False,
+                watermark=False,
+                negative_prompt=negative_prompt,
+            )
+            raise_for_retryable("dashscope", resp.status_code, f"code: {resp.code}, message: {resp.message}")
+            return resp
+
+        resp = await get_provider("dashscope").call(edit)
+        if resp.status_code != http.HTTPStatus.OK:
+            return ImageToolResponse(
+                content=f"同步调用失败, status_code: {resp.status_code}, code: {resp.code}, message: {resp.message}",
+                success=False,
+            )
+        contents: list[dict] = resp.output.choices[0].message.get("content", [])
+        urls = [item["image"] for item in contents if item.get("image")][:1]
+        images = await store_images_from_urls(urls, prefix="creative/qwen")
+        image_info = images[0]
+        return ImageToolResponse(
+            content=json.dumps(dict(url=image_info.url, mime_type=image_info.mime_type), ensure_ascii=False),
+            success=True,
+            images=images,
+        )
+    except Exception as e:
+        return failure(f"工具调用失败, 错误提示: {e}", e)
+
+
+@cached_image_tool("image_generate_with_qwen", model="qwen-image")
+async def image_generate_with_qwen_async(
+    *, prompt: str, negative_prompt: str | None = None, aspect_ratio: Literal["1:1", "4:3", "3:4", "16:9"] = None
+) -> ImageToolResponse:
+    """image_generate_with_qwen 的异步版本"""
+    width, height = get_generate_size(aspect_ratio)
+    try:
+
+        async def generate():
+            resp = await run_in_executor(
+                ImageSynthesis.call,
+                api_key=api_key,
+                model="qwen-image",
+                prompt=prompt,
+                n=1,
+                size=f"{width}*{height}",
+                negative_prompt=negative_prompt,
+            )
+            raise_for_retryable("dashscope", resp.status_code, f"code: {resp.code}, message: {resp.message}")
+            return resp
+
+        resp = await get_provider("dashscope").call(generate)
+        if resp.status_code != HTTPStatus.OK:
+            return ImageToolResponse(
+                content=f"同步调用失败, status_code: {resp.status_code}, code: {resp.code}, message: {resp.message}",
+                success=False,
+            )
+        images = await store_images_from_urls([result.url for result in resp.output.results], prefix="creative/qwen")
+        image_info = images[0]
+        return ImageToolResponse(
+            content=json.dumps(dict(url=image_info.url, mime_type=image_info.mime_type), ensure_ascii=False),
+            success=True,
+            images=images,
+        )
+    except Exception as e:
+        return failure(f"工具调用失败, 错误提示: {e}", e)
+
+
 if __name__ == "__main__":
     resp = image_generate_with_qwen(prompt="生成一碗牛肉面")
     print(resp)
@@ -1,28 +1,165 @@
-import tempfile
-from pathlib import Path
+"""
+本地抠图(rembg)
+
+模型会话在进程内只加载一次, 放在会话池中复用(见 settings.rembg); 每个会话同一时间只处理一张图片,
+推理在专用线程池中执行(onnxruntime 推理时释放 GIL, 线程即可并行), 图片全程在内存中传递.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import threading
+from typing import Iterator
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 import uuid_utils as uuid
-from rembg import remove
 
-from lib import upload_image
+from lib import metrics, settings, upload_image
+from lib.image import upload_image_async
+from lib.config import RembgConfig
+from tools.images.common import download_image
+
+
+class BackgroundRemover:
+    def __init__(self, config: RembgConfig):
+        self.model = config.model
+        self.pool_size = max(config.pool_size, 1)
+        self.threads = config.threads_per_session or max((os.cpu_count() or 1) // self.pool_size, 1)
+        self._sessions: queue.Queue = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _new_session(self):
+        import onnxruntime as ort
+        from rembg.sessions import sessions_class
+
+        session_class = next((cls for cls in sessions_class if cls.name() == self.model), None)
+        if session_class is None:
+            raise ValueError(f"未知的 rembg 模型: {self.model}")
+        options = ort.SessionOptions()
+        # 多个会话并行推理, 每个会话只用一部分核, 避免线程争抢
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        return session_class(self.model, options)
+
+    @contextmanager
+    def session(self) -> Iterator:
+        """借出一个会话, 池未满时按需创建, 否则等待其他调用归还"""
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    session = self._new_session()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def warmup(self):
+        """预先加载全部会话, 避免首批请求承担模型加载耗时"""
+        with self._lock:
+            missing = self.pool_size - self._created
+            self._created += missing
+        for built in range(missing):
+            try:
+                session = self._new_session()
+            except Exception:
+                # 未创建的名额归还, 否则 session() 会一直等待不存在的会话
+                with self._lock:
+                    self._created -= missing - built
+                raise
+            self._sessions.put(session)
+
+    def remove(self, content: bytes) -> bytes:
+        """抠图, 返回 PNG 字节(阻塞)"""
+        from rembg import remove
+
+        with self.session() as session:
+            started = time.perf_counter()
+            output = remove(content, session=session, force_return_bytes=True)
+        metrics.inc("rembg_seconds_total", time.perf_counter() - started)
+        metrics.inc("rembg_images_total")
+        return output
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="rembg")
+        return self._executor
+
+    def remove_batch(self, contents: list[bytes]) -> list[bytes]:
+        """在线程池中并行处理一批图片, 结果与输入顺序一致(阻塞)"""
+        return list(self.executor.map(self.remove, contents))
+
+    async def remove_async(self, content: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.remove, content)
+
+    async def remove_batch_async(self, contents: list[bytes]) -> list[bytes | Exception]:
+        """单张失败时对应位置返回异常, 不影响其他图片"""
+        return await asyncio.gather(*(self.remove_async(content) for content in contents), return_exceptions=True)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+background_remover = BackgroundRemover(settings.rembg)
 
 
 def rembg_with_url(image_url: str) -> str | None:
-    image_content = httpx.get(image_url, timeout=60).content
-    suffix = Path(httpx.URL(image_url).path).suffix
-    with tempfile.NamedTemporaryFile(mode="w+b", suffix=suffix, delete=False) as tmp:
-        tmp.write(image_content)
-        tmp.flush()
-        image_path = tmp.name
-
-    with open(image_path, "rb") as i:
-        input = i.read()
-        output = remove(input, force_return_bytes=True)
-        filename = str(uuid.uuid7())
-        url = upload_image(f"{filename}.png", output, prefix="tmp", rename=False, domain=None)
-
-        return url
+    content = httpx.get(image_url, timeout=60).raise_for_status().content
+    output = background_remover.remove(content)
+    return upload_image(f"{uuid.uuid7()}.png", output, prefix="tmp", rename=False, domain=None)
+
+
+async def rembg_with_url_async(image_url: str) -> str | None:
+    """rembg_with_url 的异步版本: 共享客户端下载, 抠图在会话池的线程池中执行"""
+    content = await download_image(image_url, timeout=60)
+    output = await background_remover.remove_async(content)
+    return await upload_image_async(f"{uuid.uuid7()}.png", output, prefix="tmp")
+
+
+async def rembg_batch_with_urls_async(image_urls: list[str]) -> list[str | None]:
+    """批量抠图, 返回与输入顺序一致的地址, 下载/抠图/上传失败的图片为 None"""
+
+    async def download(url: str) -> bytes | Exception:
+        try:
+            return await download_image(url, timeout=60)
+        except Exception as e:
+            return e
+
+    contents = await asyncio.gather(*map(download, image_urls))
+    outputs = await background_remover.remove_batch_async([c for c in contents if not isinstance(c, Exception)])
+    outputs = iter(outputs)
+    results = [c if isinstance(c, Exception) else next(outputs) for c in contents]
+
+    async def upload(url: str, output: bytes | Exception) -> str | None:
+        try:
+            if isinstance(output, Exception):
+                raise output
+            return await upload_image_async(f"{uuid.uuid7()}.png", output, prefix="tmp")
+        except Exception as e:
+            print(f"Error removing background of {url}: {e}")
+            return None
+
+    return await asyncio.gather(*map(upload, image_urls, results))
 
 
 if __name__ == "__main__":
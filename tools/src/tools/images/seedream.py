@@ -1,35 +1,29 @@
 import json
 import math
-from io import BytesIO
 from typing import Literal
 
 import httpx
-import uuid_utils as uuid
-from PIL import Image
 
 from lib import settings
 from lib.image import upload_image
-from tools.types import ImageInfo, ImageToolResponse
-
-
-def image_create_with_seedream(
-    *,
-    prompt: str,
-    image_urls: list[str] | str | None = None,
-    aspect_ratio: str | None = None,
-    image_size: Literal["1K", "2K", "4K"] | None = "2K",
-) -> ImageToolResponse:
-    """
-
-    Args:
-        image_urls: Search terms to look for
-        prompt: Required. The prompt for image generation. If you want to edit an image, please describe what you want to edit in the prompt.
-        aspect_ratio:
-        image_size:
-    """
-
-    # TODO: 考虑使用字符串逗号隔开, 还是list
-
+from tools.types import ImageToolResponse
+from tools.images.cache import cached_image_tool
+from tools.images.common import (
+    failure,
+    get_provider,
+    get_async_client,
+    split_image_urls,
+    raise_for_retryable,
+    resolve_remote_urls,
+    store_images_from_urls,
+    store_images_from_urls_sync,
+)
+
+base_url = "https://ark.cn-beijing.volces.com/api/v3/images/generations"
+
+
+def get_size(aspect_ratio: str | None, image_size: Literal["1K", "2K", "4K"] | None) -> str:
+    """根据宽高比与分辨率档位计算 size 参数"""
     # 基于image_size确定缩放倍率
     base = 2
     match image_size:
@@ -76,6 +70,55 @@ def image_create_with_seedream(
         size = f"{width}x{height}"
     else:
         size = "4K" if base == 4 else "2K" if base == 2 else "1K"
+    return size
+
+
+def _headers() -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {settings.providers.ark.api_key}",
+    }
+
+
+def build_payload(prompt: str, image_list: list[str], size: str, use_stream: bool = False) -> dict:
+    data = {
+        "model": "doubao-seedream-4-0-250828",
+        "prompt": prompt,
+        "image": image_list,
+        "sequential_image_generation": "auto",
+        "sequential_image_generation_options": {"max_images": 5},
+        "response_format": "url",
+        # "size": "2K",
+        "size": size,
+        "stream": use_stream,
+        # 优化prompt
+        "optimize_prompt_options": {"mode": "standard"},  # support standard and fast mode
+        # "seed": seed or -1,
+        "watermark": False,
+    }
+    if not image_list:
+        data.pop("image")
+    return data
+
+
+def image_create_with_seedream(
+    *,
+    prompt: str,
+    image_urls: list[str] | str | None = None,
+    aspect_ratio: str | None = None,
+    image_size: Literal["1K", "2K", "4K"] | None = "2K",
+) -> ImageToolResponse:
+    """
+
+    Args:
+        image_urls: Search terms to look for
+        prompt: Required. The prompt for image generation. If you want to edit an image, please describe what you want to edit in the prompt.
+        aspect_ratio:
+        image_size:
+    """
+
+    # TODO: 考虑使用字符串逗号隔开, 还是list
+    size = get_size(aspect_ratio, image_size)
     # seed = random.randrange(-1, 2**31 -1)
     if isinstance(image_urls, str):
         image_list = [i.strip() for i in image_urls.split(",") if i.strip()]
@@ -104,30 +147,9 @@ def image_create_with_seedream(
 
     image_list = new_urls
 
-    base_url = "https://ark.cn-beijing.volces.com/api/v3/images/generations"
-    api_key = settings.providers.ark.api_key
     use_stream = False
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    data = {
-        "model": "doubao-seedream-4-0-250828",
-        "prompt": prompt,
-        "image": image_list,
-        "sequential_image_generation": "auto",
-        "sequential_image_generation_options": {"max_images": 5},
-        "response_format": "url",
-        # "size": "2K",
-        "size": size,
-        "stream": use_stream,
-        # 优化prompt
-        "optimize_prompt_options": {"mode": "standard"},  # support standard and fast mode
-        # "seed": seed or -1,
-        "watermark": False,
-    }
-    if not image_list:
-        data.pop("image")
+    headers = _headers()
+    data = build_payload(prompt, image_list, size, use_stream=use_stream)
 
     try:
         if use_stream:
@@ -144,30 +166,9 @@ def image_create_with_seedream(
                 result = response.json()
                 images: list[dict] = result.get("data", [])
 
-                uploaded_urls = []
-                for index, image in enumerate(images):
-                    response = httpx.get(image.get("url"), timeout=180)
-
-                    content = response.content
-                    pil = Image.open(BytesIO(content))
-                    img_format = pil.format.lower() or "png"
-                    id = str(uuid.uuid7())
-                    filename = f"{id}.{img_format.replace('jpeg', 'jpg')}"
-                    image_url = upload_image(filename, data=content, prefix="creative/seedream", rename=False)
-                    # metadata = {"mime_type": f"image/{img_format}"}
-                    width, height = pil.size
-
-                    uploaded_urls.append(
-                        ImageInfo(
-                            url=image_url,
-                            width=width,
-                            height=height,
-                            id=id,
-                            filename=filename,
-                            mime_type=f"image/{img_format}",  # noqa
-                            content=f"{image_url})",
-                        ).model_dump(exclude_none=True, exclude_unset=True)
-                    )
+                urls = [image["url"] for image in images if image.get("url")]
+                stored = store_images_from_urls_sync(urls, prefix="creative/seedream")
+                uploaded_urls = [image.model_dump(exclude_none=True, exclude_unset=True) for image in stored]
                 # markdown_str = "\n".join(
                 #     [f"![images]({image['url']})" for image in uploaded_urls]
                 # )
@@ -185,6 +186,42 @@ def image_create_with_seedream(
         return ImageToolResponse(content=f"工具调用失败, 无生成图像, 错误提示: {exc}", success=False)
 
 
+@cached_image_tool("image_create_with_seedream", model="doubao-seedream-4-0-250828")
+async def image_create_with_seedream_async(
+    *,
+    prompt: str,
+    image_urls: list[str] | str | None = None,
+    aspect_ratio: str | None = None,
+    image_size: Literal["1K", "2K", "4K"] | None = "2K",
+) -> ImageToolResponse:
+    """image_create_with_seedream 的异步版本: 共享 HTTP 客户端, 并发下载与转存生成结果, 不阻塞事件循环"""
+    size = get_size(aspect_ratio, image_size)
+    try:
+        image_list = await resolve_remote_urls(split_image_urls(image_urls))
+        data = build_payload(prompt, image_list, size)
+
+        async def generate():
+            response = await get_async_client().post(base_url, headers=_headers(), json=data, timeout=360)
+            raise_for_retryable("ark", response.status_code, response.text[:200], response.headers)
+            return response
+
+        response = await get_provider("ark").call(generate)
+        if response.status_code != 200:
+            error = response.json().get("error", {}).get("message", "未知错误")
+            return ImageToolResponse(content=f"图像生成失败, 错误信息: {error}", success=False)
+
+        urls = [image["url"] for image in response.json().get("data", []) if image.get("url")]
+        images = await store_images_from_urls(urls, prefix="creative/seedream")
+        uploaded_urls = [image.model_dump(exclude_none=True, exclude_unset=True) for image in images]
+        return ImageToolResponse(
+            content=f"图像生成完成, 共生成{len(uploaded_urls)}张图像, 图像信息:{uploaded_urls}",
+            success=True,
+            images=images,
+        )
+    except Exception as exc:
+        return failure(f"工具调用失败, 无生成图像, 错误提示: {exc}", exc)
+
+
 if __name__ == "__main__":
     resp = image_create_with_seedream(prompt="生成一只可爱的猫咪", aspect_ratio="3:4")
     print(resp)
@@ -136,7 +136,7 @@ const CanvasExcali: React.FC<CanvasExcaliProps> = ({ canvasId, initialData }) =>
   }, [excalidrawAPI, theme])
 
   const addImageToExcalidraw = useCallback(
-    async (imageElement: ExcalidrawImageElement, imageUrl: string) => {
+    async (imageElement: ExcalidrawImageElement, imageUrl: string, keepPosition = false) => {
       if (!excalidrawAPI) return
 
       try {
@@ -175,7 +175,7 @@ const CanvasExcali: React.FC<CanvasExcaliProps> = ({ canvasId, initialData }) =>
         let x = imageElement.x
         let y = imageElement.y
 
-        if (lastImagePosition.current) {
+        if (lastImagePosition.current && !keepPosition) {
           const GAP = 20
           x = lastImagePosition.current.x + lastImagePosition.current.width + GAP
           y = lastImagePosition.current.y
@@ -415,11 +415,101 @@ const CanvasExcali: React.FC<CanvasExcaliProps> = ({ canvasId, initialData }) =>
         } as ExcalidrawImageElement
       }
 
-      addImageToExcalidraw(imageElement, imageData.image_url)
+      // The server placed the image with the canvas layout index, keep its position and size
+      const { x, y, width, height } = imageData
+      const placed = x !== undefined && y !== undefined && !!width && !!height
+      if (placed) {
+        imageElement = { ...imageElement, x, y, width, height }
+      }
+
+      addImageToExcalidraw(imageElement, imageData.image_url, placed)
     },
     [addImageToExcalidraw, canvasId],
   )
 
+  const handleLayersGenerated = useCallback(
+    (layersData: ISocket.SessionLayersGeneratedEvent) => {
+      console.log('👇 CanvasExcali received layers_generated:', layersData)
+
+      if (!excalidrawAPI || layersData.canvas_id !== canvasId) {
+        return
+      }
+
+      // Scale the source like a single image (max 350px) and place every layer at its bbox,
+      // so the layers stack back into the original composition
+      const MAX_DIMENSION = 350
+      const GAP = 20
+      const scale = Math.min(1, MAX_DIMENSION / layersData.width, MAX_DIMENSION / layersData.height)
+      const originX = lastImagePosition.current
+        ? lastImagePosition.current.x + lastImagePosition.current.width + GAP
+        : 0
+      const originY = lastImagePosition.current?.y || 0
+
+      const files: BinaryFileData[] = []
+      const elements = layersData.layers.map((layer) => {
+        const [x, y, width, height] = layer.bbox
+        const fileId = nanoid()
+        // Layers are already in storage as transparent PNGs, use them as is
+        files.push({
+          id: fileId as any,
+          dataURL: layer.image_url as any,
+          mimeType: 'image/png' as any,
+          created: Date.now(),
+          lastRetrieved: Date.now(),
+        })
+        return {
+          type: 'image',
+          fileId: fileId as any,
+          status: 'saved',
+          x: originX + x * scale,
+          y: originY + y * scale,
+          width: width * scale,
+          height: height * scale,
+          angle: 0,
+          strokeColor: 'transparent',
+          backgroundColor: 'transparent',
+          fillStyle: 'hachure',
+          strokeWidth: 1,
+          strokeStyle: 'solid',
+          roughness: 1,
+          opacity: 100,
+          groupIds: [],
+          roundness: null,
+          seed: Math.random(),
+          version: 1,
+          versionNonce: Math.random(),
+          isDeleted: false,
+          boundElements: null,
+          updated: Date.now(),
+          link: null,
+          locked: false,
+          customData: { layer: layer.name },
+          frameId: null,
+          scale: [1, 1],
+          index: null,
+          id: nanoid(),
+          crop: null,
+        } as ExcalidrawImageElement
+      })
+
+      excalidrawAPI.addFiles(files)
+      // Layers arrive bottom to top, append in order so the background stays below the objects
+      excalidrawAPI.updateScene({
+        elements: [...(excalidrawAPI.getSceneElements() || []), ...elements],
+      })
+
+      lastImagePosition.current = {
+        x: originX,
+        y: originY,
+        width: layersData.width * scale,
+        height: layersData.height * scale,
+        col: 0,
+      }
+      localStorage.setItem('excalidraw-last-image-position', JSON.stringify(lastImagePosition.current))
+    },
+    [excalidrawAPI, canvasId],
+  )
+
   const handleVideoGenerated = useCallback(
     (videoData: ISocket.SessionVideoGeneratedEvent) => {
       console.log('👇 CanvasExcali received video_generated:', videoData)
@@ -483,14 +573,16 @@ const CanvasExcali: React.FC<CanvasExcaliProps> = ({ canvasId, initialData }) =>
 
   useEffect(() => {
     eventBus.on('Socket::Session::ImageGenerated', handleImageGenerated)
+    eventBus.on('Socket::Session::LayersGenerated', handleLayersGenerated)
     eventBus.on('Socket::Session::VideoGenerated', handleVideoGenerated)
     eventBus.on('Chat::AddImageToCanvas', handleAddImageToCanvas)
     return () => {
       eventBus.off('Socket::Session::ImageGenerated', handleImageGenerated)
+      eventBus.off('Socket::Session::LayersGenerated', handleLayersGenerated)
       eventBus.off('Socket::Session::VideoGenerated', handleVideoGenerated)
       eventBus.off('Chat::AddImageToCanvas', handleAddImageToCanvas)
     }
-  }, [handleImageGenerated, handleVideoGenerated, handleAddImageToCanvas])
+  }, [handleImageGenerated, handleLayersGenerated, handleVideoGenerated, handleAddImageToCanvas])
 
   return (
     <div className={excalidrawClassName} style={{ width: '100%', height: '100%' }}>
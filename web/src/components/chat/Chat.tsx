@@ -26,6 +26,7 @@ import ToolcallProgressUpdate from './ToolcallProgressUpdate'
 import { ToolInfo } from '@/api/model'
 import { DEFAULT_SYSTEM_PROMPT } from '@/constants'
 import { useConfigs } from '@/contexts/configs'
+import { useSocket } from '@/contexts/socket'
 import 'react-photo-view/dist/react-photo-view.css'
 // import { useAuth } from '@/contexts/AuthContext'
 import { apiClient } from '@/lib/api-client.ts'
@@ -71,10 +72,23 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
   const [messages, setMessages] = useState<Message[]>([])
   const [pending, setPending] = useState<PendingType>(initCanvas ? 'text' : false)
   const mergedToolCallIds = useRef<string[]>([])
+  // 服务端最近一次同步的消息列表, messages_delta 基于它增量更新
+  const serverMessagesRef = useRef<Message[]>([])
 
   const sessionId = session?.id ?? searchSessionId
 
   const sessionIdRef = useRef<string>(session?.id || nanoid())
+  const { socketManager } = useSocket()
+
+  // 订阅当前会话和画布的房间, 只接收与之相关的推送
+  useEffect(() => {
+    if (!socketManager) {
+      return
+    }
+    const subscription = { session_id: sessionId, canvas_id: canvasId }
+    socketManager.subscribe(subscription)
+    return () => socketManager.unsubscribe(subscription)
+  }, [socketManager, sessionId, canvasId])
   const [expandingToolCalls, setExpandingToolCalls] = useState<string[]>([])
   const [pendingToolConfirmations, setPendingToolConfirmations] = useState<string[]>([])
 
@@ -382,12 +396,31 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
         console.log('👇all_messages', data.messages)
         return data.messages
       })
+      serverMessagesRef.current = data.messages
       setMessages(mergeToolCallResult(data.messages))
       scrollToBottom()
     },
     [sessionId, scrollToBottom],
   )
 
+  const handleMessagesDelta = useCallback(
+    (data: TEvents['Socket::Session::MessagesDelta']) => {
+      if (data.session_id && data.session_id !== sessionId) {
+        return
+      }
+
+      const next = serverMessagesRef.current.slice(0, data.total)
+      for (const { index, message } of data.updates) {
+        next[index] = message
+      }
+      // 订阅晚于首个 all_messages 时基线不完整, 跳过空位
+      serverMessagesRef.current = next
+      setMessages(mergeToolCallResult(next.filter(Boolean)))
+      scrollToBottom()
+    },
+    [sessionId, scrollToBottom],
+  )
+
   const handleDone = useCallback(
     (data: TEvents['Socket::Session::Done']) => {
       if (data.session_id && data.session_id !== sessionId) {
@@ -441,6 +474,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
     eventBus.on('Socket::Session::ToolCallResult', handleToolCallResult)
     eventBus.on('Socket::Session::ImageGenerated', handleImageGenerated)
     eventBus.on('Socket::Session::AllMessages', handleAllMessages)
+    eventBus.on('Socket::Session::MessagesDelta', handleMessagesDelta)
     eventBus.on('Socket::Session::Done', handleDone)
     eventBus.on('Socket::Session::Error', handleError)
     eventBus.on('Socket::Session::Info', handleInfo)
@@ -456,6 +490,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
       eventBus.off('Socket::Session::ToolCallResult', handleToolCallResult)
       eventBus.off('Socket::Session::ImageGenerated', handleImageGenerated)
       eventBus.off('Socket::Session::AllMessages', handleAllMessages)
+      eventBus.off('Socket::Session::MessagesDelta', handleMessagesDelta)
       eventBus.off('Socket::Session::Done', handleDone)
       eventBus.off('Socket::Session::Error', handleError)
       eventBus.off('Socket::Session::Info', handleInfo)
@@ -474,6 +509,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
     const data = await resp.json()
     const msgs = data?.length ? data : []
 
+    serverMessagesRef.current = msgs
     setMessages(mergeToolCallResult(msgs))
     if (msgs.length > 0) {
       setInitCanvas(false)
@@ -1,5 +1,5 @@
 import { SocketIOManager } from '@/lib/socket'
-import React, { createContext, useEffect, useRef, useState } from 'react'
+import React, { createContext, useContext, useEffect, useRef, useState } from 'react'
 import { useTranslation } from 'react-i18next'
 
 interface SocketContextType {
@@ -145,3 +145,5 @@ export const SocketProvider: React.FC<SocketProviderProps> = ({ children }) => {
     </SocketContext.Provider>
   )
 }
+
+export const useSocket = () => useContext(SocketContext)
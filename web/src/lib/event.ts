@@ -31,12 +31,14 @@ export type TEvents = {
   'Socket::Session::Done': ISocket.SessionDoneEvent
   'Socket::Session::Info': ISocket.SessionInfoEvent
   'Socket::Session::ImageGenerated': ISocket.SessionImageGeneratedEvent
+  'Socket::Session::LayersGenerated': ISocket.SessionLayersGeneratedEvent
   'Socket::Session::VideoGenerated': ISocket.SessionVideoGeneratedEvent
   'Socket::Session::Delta': ISocket.SessionDeltaEvent
   'Socket::Session::ToolCall': ISocket.SessionToolCallEvent
   'Socket::Session::ToolCallArguments': ISocket.SessionToolCallArgumentsEvent
   'Socket::Session::ToolCallResult': ISocket.SessionToolCallResultEvent
   'Socket::Session::AllMessages': ISocket.SessionAllMessagesEvent
+  'Socket::Session::MessagesDelta': ISocket.SessionMessagesDeltaEvent
   'Socket::Session::ToolCallProgress': ISocket.SessionToolCallProgressEvent
   'Socket::Session::ToolCallPendingConfirmation': ISocket.SessionToolCallPendingConfirmationEvent
   'Socket::Session::ToolCallConfirmed': ISocket.SessionToolCallConfirmedEvent
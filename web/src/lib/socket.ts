@@ -7,12 +7,19 @@ export interface SocketConfig {
   autoConnect?: boolean
 }
 
+// 服务端按 session_id / canvas_id 划分房间, 只推送已订阅的会话事件
+export interface SocketSubscription {
+  session_id?: string
+  canvas_id?: string
+}
+
 export class SocketIOManager {
   private socket: Socket | null = null
   private connected = false
   private reconnectAttempts = 0
   private maxReconnectAttempts = 5
   private reconnectDelay = 1000
+  private subscriptions: SocketSubscription[] = []
 
   constructor(private config: SocketConfig = {}) {
     if (config.autoConnect !== false) {
@@ -40,6 +47,10 @@ export class SocketIOManager {
         console.log('✅ Socket.IO connected:', this.socket?.id)
         this.connected = true
         this.reconnectAttempts = 0
+        // 重连后 sid 变化, 需要重新加入房间
+        for (const subscription of this.subscriptions) {
+          this.socket?.emit('subscribe', subscription)
+        }
         resolve(true)
       })
 
@@ -115,12 +126,18 @@ export class SocketIOManager {
       case ISocket.SessionEventType.ImageGenerated:
         eventBus.emit('Socket::Session::ImageGenerated', data)
         break
+      case ISocket.SessionEventType.LayersGenerated:
+        eventBus.emit('Socket::Session::LayersGenerated', data)
+        break
       case ISocket.SessionEventType.VideoGenerated:
         eventBus.emit('Socket::Session::VideoGenerated', data)
         break
       case ISocket.SessionEventType.AllMessages:
         eventBus.emit('Socket::Session::AllMessages', data)
         break
+      case ISocket.SessionEventType.MessagesDelta:
+        eventBus.emit('Socket::Session::MessagesDelta', data)
+        break
       case ISocket.SessionEventType.Done:
         eventBus.emit('Socket::Session::Done', data)
         break
@@ -138,6 +155,20 @@ export class SocketIOManager {
     }
   }
 
+  subscribe(subscription: SocketSubscription) {
+    this.subscriptions.push(subscription)
+    if (this.socket && this.connected) {
+      this.socket.emit('subscribe', subscription)
+    }
+  }
+
+  unsubscribe(subscription: SocketSubscription) {
+    this.subscriptions = this.subscriptions.filter((s) => s !== subscription)
+    if (this.socket && this.connected) {
+      this.socket.emit('unsubscribe', subscription)
+    }
+  }
+
   ping(data: unknown) {
     if (this.socket && this.connected) {
       this.socket.emit('ping', data)
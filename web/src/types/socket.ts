@@ -7,12 +7,14 @@ export enum SessionEventType {
   Done = 'done',
   Info = 'info',
   ImageGenerated = 'image_generated',
+  LayersGenerated = 'layers_generated',
   VideoGenerated = 'video_generated',
   Delta = 'delta',
   ToolCall = 'tool_call',
   ToolCallArguments = 'tool_call_arguments',
   ToolCallResult = 'tool_call_result',
   AllMessages = 'all_messages',
+  MessagesDelta = 'messages_delta',
   ToolCallProgress = 'tool_call_progress',
   ToolCallPendingConfirmation = 'tool_call_pending_confirmation',
   ToolCallConfirmed = 'tool_call_confirmed',
@@ -40,6 +42,20 @@ export interface SessionImageGeneratedEvent extends SessionBaseEvent {
   file: BinaryFileData
   canvas_id: string
   image_url: string
+  // Position and display size computed by the server from the canvas layout, absent when it could not place the image
+  x?: number
+  y?: number
+  width?: number
+  height?: number
+}
+export interface SessionLayersGeneratedEvent extends SessionBaseEvent {
+  type: SessionEventType.LayersGenerated
+  canvas_id: string
+  // Size of the source image
+  width: number
+  height: number
+  // Bottom to top; bbox is [x, y, width, height] in the source image
+  layers: { name: string; bbox: [number, number, number, number]; image_url: string }[]
 }
 export interface SessionVideoGeneratedEvent extends SessionBaseEvent {
   type: SessionEventType.VideoGenerated
@@ -72,6 +88,11 @@ export interface SessionAllMessagesEvent extends SessionBaseEvent {
   type: SessionEventType.AllMessages
   messages: Message[]
 }
+export interface SessionMessagesDeltaEvent extends SessionBaseEvent {
+  type: SessionEventType.MessagesDelta
+  total: number
+  updates: { index: number; message: Message }[]
+}
 export interface SessionToolCallProgressEvent extends SessionBaseEvent {
   type: SessionEventType.ToolCallProgress
   tool_call_id: string
@@ -101,8 +122,10 @@ export type SessionUpdateEvent =
   | SessionToolCallArgumentsEvent
   | SessionToolCallProgressEvent
   | SessionImageGeneratedEvent
+  | SessionLayersGeneratedEvent
   | SessionVideoGeneratedEvent
   | SessionAllMessagesEvent
+  | SessionMessagesDeltaEvent
   | SessionDoneEvent
   | SessionErrorEvent
   | SessionInfoEvent